@@ -10,11 +10,106 @@ Notes
 PyNLO is intended to be used with all quantities expressed in base SI units,
 i.e. frequency in ``Hz``, time in ``s``, and energy in ``J``.
 
+The submodules are imported when they are first accessed, so that importing
+PyNLO by itself (e.g. in the workers of a process pool) does not load
+``numba``, ``scipy``, or MKL.
+
 """
 __version__ = '1.dev'
-__all__ = ["light", "medium", "device", "model", "utility"]
+__all__ = ["light", "medium", "device", "model", "utility", "warmup"]
 
 
 # %% Imports
 
-from pynlo import light, medium, device, model, utility
+import importlib
+
+
+# %% Submodules
+
+_submodules = ["light", "medium", "device", "model", "utility"]
+
+def __getattr__(name):
+    if name in _submodules:
+        return importlib.import_module("pynlo." + name)
+    raise AttributeError("module 'pynlo' has no attribute '{:}'".format(name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+# %% Warm Start
+
+def warmup(precision="double"):
+    """
+    Compile the JIT-compiled routines of `pynlo.model`.
+
+    The routines are compiled for each combination of input types when they
+    are first called, which otherwise delays the first simulation of each new
+    Python process. This function runs short simulations with each model and
+    integration method, for single spectra and for stacks of spectra, which
+    compiles the routines for all types used by the models.
+
+    The compiled routines are cached on disk, in the ``__pycache__`` directory
+    of the package or in the directory set by the ``NUMBA_CACHE_DIR``
+    environment variable. Only the first process after an installation or an
+    update compiles the routines, later processes load them from the cache.
+
+    Parameters
+    ----------
+    precision : str, optional
+        The precision of the models for which the routines are compiled, see
+        `pynlo.model.Model`. The default is ``"double"``.
+
+    Returns
+    -------
+    float
+        The time taken, with units of ``s``.
+
+    Examples
+    --------
+    Compile the routines once in each worker of a process pool::
+
+        with concurrent.futures.ProcessPoolExecutor(initializer=pynlo.warmup) as pool:
+            results = pool.map(run_simulation, parameters)
+
+    """
+    import time
+
+    import numpy as np
+    from scipy.constants import c, pi
+
+    from pynlo import light, medium, model, utility as ut
+
+    t_start = time.perf_counter()
+
+    #---- Pulse
+    v0 = 200e12
+    pulse = light.Pulse.Sech(2**6, 100e12, 500e12, v0, 1e-12, 100e-15, alias=2)
+    a_v = np.array([pulse.a_v, 0.5*pulse.a_v])
+    beta = ut.taylor_series(2*pi*v0, [2*2*pi*v0/c, 2/c, 20e-27])(2*pi*pulse.v_grid)
+
+    #---- NLSE
+    g3 = ut.chi3.gamma_to_g3(pulse.v_grid, 1e-3)
+    rv_grid, r3 = ut.chi3.raman(pulse.n, pulse.dt, [0.245*(1-0.21), 12.2e-15, 32e-15], [0.245*0.21, 96e-15])
+    mode = medium.Mode(pulse.v_grid, beta, g3=g3, rv_grid=rv_grid, r3=r3)
+    nlse = model.NLSE(pulse, mode, precision=precision)
+
+    #---- UPE
+    g2 = ut.chi2.g2_shg(v0, pulse.v_grid, np.full(pulse.n, 2.0), 10e-6**2, 50e-12)
+    b = np.interp([v0, 2*v0], pulse.v_grid, beta)
+    z_invs = ut.chi2.domain_inversions(1e-3, b[1] - 2*b[0])[0]
+    upe = model.UPE(pulse, medium.Mode(pulse.v_grid, beta, g2=g2, g3=g3), precision=precision)
+    upe_pol = model.UPE(pulse, medium.Mode(
+        pulse.v_grid, beta, g2=g2, g2_inv=medium.Poling(z_invs, min_periods=2), g3=g3),
+        precision=precision)
+
+    #---- Simulate
+    for sim_model in [nlse, upe, upe_pol]:
+        length = 2e-4 if sim_model is upe_pol else 1e-5
+        dz = sim_model.estimate_step_size(a_v=pulse.a_v)
+        for method in ["erk43ip", "rk4ip", "ssfm"]:
+            sim_model.simulate(length, dz=dz, n_records=2, method=method)
+        if sim_model is not upe_pol:
+            sim_model.simulate_batch(a_v, length, dz=dz, n_records=2)
+            sim_model.simulate_batch(a_v, length, dz=dz, n_records=2, row_steps=True)
+    return time.perf_counter() - t_start
@@ -17,12 +17,13 @@ __all__ = ["Pulse"]
 # %% Imports
 
 import collections
+import concurrent.futures
 
 import numpy as np
 from scipy.constants import pi
 
 from pynlo.utility import TFGrid, fft, resample_v, resample_t
-from pynlo.utility.misc import ndproperty, replace
+from pynlo.utility.misc import ndproperty, replace, read_only
 
 
 # %% Collections
@@ -36,6 +37,11 @@ Autocorrelation = collections.namedtuple("Autocorrelation", ["t_grid", "ac_t", "
 Spectrogram = collections.namedtuple("Spectrogram", ["v_grid", "t_grid", "spg", "extent"])
 
 
+# %% Constants
+
+_SPECTROGRAM_BLOCK = 2**20 # points per block of `Pulse.spectrogram`
+
+
 # %% Pulse
 
 class Pulse(TFGrid):
@@ -90,11 +96,21 @@ class Pulse(TFGrid):
     group delay of the time window during pulse propagation simulations, it
     does not otherwise affect the properties of the pulse.
 
+    The properties derived from the spectrum, such as `a_t`, `p_t`, or `phi_v`,
+    are calculated once and cached until the spectrum changes. The cached
+    arrays are read-only, and the spectrum should be updated through the
+    properties instead of through in-place modification of their arrays. The
+    cache is invalidated by the property setters, so in-place modifications
+    of the `a_v` array itself must be followed by an assignment, i.e.
+    ``pulse.a_v = pulse.a_v``, to update the derived properties.
+
     """
     def __init__(self, n, v_ref, dv, v0=None, a_v=None, alias=1):
         #---- Initialize Grids
         super().__init__(n, v_ref, dv, alias=alias)
         self.__a_v = np.zeros_like(self.v_grid, dtype=complex)
+        self._views = {}
+        self._views_version = self._version = 0
         if v0 is None:
             self.v0 = self.v_grid[self.n//2] # same as v_ref
         else:
@@ -370,7 +386,27 @@ class Pulse(TFGrid):
         return self.__a_v
     @a_v.setter
     def a_v(self, a_v):
-        self.__a_v[...] = a_v
+        self._set_a_v(a_v)
+
+    def _set_a_v(self, a_v, key=...):
+        """Update the elements of the root-power spectrum at `key`."""
+        self.__a_v[key] = a_v
+        self._version += 1
+
+    def _view(self, name, calc):
+        """
+        A property derived from the root-power spectrum, calculated with `calc`
+        only if not already cached for the current spectrum.
+
+        """
+        views = self._views
+        if self._views_version != self._version:
+            views.clear() # the spectrum was updated by a setter
+            self._views_version = self._version
+        view = views.get(name)
+        if view is None:
+            view = views[name] = read_only(calc())
+        return view
 
     @ndproperty
     def _a_v(self, key=...):
@@ -382,7 +418,7 @@ class Pulse(TFGrid):
         ndarray of complex
 
         """
-        return fft.ifftshift(self.a_v)[key]
+        return self._view("_a_v", lambda: fft.ifftshift(self.a_v))[key]
     @_a_v.setter
     def _a_v(self, _a_v, key=...):
         if key is not ...:
@@ -399,10 +435,10 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return self.a_v[key].real**2 + self.a_v[key].imag**2
+        return self._view("p_v", lambda: self.a_v.real**2 + self.a_v.imag**2)[key]
     @p_v.setter
     def p_v(self, p_v, key=...):
-        self.a_v[key] = p_v**0.5 * np.exp(1j*self.phi_v[key])
+        self._set_a_v(p_v**0.5 * np.exp(1j*self.phi_v[key]), key)
 
     @ndproperty
     def _p_v(self, key=...):
@@ -414,7 +450,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return fft.ifftshift(self.p_v)[key]
+        return self._view("_p_v", lambda: fft.ifftshift(self.p_v))[key]
     @_p_v.setter
     def _p_v(self, _p_v, key=...):
         if key is not ...:
@@ -431,10 +467,10 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return np.angle(self.a_v[key])
+        return self._view("phi_v", lambda: np.angle(self.a_v))[key]
     @phi_v.setter
     def phi_v(self, phi_v, key=...):
-        self.a_v[key] = self.p_v[key]**0.5 * np.exp(1j*phi_v)
+        self._set_a_v(self.p_v[key]**0.5 * np.exp(1j*phi_v), key)
 
     @ndproperty
     def _phi_v(self, key=...):
@@ -446,7 +482,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return fft.ifftshift(self.phi_v)[key]
+        return self._view("_phi_v", lambda: fft.ifftshift(self.phi_v))[key]
     @_phi_v.setter
     def _phi_v(self, _phi_v, key=...):
         if key is not ...:
@@ -463,7 +499,8 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return self.t_ref - np.gradient(np.unwrap(self.phi_v)/(2*pi), self.v_grid, edge_order=2)[key]
+        return self._view("tg_v", lambda: self.t_ref - np.gradient(
+            np.unwrap(self.phi_v)/(2*pi), self.v_grid, edge_order=2))[key]
 
     def v_width(self, m=None):
         """
@@ -533,7 +570,7 @@ class Pulse(TFGrid):
         ndarray of complex
 
         """
-        return fft.fftshift(self._a_t)[key]
+        return self._view("a_t", lambda: fft.fftshift(self._a_t))[key]
     @a_t.setter
     def a_t(self, a_t, key=...):
         if key is not ...:
@@ -550,7 +587,7 @@ class Pulse(TFGrid):
         ndarray of complex
 
         """
-        return fft.ifft(self._a_v, fsc=self.dt)[key]
+        return self._view("_a_t", lambda: fft.ifft(self._a_v, fsc=self.dt))[key]
     @_a_t.setter
     def _a_t(self, _a_t, key=...):
         if key is not ...:
@@ -575,7 +612,7 @@ class Pulse(TFGrid):
         rp_t : The instantaneous power.
 
         """
-        return fft.fftshift(self._p_t)[key]
+        return self._view("p_t", lambda: fft.fftshift(self._p_t))[key]
     @p_t.setter
     def p_t(self, p_t, key=...):
         if key is not ...:
@@ -592,8 +629,10 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        _a_t = self._a_t[key]
-        return _a_t.real**2 + _a_t.imag**2
+        def calc():
+            _a_t = self._a_t
+            return _a_t.real**2 + _a_t.imag**2
+        return self._view("_p_t", calc)[key]
     @_p_t.setter
     def _p_t(self, _p_t, key=...):
         self._a_t[key] = _p_t**0.5 * np.exp(1j*self._phi_t[key])
@@ -608,7 +647,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return fft.fftshift(self._phi_t)[key]
+        return self._view("phi_t", lambda: fft.fftshift(self._phi_t))[key]
     @phi_t.setter
     def phi_t(self, phi_t, key=...):
         if key is not ...:
@@ -625,7 +664,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return np.angle(self._a_t[key])
+        return self._view("_phi_t", lambda: np.angle(self._a_t))[key]
     @_phi_t.setter
     def _phi_t(self, _phi_t, key=...):
         self._a_t[key] = self._p_t[key]**0.5 * np.exp(1j*_phi_t)
@@ -641,7 +680,8 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return self.v_ref + np.gradient(np.unwrap(self.phi_t)/(2*pi), self.t_grid, edge_order=2)[key]
+        return self._view("vg_t", lambda: self.v_ref + np.gradient(
+            np.unwrap(self.phi_t)/(2*pi), self.t_grid, edge_order=2))[key]
 
     @ndproperty
     def ra_t(self, key=...):
@@ -654,7 +694,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return fft.fftshift(self._ra_t)[key]
+        return self._view("ra_t", lambda: fft.fftshift(self._ra_t))[key]
     @ra_t.setter
     def ra_t(self, ra_t, key=...):
         if key is not ...:
@@ -672,16 +712,16 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        ra_v = np.zeros_like(self.rv_grid, dtype=complex)
-        ra_v[self.rn_slice] = 2**-0.5 * self.a_v
-        ra_t = fft.irfft(ra_v, fsc=self.rdt, n=self.rn)
-        return ra_t[key]
+        def calc():
+            ra_v = self.rv_scatter(self.a_v)
+            return fft.irfft(ra_v, fsc=self.rdt, n=self.rn)
+        return self._view("_ra_t", calc)[key]
     @_ra_t.setter
     def _ra_t(self, _ra_t, key=...):
         if key is not ...:
             _ra_t = replace(self._ra_t, _ra_t, key)
         ra_v = fft.rfft(_ra_t, fsc=self.rdt)
-        self.a_v = 2**0.5 * ra_v[self.rn_slice]
+        self.a_v = self.rv_gather(ra_v)
 
     @ndproperty
     def rp_t(self, key=...):
@@ -693,7 +733,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return fft.fftshift(self._rp_t)[key]
+        return self._view("rp_t", lambda: fft.fftshift(self._rp_t))[key]
 
     @ndproperty
     def _rp_t(self, key=...):
@@ -705,7 +745,7 @@ class Pulse(TFGrid):
         ndarray of float
 
         """
-        return self._ra_t[key]**2
+        return self._view("_rp_t", lambda: np.square(self._ra_t))[key]
 
     def t_width(self, m=None):
         """
@@ -877,7 +917,7 @@ class Pulse(TFGrid):
         ac = Autocorrelation(t_grid=t_grid, ac_t=ac_t, fwhm=t_fwhm, rms=t_rms, eqv=t_eqv)
         return ac
 
-    def spectrogram(self, t_fwhm=None, v_range=None, n_t=None, t_range=None):
+    def spectrogram(self, t_fwhm=None, v_range=None, n_t=None, t_range=None, n_threads=1):
         """
         Calculate the spectrogram of the pulse through convolution with a
         Gaussian window.
@@ -897,6 +937,9 @@ class Pulse(TFGrid):
         t_range : array_like of float, optional
             The range of delays to sample. This should be given as (min, max)
             values. The default takes the full range of the `t_grid`.
+        n_threads : int, optional
+            The number of threads over which the delays are divided. The
+            default is 1.
 
         Returns
         -------
@@ -921,6 +964,12 @@ class Pulse(TFGrid):
         half maximum of the pulse in order to evenly distribute resolution
         bandwidth between the time and frequency domains.
 
+        The pulse is cropped to `v_range` before it is gated, and the delays
+        are calculated in blocks of about ``2**20`` points, so that apart from
+        the spectrogram itself the memory used does not scale with `n_t`. The
+        spectrograms of all records of a simulation can be calculated with
+        `pynlo.model.SimulationResult.spectrograms`.
+
         """
         #---- Resample
         if v_range is None:
@@ -948,13 +997,12 @@ class Pulse(TFGrid):
 
         #---- Set Gate
         if t_fwhm is None:
-            v_sigma = 0.5 * self.v_width().rms
-            t_fwhm = np.log(4)**0.5 / (2*pi*v_sigma)
+            t_fwhm = self._gate_fwhm()
 
         g_t = (2**(-(2*t_grid/t_fwhm)**2))**0.5
 
         g_t /= np.sum(np.abs(g_t)**2 * dt)**0.5
-        g_v = fft.fftshift(fft.fft(fft.ifftshift(g_t), fsc=dt))
+        g_rv = fft.rfft(fft.ifftshift(g_t), fsc=dt)
 
         #---- Set Delays
         if t_range is None:
@@ -979,16 +1027,27 @@ class Pulse(TFGrid):
         delay_t_grid = np.linspace(t_min, t_max, n_t)
         delay_dt = (t_max - t_min)/(n_t - 1)
 
-        gate_pulses_v = (g_v[:, np.newaxis]
-                         * np.exp(-1j*2*pi*delay_t_grid[np.newaxis, :]*v_grid[:, np.newaxis]))
-        gate_pulses_t = fft.fftshift(fft.ifft(
-            fft.ifftshift(gate_pulses_v, axis=0), fsc=dt, axis=0, overwrite_x=True), axis=0)
-
         #---- Spectrogram
-        spg_t = a_t[:, np.newaxis] * gate_pulses_t
-        spg_v = fft.fftshift(fft.fft(
-            fft.ifftshift(spg_t, axis=0), fsc=dt, axis=0, overwrite_x=True), axis=0)
-        p_spg = spg_v.real**2 + spg_v.imag**2
+        # the gate is real, so it is shifted to each delay with a real-valued
+        # transform. The delays are calculated in blocks.
+        a_t = fft.ifftshift(a_t)
+        phase_rv = -1j*2*pi/(n*dt) * np.arange(g_rv.size)
+        block = max(1, _SPECTROGRAM_BLOCK//n)
+        p_spg = np.empty((n, n_t))
+
+        def calc_block(idx):
+            delays = delay_t_grid[idx:idx+block, np.newaxis]
+            gate_t = fft.irfft(g_rv * np.exp(phase_rv * delays), fsc=dt, n=n)
+            spg_v = fft.fft(gate_t * a_t, fsc=dt, overwrite_x=True)
+            p_spg[:, idx:idx+block] = fft.fftshift(spg_v.real**2 + spg_v.imag**2).T
+
+        idxs = range(0, n_t, block)
+        if n_threads > 1:
+            with concurrent.futures.ThreadPoolExecutor(n_threads) as pool:
+                list(pool.map(calc_block, idxs))
+        else:
+            for idx in idxs:
+                calc_block(idx)
 
         #---- Extent
         extent = (delay_t_grid.min()-0.5*delay_dt, delay_t_grid.max()+0.5*delay_dt,
@@ -998,7 +1057,18 @@ class Pulse(TFGrid):
         spg = Spectrogram(v_grid=v_grid, t_grid=delay_t_grid, spg=p_spg, extent=extent)
         return spg
 
+    def _gate_fwhm(self):
+        """The default full width at half maximum of the spectrogram gate."""
+        v_sigma = 0.5 * self.v_width().rms
+        return np.log(4)**0.5 / (2*pi*v_sigma)
+
     #---- Misc
     def copy(self):
         """A copy of the pulse."""
         return super().copy()
+
+    def __getstate__(self):
+        # The cached properties are recalculated on demand
+        state = super().__getstate__()
+        state["_views"] = {}
+        return state
@@ -4,18 +4,20 @@ Optical modes in waveguides or other media.
 
 """
 
-__all__ = ["Mode"]
+__all__ = ["Mode", "Poling"]
 
 
 # %% Imports
 
-import bisect
+import cmath
 import collections
 import copy
 
 import numpy as np
 from scipy.constants import c, pi
 
+from pynlo.utility.misc import read_only, deepcopy_shared
+
 
 # %% Collections
 
@@ -24,6 +26,314 @@ _LinearZ = collections.namedtuple("LinearZ", ["any", "alpha", "beta"])
 _NonlinearZ = collections.namedtuple("NonlinearZ", ["any", "g2", "pol", "g3", "r3"])
 
 
+# %% Tables
+
+class _ZTable():
+    """
+    Linear interpolation between arrays tabulated over a z grid.
+
+    Positions outside of the grid take the value at the nearest end point.
+
+    Parameters
+    ----------
+    z_grid : ndarray of float
+        The sorted z positions of the table.
+    values : ndarray
+        The tabulated arrays, stacked along the first axis.
+
+    """
+    def __init__(self, z_grid, values):
+        self.z_grid = z_grid
+        self.values = values
+        self._diffs = np.diff(values, axis=0)
+
+    def __call__(self, z, out=None):
+        """
+        The interpolated value at `z`, placed in `out` if given.
+
+        """
+        idx = np.searchsorted(self.z_grid, z, side="right") - 1
+        idx = min(max(idx, 0), self.z_grid.size - 2)
+        weight = (z - self.z_grid[idx])/(self.z_grid[idx + 1] - self.z_grid[idx])
+        weight = min(max(weight, 0.0), 1.0)
+        if out is None:
+            out = np.empty_like(self.values[idx])
+
+        if weight == 0:
+            out[...] = self.values[idx]
+        elif weight == 1:
+            out[...] = self.values[idx + 1]
+        else:
+            np.multiply(self._diffs[idx], weight, out=out)
+            out += self.values[idx]
+        return out
+
+
+# %% Poling
+
+class Poling():
+    """
+    The domain structure of a poled 2nd-order nonlinearity.
+
+    The domain inversion boundaries are stored as a sorted array. The region
+    before the first boundary is unpoled, and the poling status alternates at
+    each boundary. A period of the structure begins with an inverted domain
+    and ends with the following unpoled domain, from which the local poling
+    period and duty cycle are defined.
+
+    Within long stretches of periods that vary slowly from one period to the
+    next, the poling can be replaced by the terms of its Fourier series that
+    quasi-phase match (QPM) the interaction [1]_. The nonlinearity is then a
+    smooth function of z and a simulation can take steps that span many
+    domains. Elsewhere, a simulation steps exactly from one domain inversion
+    boundary to the next.
+
+    Parameters
+    ----------
+    z_invs : array_like of float
+        The location of all domain inversion boundaries.
+    orders : None or array_like of int, optional
+        The QPM orders kept in the Fourier series of the poling. Order `m`
+        compensates a wavenumber mismatch of ``m*2*pi/period`` in sum-frequency
+        generation, and the equivalent mismatch in the reverse
+        difference-frequency process. Order 0 is the average of the poling,
+        which is only nonzero if the duty cycle is not 50%. The default is
+        ``(1,)``, which only keeps the first-order QPM terms. If ``None``, the
+        domains are stepped through exactly everywhere.
+    min_periods : int, optional
+        The minimum number of consecutive periods in a stretch where the
+        Fourier series is used. The default is 20.
+    rtol : float, optional
+        The largest relative change between adjacent periods within a stretch.
+        The default is 0.05.
+
+    Notes
+    -----
+    With an inverted domain covering the fraction :math:`D` of each period,
+    the sign of the nonlinearity has the Fourier series
+
+    .. math:: s[z] = \\sum_m c_m \\, e^{i m \\theta[z]}, \\quad
+              c_0 = 2 D - 1, \\quad
+              c_m = \\frac{1 - e^{-i 2 \\pi m D}}{i \\pi m}
+
+    where the phase of the grating, :math:`\\theta`, advances by :math:`2 \\pi`
+    over each period. Only the terms that are close to phase matched
+    contribute over many periods. With the conventions of `Mode`, the
+    sum-frequency terms of order :math:`m` are multiplied by
+    :math:`c_{-m} e^{-i m \\theta}` and the difference-frequency terms by its
+    complex conjugate, and all other terms are neglected. This is only valid
+    if the omitted terms are far from phase matched, e.g. the 3rd-order QPM
+    terms of a structure designed for 1st-order QPM are not included unless
+    ``3`` is in `orders`.
+
+    References
+    ----------
+    .. [1] M. M. Fejer, G. A. Magel, D. H. Jundt, and R. L. Byer,
+        "Quasi-phase-matched second harmonic generation: tuning and
+        tolerances," IEEE Journal of Quantum Electronics, vol. 28, no. 11,
+        pp. 2631-2654, 1992. https://doi.org/10.1109/3.161322
+
+    """
+    def __init__(self, z_invs, orders=(1,), min_periods=20, rtol=0.05):
+        self._z_invs = read_only(np.sort(np.asarray(z_invs, dtype=float).ravel()))
+        self.orders = None if orders is None else tuple(int(m) for m in orders)
+        self.min_periods = min_periods
+        self.rtol = rtol
+
+        #---- Periods
+        starts = self._z_invs[0::2] # start of each inverted domain
+        self._starts = starts[:-1]
+        self._periods = np.diff(starts)
+        self._duty = (self._z_invs[1::2][:self._periods.size] - self._starts)/self._periods
+
+        #---- Fourier Coefficients
+        if self.orders is None:
+            self._coefs = np.zeros((self._periods.size, 0), dtype=complex)
+        else:
+            # c_{-m} of each period, for each order m
+            m = np.array(self.orders)
+            duty = self._duty[:, np.newaxis]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                coefs = (1 - np.exp(2j*pi*m*duty))/(-1j*pi*m)
+            self._coefs = np.where(m == 0, 2*duty - 1, coefs)
+
+        #---- Averaged Regions
+        regions = []
+        if self.orders is not None and self._periods.size:
+            # Split into stretches of similar periods
+            ratio = self._periods[1:]/self._periods[:-1]
+            breaks = np.flatnonzero(np.abs(ratio - 1) > rtol) + 1
+            for idx_0, idx_1 in zip(np.append(0, breaks), np.append(breaks, self._periods.size)):
+                if idx_1 - idx_0 >= max(min_periods, 1):
+                    regions.append((starts[idx_0], starts[idx_1]))
+        self._regions = np.array(regions, dtype=float).reshape(-1, 2)
+
+        #---- Stops
+        # the boundaries within averaged regions are skipped
+        inside = np.zeros(self._z_invs.size, dtype=bool)
+        for z_0, z_1 in self._regions:
+            inside[(self._z_invs > z_0) & (self._z_invs < z_1)] = True
+        self._stops = self._z_invs[~inside]
+
+    @property
+    def z_invs(self):
+        """
+        The sorted location of all domain inversion boundaries.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        return self._z_invs
+
+    @property
+    def regions(self):
+        """
+        The start and end of each stretch where the poling is averaged with
+        its Fourier series.
+
+        Returns
+        -------
+        ndarray of float
+            An `(m, 2)` array of the start and end points.
+
+        """
+        return self._regions
+
+    @property
+    def stops(self):
+        """
+        The domain inversion boundaries that are stepped through exactly,
+        including the edges of the averaged regions.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        return self._stops
+
+    def pol(self, z):
+        """
+        The poling status at `z`.
+
+        A value of 1 indicates an inverted domain. A value of 0 indicates an
+        unpoled region.
+
+        Parameters
+        ----------
+        z : float or array_like of float
+
+        Returns
+        -------
+        int or ndarray of int
+
+        """
+        return np.searchsorted(self._z_invs, z, side="right") % 2
+
+    def _period_index(self, z):
+        """The index of the period that contains `z`, or the nearest one."""
+        idx = np.searchsorted(self._starts, z, side="right") - 1
+        return np.clip(idx, 0, max(self._periods.size - 1, 0))
+
+    def period(self, z):
+        """
+        The local poling period at `z`, from the start of the inverted domain
+        to the end of the following unpoled domain.
+
+        Outside of the periodic structure, the period nearest to `z` is given.
+
+        Parameters
+        ----------
+        z : float or array_like of float
+
+        Returns
+        -------
+        float or ndarray of float
+
+        """
+        assert self._periods.size, "The poling must include atleast 1 period."
+        return self._periods[self._period_index(z)]
+
+    def duty(self, z):
+        """
+        The local duty cycle at `z`, the fraction of the period covered by
+        the inverted domain.
+
+        Outside of the periodic structure, the duty cycle of the period
+        nearest to `z` is given.
+
+        Parameters
+        ----------
+        z : float or array_like of float
+
+        Returns
+        -------
+        float or ndarray of float
+
+        """
+        assert self._periods.size, "The poling must include atleast 1 period."
+        return self._duty[self._period_index(z)]
+
+    def averaged(self, z):
+        """
+        Whether the poling is averaged with its Fourier series in the stretch
+        that begins at, or contains, `z`.
+
+        Parameters
+        ----------
+        z : float
+
+        Returns
+        -------
+        bool
+
+        """
+        idx = np.searchsorted(self._regions[:, 0], z, side="right") - 1
+        return bool(idx >= 0 and z < self._regions[idx, 1])
+
+    def next_stop(self, z):
+        """
+        The next point after `z` at which the poling changes discontinuously,
+        either a domain inversion boundary or the edge of an averaged region.
+
+        Parameters
+        ----------
+        z : float
+
+        Returns
+        -------
+        float
+            The next stop, or ``inf`` if there are none.
+
+        """
+        idx = np.searchsorted(self._stops, z, side="right")
+        return self._stops[idx] if idx < self._stops.size else np.inf
+
+    def coefficient(self, z):
+        """
+        The coefficient of the sum-frequency terms of the averaged
+        2nd-order nonlinearity at `z`.
+
+        The coefficient of the difference-frequency terms is the complex
+        conjugate.
+
+        Parameters
+        ----------
+        z : float
+
+        Returns
+        -------
+        complex
+
+        """
+        idx = int(np.searchsorted(self._starts, z, side="right")) - 1
+        idx = min(max(idx, 0), self._periods.size - 1)
+        phase = cmath.exp(-2j*pi*(z - self._starts[idx])/self._periods[idx])
+        return sum(coef * phase**m for coef, m in zip(self._coefs[idx].tolist(), self.orders))
+
+
 # %% Single Mode
 
 class Mode():
@@ -47,8 +357,11 @@ class Mode():
         wavenumber.
     g2 : array_like of complex or callable, optional
         The effective 2nd-order nonlinearity.
-    g2_inv : array_like of float, optional
-        The location of all poled domain inversion boundaries.
+    g2_inv : array_like of float or Poling, optional
+        The location of all poled domain inversion boundaries, or a `Poling`
+        object. If given as an array, the domains are stepped through exactly.
+        A `Poling` object can instead average the poling with its Fourier
+        series over long periodic stretches.
     g3 : array_like of complex or callable, optional
         The effective 3rd-order nonlinearity.
     rv_grid : array_like of float, optional
@@ -62,6 +375,13 @@ class Mode():
 
     Notes
     -----
+    Z-dependent parameters are evaluated at several points of each step of a
+    simulation. If the callables are expensive, the parameters can instead be
+    tabulated once over a grid of z positions with `tabulate`, after which
+    they are linearly interpolated between the points of the grid. The models
+    in `pynlo.model` also tabulate the parameters they derive from those of the
+    mode over the same grid.
+
     Forward traveling waves of a mode are defined using the following
     conventions:
 
@@ -78,7 +398,7 @@ class Mode():
 
         #---- Frequency Grid
         self._v_grid = np.asarray(v_grid, dtype=float)
-        self._w_grid = 2*pi*self._v_grid
+        self._w_grid = read_only(2*pi*self._v_grid)
 
         #---- Refractive Index
         if callable(beta):
@@ -101,14 +421,15 @@ class Mode():
             self._g2 = np.asarray(g2, dtype=complex)
 
         if g2_inv is None:
-            self._g2_inv = None
-            self._g2_inv_sorted = []
+            self._poling = None
         else:
             assert (g2 is not None) and (g2_inv is not None), (
                 "Poling can only be defined when g2 is defined")
-            self._g2_inv_sorted = sorted(g2_inv)
-            self._g2_inv = {z:(idx + 1) % 2 for idx, z in enumerate(self._g2_inv_sorted)}
-
+            if isinstance(g2_inv, Poling):
+                self._poling = g2_inv
+            else:
+                self._poling = Poling(g2_inv, orders=None)
+        self._g2_inv = None
 
         #---- 3rd-Order Nonlinearity
         if (g3 is None) or callable(g3):
@@ -138,11 +459,16 @@ class Mode():
             any=callable(alpha) or callable(beta),
             alpha=callable(alpha), beta=callable(beta))
         self._z_nonlinear = _NonlinearZ(
-            any=callable(g2) or callable(g3) or callable(r3),
+            any=(callable(g2) or callable(g3) or callable(r3)
+                 or (self._poling is not None and self._poling.regions.size > 0)),
             g2=callable(g2), pol=g2_inv is not None,
             g3=callable(g3), r3=callable(r3))
         self._z_mode = self.z_linear.any or self.z_nonlinear.any or self.z_nonlinear.pol
 
+        #---- Tables
+        self._z_table = None
+        self._tables = {}
+
     #---- General Properties
     @property
     def z(self):
@@ -221,8 +547,8 @@ class Mode():
         Returns
         -------
         any : bool
-            Whether there is any z dependence of the nonlinearity (excluding
-            poling).
+            Whether there is any z dependence of the nonlinearity, excluding
+            poling that is stepped through exactly.
         g2 : bool
             Z-dependent 2nd-order nonlinear parameter.
         pol : bool
@@ -235,6 +561,56 @@ class Mode():
         """
         return self._z_nonlinear
 
+    #---- Tabulation
+    @property
+    def z_table(self):
+        """
+        The z positions over which the z-dependent parameters are tabulated.
+
+        Returns
+        -------
+        None or ndarray of float
+
+        """
+        return self._z_table
+
+    def tabulate(self, z_grid):
+        """
+        Tabulate the z-dependent parameters over a grid of z positions.
+
+        Each z-dependent parameter is evaluated once at each point of the grid.
+        Afterwards, the parameters are linearly interpolated between the
+        tabulated values, and take the value at the nearest end point outside
+        of the grid. The grid should resolve the z dependence of the
+        parameters.
+
+        Parameters
+        ----------
+        z_grid : array_like of float or None
+            The z positions of the table. If ``None``, any existing table is
+            removed and the parameters are again evaluated at each position.
+
+        """
+        self._tables = {}
+        if z_grid is None:
+            self._z_table = None
+            return
+
+        z_grid = np.unique(np.asarray(z_grid, dtype=float))
+        assert (z_grid.size >= 2), "The table must include atleast 2 points."
+        for name in ["alpha", "beta", "g2", "g3", "r3"]:
+            fn = getattr(self, "_" + name)
+            if callable(fn):
+                self._tables[name] = _ZTable(z_grid, np.array([fn(z) for z in z_grid]))
+        self._z_table = z_grid
+
+    def _evaluate(self, name):
+        """Evaluate a parameter at the current position."""
+        if name in self._tables:
+            return self._tables[name](self.z)
+        value = getattr(self, "_" + name)
+        return value(self.z) if callable(value) else value
+
     #---- 1st-Order Properties
     @property
     def alpha(self):
@@ -248,7 +624,7 @@ class Mode():
         None or ndarray of float
 
         """
-        return self._alpha(self.z) if callable(self._alpha) else self._alpha
+        return self._evaluate("alpha")
 
     @property
     def beta(self):
@@ -261,7 +637,7 @@ class Mode():
 
         """
 
-        return self._beta(self.z) if callable(self._beta) else self._beta
+        return self._evaluate("beta")
 
     @property
     def n(self):
@@ -420,7 +796,7 @@ class Mode():
         None or ndarray of complex
 
         """
-        return self._g2(self.z) if callable(self._g2) else self._g2
+        return self._evaluate("g2")
 
     @property
     def g2_inv(self):
@@ -429,15 +805,33 @@ class Mode():
         mode.
 
         A value of 1 indicates the start of an inverted domain. A value of
-        0 indicates the start of an unpoled region.
+        0 indicates the start of an unpoled region. The boundaries are in
+        ascending order. The sorted array of the boundaries is available as
+        ``poling.z_invs``.
 
         Returns
         -------
         None or dict of int
 
         """
+        if self._poling is None:
+            return None
+        if self._g2_inv is None:
+            self._g2_inv = {z: (idx + 1) % 2 for idx, z in enumerate(self._poling.z_invs)}
         return self._g2_inv
 
+    @property
+    def poling(self):
+        """
+        The domain structure of the 2nd-order nonlinearity.
+
+        Returns
+        -------
+        None or Poling
+
+        """
+        return self._poling
+
     @property
     def g2_pol(self):
         """
@@ -451,8 +845,9 @@ class Mode():
         int
 
         """
-        poled = bisect.bisect_right(self._g2_inv_sorted, self.z) % 2
-        return poled
+        if self._poling is None:
+            return 0
+        return int(self._poling.pol(self.z))
 
     #---- 3rd-Order Properties
     @property
@@ -466,7 +861,7 @@ class Mode():
         None or ndarray of complex
 
         """
-        return self._g3(self.z) if callable(self._g3) else self._g3
+        return self._evaluate("g3")
 
     @property
     def gamma(self):
@@ -492,13 +887,17 @@ class Mode():
         -------
         None or ndarray of complex
         """
-        return self._r3(self.z) if callable(self._r3) else self._r3
+        return self._evaluate("r3")
 
     #---- Misc
     def copy(self):
         """A copy of the mode."""
         return copy.deepcopy(self)
 
+    def __deepcopy__(self, memo):
+        # Read-only frequency grids are shared with the copy
+        return deepcopy_shared(self, memo)
+
 
 # class GaussianMode():
 #     """
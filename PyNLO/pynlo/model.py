@@ -10,37 +10,376 @@ __all__ = ["Model", "NLSE", "UPE"]
 # %% Imports
 
 import collections
+import os
+import pickle
+import time
 import warnings
 
 import numpy as np
+from scipy import sparse
 from scipy.constants import c, pi
 from numba import njit
 
-from pynlo.light import Pulse
-from pynlo.medium import Mode
+from pynlo.light import Pulse, PowerSpectralWidth, PowerEnvelopeWidth
+from pynlo.medium import Mode, _ZTable
 from pynlo.utility import fft
+from pynlo.utility.diagnostics import Diagnostics
+from pynlo.utility.monitors import LivePlot
+from pynlo.utility.recorders import FullRecorder
 
 
 # %% Collections
 
-SimulationResult = collections.namedtuple("SimulationResult", ["pulse", "z", "a_t", "a_v"])
+SpectralEdges = collections.namedtuple("SpectralEdges", ["v_min", "v_max", "l_min", "l_max"])
+
+WavelengthSpectra = collections.namedtuple("WavelengthSpectra", ["l_grid", "p_l"])
+
+class SimulationResult(collections.namedtuple("SimulationResult", ["pulse", "z", "a_t", "a_v"])):
+    """
+    The results of a simulation, see `Model.simulate`.
+
+    The `diagnostics` attribute holds the steps recorded by a
+    `~pynlo.utility.diagnostics.Diagnostics` object, as a structured array,
+    or ``None`` if the steps were not recorded. It is not one of the fields,
+    so the results still unpack as ``pulse, z, a_t, a_v``.
+
+    The analysis methods (`e_p`, `v_width`, `t_width`, `v_edges`, `p_l`,
+    etc.) evaluate all records at once, along the last axis of the
+    records, and are calculated only once for each set of arguments. The
+    records are assumed to be unchanged after the results are first
+    analyzed.
+
+    """
+    diagnostics = None
+
+    #---- Analysis
+    def _memoize(self, key, calc):
+        """Return the cached result of `calc`, calculating it if necessary."""
+        memo = self.__dict__.setdefault("_memo", {})
+        if key not in memo:
+            memo[key] = calc()
+        return memo[key]
+
+    @property
+    def _grids(self):
+        """The time and frequency grids of the records."""
+        return self.pulse[0] if isinstance(self.pulse, list) else self.pulse
+
+    @property
+    def p_v(self):
+        """
+        The power spectrum of each record, with units of ``J/Hz``.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        assert self.a_v is not None, "The spectrum of each record is needed."
+        return self._memoize("p_v", lambda: self.a_v.real**2 + self.a_v.imag**2)
+
+    @property
+    def p_t(self):
+        """
+        The power envelope of each record, with units of ``J/s``.
+
+        If the complex envelopes were not recorded they are calculated from
+        the spectra.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        def calc():
+            a_t = self.a_t
+            if a_t is None:
+                assert self.a_v is not None, "The spectrum of each record is needed."
+                a_t = fft.fftshift(fft.ifft(fft.ifftshift(self.a_v), fsc=self._grids.dt))
+            return a_t.real**2 + a_t.imag**2
+        return self._memoize("p_t", calc)
+
+    @property
+    def e_p(self):
+        """
+        The pulse energy of each record, with units of ``J``.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        return self._memoize("e_p", lambda: np.sum(self.p_v, axis=-1) * self._grids.dv)
+
+    @property
+    def v_centroid(self):
+        """
+        The center of mass of the power spectrum of each record, with units of
+        ``Hz``.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        return self._memoize("v_centroid", lambda: _centroid(self._grids.v_grid, self.p_v))
+
+    @property
+    def t_centroid(self):
+        """
+        The center of mass of the power envelope of each record, with units of
+        ``s``.
+
+        Returns
+        -------
+        ndarray of float
+
+        """
+        return self._memoize("t_centroid", lambda: _centroid(self._grids.t_grid, self.p_t))
+
+    def v_width(self):
+        """
+        Calculate the width of each record in the frequency domain, see
+        `pynlo.light.Pulse.v_width`.
+
+        Returns
+        -------
+        fwhm : ndarray of float
+            The full width at half maximum of the power spectrum.
+        rms : ndarray of float
+            The full root-mean-square width of the power spectrum.
+        eqv : ndarray of float
+            The equivalent width of the power spectrum.
+
+        """
+        def calc():
+            grids = self._grids
+            widths = _widths(grids.v_grid, grids.dv, self.p_v)
+            return PowerSpectralWidth(*widths)
+        return self._memoize("v_width", calc)
+
+    def t_width(self):
+        """
+        Calculate the width of each record in the time domain, see
+        `pynlo.light.Pulse.t_width`.
+
+        Returns
+        -------
+        fwhm : ndarray of float
+            The full width at half maximum of the power envelope.
+        rms : ndarray of float
+            The full root-mean-square width of the power envelope.
+        eqv : ndarray of float
+            The equivalent width of the power envelope.
+
+        """
+        def calc():
+            grids = self._grids
+            widths = _widths(grids.t_grid, grids.dt, self.p_t)
+            return PowerEnvelopeWidth(*widths)
+        return self._memoize("t_width", calc)
+
+    def v_edges(self, db=-30):
+        """
+        Find the outermost frequencies of each record at which the power
+        spectrum is within `db` of its peak.
+
+        This is useful for tracking the bandwidth of a supercontinuum along
+        the propagation distance.
+
+        Parameters
+        ----------
+        db : float, optional
+            The level relative to the peak of each power spectrum, in dB. The
+            default is -30.
+
+        Returns
+        -------
+        v_min, v_max : ndarray of float
+            The minimum and maximum frequencies, with units of ``Hz``.
+        l_min, l_max : ndarray of float
+            The minimum and maximum wavelengths, with units of ``m``.
+
+        """
+        def calc():
+            p_v = self.p_v
+            threshold = 10**(db/10) * p_v.max(axis=-1)
+            v_min, v_max = _edges(self._grids.v_grid, p_v, threshold)
+            return SpectralEdges(v_min=v_min, v_max=v_max, l_min=c/v_max, l_max=c/v_min)
+        return self._memoize(("v_edges", db), calc)
+
+    def p_l(self, l_grid=None, db=False):
+        """
+        The power spectrum of each record as a density over wavelength,
+        resampled onto a uniform wavelength grid.
+
+        The power spectral density is converted from a per ``Hz`` to a per
+        ``m`` basis by the ratio of the frequency and wavelength differentials
+        and is then linearly interpolated onto `l_grid`.
+
+        Parameters
+        ----------
+        l_grid : array_like of float, optional
+            The wavelength grid, with units of ``m``. The default is a uniform
+            grid, with the same number of points as the frequency grid, that
+            spans the wavelengths of the frequency grid.
+        db : bool, optional
+            If ``True``, the spectra are returned in dB relative to the
+            maximum of all records. The default returns the spectra with units
+            of ``J/m``.
+
+        Returns
+        -------
+        l_grid : ndarray of float
+            The wavelength grid.
+        p_l : ndarray of float
+            The power spectra.
+
+        """
+        key = None if l_grid is None else np.asarray(l_grid, dtype=float).tobytes()
+        def calc():
+            #---- Wavelength Grids
+            v_grid = self._grids.v_grid
+            l_src = c/v_grid[::-1] # monotonically increasing
+            if l_grid is None:
+                l_out = np.linspace(l_src[0], l_src[-1], v_grid.size)
+            else:
+                l_out = np.asarray(l_grid, dtype=float)
+
+            #---- Interpolate
+            # linear interpolation as a sparse matrix, 2 weights per point
+            idx = np.clip(np.searchsorted(l_src, l_out) - 1, 0, l_src.size-2)
+            weight = (l_out - l_src[idx])/(l_src[idx+1] - l_src[idx])
+            inside = (l_out >= l_src[0]) & (l_out <= l_src[-1])
+            cols = np.arange(l_out.size)
+            interp = sparse.csr_matrix(
+                (np.concatenate([(1 - weight)*inside, weight*inside]),
+                 ((v_grid.size-1) - np.concatenate([idx, idx+1]), np.concatenate([cols, cols]))),
+                shape=(v_grid.size, l_out.size))
+            p_v = self.p_v * (v_grid**2/c)
+            p_l = np.asarray(p_v.reshape(-1, v_grid.size) @ interp).reshape(p_v.shape[:-1] + l_out.shape)
+
+            #---- dB
+            if db:
+                with np.errstate(divide="ignore"):
+                    p_l = 10*np.log10(p_l/p_l.max())
+            return WavelengthSpectra(l_grid=l_out, p_l=p_l)
+        return self._memoize(("p_l", key, db), calc)
+
+    def spectrograms(self, t_fwhm=None, v_range=None, n_t=None, t_range=None, n_threads=1):
+        """
+        Calculate the spectrogram of each record, see
+        `pynlo.light.Pulse.spectrogram`.
+
+        The spectrograms are calculated one at a time as they are iterated
+        over, e.g. to draw the frames of an animation, so only one is held in
+        memory at a time.
+
+        Parameters
+        ----------
+        t_fwhm : float, optional
+            The full width at half maximum of the Gaussian window. The default
+            derives a fwhm from the bandwidth of the first record, which is
+            used for all records so that the spectrograms share the same
+            delays.
+        v_range, n_t, t_range, n_threads : optional
+            See `pynlo.light.Pulse.spectrogram`.
+
+        Yields
+        ------
+        pynlo.light.Spectrogram
+            The spectrogram of each record, in the order of `z`.
+
+        """
+        assert self.a_v is not None, "The spectrum of each record is needed."
+        assert self.a_v.ndim == 2, "Only the records of a single simulation are supported."
+        pulse = self.pulse.copy()
+        if t_fwhm is None:
+            pulse.a_v = self.a_v[0]
+            t_fwhm = pulse._gate_fwhm()
+        for a_v in self.a_v:
+            pulse.a_v = a_v
+            yield pulse.spectrogram(
+                t_fwhm=t_fwhm, v_range=v_range, n_t=n_t, t_range=t_range, n_threads=n_threads)
 
 
 # %% Routines
 
-@njit(parallel=True)
+def _centroid(grid, p):
+    """The center of mass of each power distribution along the last axis."""
+    return (p @ grid) / np.sum(p, axis=-1)
+
+def _edges(grid, p, threshold):
+    """The outermost grid points at which each power distribution along the
+    last axis is greater than or equal to the threshold."""
+    mask = p >= threshold[..., np.newaxis]
+    idx_min = np.argmax(mask, axis=-1)
+    idx_max = (p.shape[-1]-1) - np.argmax(mask[..., ::-1], axis=-1)
+    return grid[idx_min], grid[idx_max]
+
+def _widths(grid, d_grid, p):
+    """The fwhm, rms, and equivalent widths of each power distribution along
+    the last axis, see `pynlo.light.Pulse.v_width`."""
+    #---- FWHM
+    x_min, x_max = _edges(grid, p, 0.5*p.max(axis=-1))
+    fwhm = d_grid + (x_max - x_min)
+
+    #---- RMS
+    # offset from the center of the grid to preserve the precision of the variance
+    x = grid - grid[grid.size//2]
+    p_norm = np.sum(p, axis=-1)
+    x_avg = (p @ x)/p_norm
+    x_var = (p @ x**2)/p_norm - x_avg**2
+    rms = 2 * x_var**0.5
+
+    #---- Equivalent
+    eqv = p_norm**2 * d_grid / np.einsum("...i,...i->...", p, p)
+    return fwhm, rms, eqv
+
+@njit(parallel=True, cache=True)
 def linear_operator(k, dz):
     """JIT-compiled exponential function."""
     return np.exp(-1j*dz * k)
 
-@njit(parallel=True)
+@njit(cache=True)
 def l2_error(a_RK4, a_RK3):
-    """JIT-compiled l2 norm error."""
-    l2_norm = np.sum(np.real(a_RK4)**2 + np.imag(a_RK4)**2)**0.5
-    rel_error = (a_RK4 - a_RK3)/l2_norm
-    return np.sum(np.real(rel_error)**2 + np.imag(rel_error)**2)**0.5
-
-@njit
+    """JIT-compiled l2 norm error. For a stack of spectra, the largest error of
+    the individual spectra is returned."""
+    n = a_RK4.shape[-1]
+    a_RK4_2d = a_RK4.reshape((-1, n))
+    a_RK3_2d = a_RK3.reshape((-1, n))
+    max_error = 0.0
+    for row in range(a_RK4_2d.shape[0]):
+        l2_norm = 0.0
+        l2_diff = 0.0
+        for idx in range(n):
+            a_RK4_i = np.complex128(a_RK4_2d[row, idx]) # double precision
+            a_RK3_i = np.complex128(a_RK3_2d[row, idx])
+            l2_norm += abs2(a_RK4_i)
+            l2_diff += abs2(a_RK4_i - a_RK3_i)
+        max_error = max(max_error, (l2_diff/l2_norm)**0.5)
+    return max_error
+
+@njit(cache=True)
+def cq_error(a_0, a_1, weights):
+    """JIT-compiled relative change of a conserved quantity, the sum of the
+    power spectrum times `weights`, e.g. ``1/v_grid`` for the photon number.
+    For a stack of spectra, the largest change of the individual spectra is
+    returned."""
+    n = a_0.shape[-1]
+    a_0_2d = a_0.reshape((-1, n))
+    a_1_2d = a_1.reshape((-1, n))
+    max_error = 0.0
+    for row in range(a_0_2d.shape[0]):
+        cq_0 = 0.0
+        cq_1 = 0.0
+        for idx in range(n):
+            cq_0 += weights[idx] * abs2(np.complex128(a_0_2d[row, idx])) # double precision
+            cq_1 += weights[idx] * abs2(np.complex128(a_1_2d[row, idx]))
+        max_error = max(max_error, abs(cq_1 - cq_0)/cq_0)
+    return max_error
+
+@njit(cache=True)
 def fdd(f, dx, idx):
     """JIT-compiled 2nd-order finite difference derivative."""
     #---- Right Bound
@@ -56,27 +395,27 @@ def fdd(f, dx, idx):
     #---- Central
     return (f[idx+1] - f[idx-1])/(2*dx)
 
-@njit
+@njit(cache=True)
 def prod(a, b):
     """JIT-compiled product. Useful for speeding up complex multiplications."""
     return a * b
 
-@njit
+@njit(cache=True)
 def abs2(a):
     """JIT-compiled squared absolute value."""
     return a.real**2 + a.imag**2
 
-@njit
+@njit(cache=True)
 def rk1(a, k, dz):
     """JIT-compiled 1st-order Runge-Kutta."""
     return a + dz*k
 
-@njit
+@njit(cache=True)
 def rk3(b, k4, k5, dz):
     """JIT-compiled 3rd-order Runge-Kutta."""
     return b + dz/30.0 * (2.0*k4 + 3.0*k5)
 
-@njit
+@njit(cache=True)
 def rk4(ai, ki1, ki2, ki3, k4, ip, dz):
     """JIT-compiled 4th-order Runge-Kutta."""
     bi = ai + dz/6.0 * (ki1 + 2.0*(ki2 + ki3))
@@ -84,6 +423,168 @@ def rk4(ai, ki1, ki2, ki3, k4, ip, dz):
     rk4 = b + dz/6.0 * k4
     return rk4, b
 
+#---- In-Place Routines
+# These routines operate on contiguous stacks of spectra, i.e. arrays whose
+# last axis is the frequency axis. The operators (`op`, `ip`) and step sizes
+# (`dz`) are given either once for all spectra or once for each spectrum.
+
+@njit(cache=True)
+def l2_error_out(a_RK4, a_RK3, out):
+    """JIT-compiled l2 norm error of each spectrum, evaluated into `out`."""
+    n = a_RK4.shape[-1]
+    a_RK4_2d = a_RK4.reshape((-1, n))
+    a_RK3_2d = a_RK3.reshape((-1, n))
+    for row in range(a_RK4_2d.shape[0]):
+        l2_norm = 0.0
+        l2_diff = 0.0
+        for idx in range(n):
+            a_RK4_i = np.complex128(a_RK4_2d[row, idx]) # double precision
+            a_RK3_i = np.complex128(a_RK3_2d[row, idx])
+            l2_norm += abs2(a_RK4_i)
+            l2_diff += abs2(a_RK4_i - a_RK3_i)
+        out[row] = (l2_diff/l2_norm)**0.5
+    return out
+
+@njit(cache=True)
+def linear_operator_out(k, dz, out):
+    """JIT-compiled exponential function, evaluated into `out`."""
+    n = k.size
+    out_2d = out.reshape((-1, n))
+    for row in range(out_2d.shape[0]):
+        dz_r = dz[row if dz.size > 1 else 0]
+        for idx in range(n):
+            out_2d[row, idx] = np.exp(-1j*dz_r * k[idx])
+    return out
+
+@njit(cache=True)
+def prod_out(op, a, out):
+    """JIT-compiled product, evaluated into `out`."""
+    n = a.shape[-1]
+    op_2d = op.reshape((-1, n))
+    a_2d = a.reshape((-1, n))
+    out_2d = out.reshape((-1, n))
+    for row in range(a_2d.shape[0]):
+        op_r = op_2d[row if op_2d.shape[0] > 1 else 0]
+        for idx in range(n):
+            out_2d[row, idx] = op_r[idx] * a_2d[row, idx]
+    return out
+
+@njit(cache=True)
+def abs2_out(a, out):
+    """JIT-compiled squared absolute value, evaluated into `out`."""
+    a_1d = a.reshape(a.size)
+    out_1d = out.reshape(out.size)
+    for idx in range(a_1d.size):
+        out_1d[idx] = a_1d[idx].real**2 + a_1d[idx].imag**2
+    return out
+
+@njit(cache=True)
+def kerr_out(a, a2, out):
+    """JIT-compiled product with the real part of `a2`, evaluated into `out`."""
+    a_1d = a.reshape(a.size)
+    a2_1d = a2.reshape(a2.size)
+    out_1d = out.reshape(out.size)
+    for idx in range(a_1d.size):
+        out_1d[idx] = a_1d[idx] * a2_1d[idx].real
+    return out
+
+@njit(cache=True)
+def kerr_abs2_out(a, out):
+    """JIT-compiled product with the squared absolute value, evaluated into
+    `out`."""
+    a_1d = a.reshape(a.size)
+    out_1d = out.reshape(out.size)
+    for idx in range(a_1d.size):
+        out_1d[idx] = a_1d[idx] * (a_1d[idx].real**2 + a_1d[idx].imag**2)
+    return out
+
+@njit(cache=True)
+def kerr_phase_out(a, a2, phi, out):
+    """JIT-compiled change of `a` by the phase rotation ``exp(1j*phi*a2.real)``,
+    evaluated into `out`."""
+    a_1d = a.reshape(a.size)
+    a2_1d = a2.reshape(a2.size)
+    out_1d = out.reshape(out.size)
+    for idx in range(a_1d.size):
+        phi_i = phi * a2_1d[idx].real
+        out_1d[idx] = a_1d[idx] * complex(-2*np.sin(0.5*phi_i)**2, np.sin(phi_i))
+    return out
+
+@njit(cache=True)
+def kerr_abs2_phase_out(a, phi, out):
+    """JIT-compiled change of `a` by the phase rotation
+    ``exp(1j*phi*abs(a)**2)``, evaluated into `out`."""
+    a_1d = a.reshape(a.size)
+    out_1d = out.reshape(out.size)
+    for idx in range(a_1d.size):
+        phi_i = phi * (a_1d[idx].real**2 + a_1d[idx].imag**2)
+        out_1d[idx] = a_1d[idx] * complex(-2*np.sin(0.5*phi_i)**2, np.sin(phi_i))
+    return out
+
+@njit(cache=True)
+def rk1_out(a, k, dz, out):
+    """JIT-compiled 1st-order Runge-Kutta, evaluated into `out`."""
+    n = a.shape[-1]
+    a_2d = a.reshape((-1, n))
+    k_2d = k.reshape((-1, n))
+    out_2d = out.reshape((-1, n))
+    for row in range(a_2d.shape[0]):
+        dz_r = dz[row if dz.size > 1 else 0]
+        for idx in range(n):
+            out_2d[row, idx] = a_2d[row, idx] + dz_r*k_2d[row, idx]
+    return out
+
+@njit(cache=True)
+def rk1_ip_out(a, k, dz, ip, out):
+    """JIT-compiled 1st-order Runge-Kutta, evaluated out of the interaction
+    picture into `out`."""
+    n = a.shape[-1]
+    a_2d = a.reshape((-1, n))
+    k_2d = k.reshape((-1, n))
+    ip_2d = ip.reshape((-1, n))
+    out_2d = out.reshape((-1, n))
+    for row in range(a_2d.shape[0]):
+        dz_r = dz[row if dz.size > 1 else 0]
+        ip_r = ip_2d[row if ip_2d.shape[0] > 1 else 0]
+        for idx in range(n):
+            out_2d[row, idx] = ip_r[idx] * (a_2d[row, idx] + dz_r*k_2d[row, idx])
+    return out
+
+@njit(cache=True)
+def rk3_out(b, k4, k5, dz, out):
+    """JIT-compiled 3rd-order Runge-Kutta, evaluated into `out`."""
+    n = b.shape[-1]
+    b_2d = b.reshape((-1, n))
+    k4_2d = k4.reshape((-1, n))
+    k5_2d = k5.reshape((-1, n))
+    out_2d = out.reshape((-1, n))
+    for row in range(b_2d.shape[0]):
+        dz_r = dz[row if dz.size > 1 else 0]
+        for idx in range(n):
+            out_2d[row, idx] = b_2d[row, idx] + dz_r/30.0 * (2.0*k4_2d[row, idx] + 3.0*k5_2d[row, idx])
+    return out
+
+@njit(cache=True)
+def rk4_out(ai, ki1, ki2, ki3, k4, ip, dz, out, b):
+    """JIT-compiled 4th-order Runge-Kutta, evaluated into `out` and `b`."""
+    n = ai.shape[-1]
+    ai_2d = ai.reshape((-1, n))
+    ki1_2d = ki1.reshape((-1, n))
+    ki2_2d = ki2.reshape((-1, n))
+    ki3_2d = ki3.reshape((-1, n))
+    k4_2d = k4.reshape((-1, n))
+    ip_2d = ip.reshape((-1, n))
+    out_2d = out.reshape((-1, n))
+    b_2d = b.reshape((-1, n))
+    for row in range(ai_2d.shape[0]):
+        dz_r = dz[row if dz.size > 1 else 0]
+        ip_r = ip_2d[row if ip_2d.shape[0] > 1 else 0]
+        for idx in range(n):
+            bi = ai_2d[row, idx] + dz_r/6.0 * (ki1_2d[row, idx] + 2.0*(ki2_2d[row, idx] + ki3_2d[row, idx]))
+            b_2d[row, idx] = ip_r[idx] * bi # out of interaction picture
+            out_2d[row, idx] = b_2d[row, idx] + dz_r/6.0 * k4_2d[row, idx]
+    return out
+
 
 # %% Single-Mode Models
 
@@ -99,14 +600,76 @@ class Model():
         The input pulse.
     mode : :py:class:`~pynlo.medium.Mode`
         The optical mode in which the pulse propagates.
+    precision : str, optional
+        The floating-point precision of the simulation, either ``"double"``,
+        ``"single"``, or ``"mixed"``. The default is ``"double"``. See the
+        notes for details.
 
     See Also
     --------
     NLSE : A model that implements the 3rd-order Kerr and Raman effects.
     UPE : A model that implements both 2nd- and 3rd-order nonlinearities.
 
+    Notes
+    -----
+    With ``"double"`` precision, the simulation is calculated with 64-bit
+    floats. With ``"single"`` precision, the spectra, the stages of the
+    integration methods, and the transforms and products of the nonlinear
+    operator are 32-bit, which halves the memory and bandwidth of the work
+    arrays. With ``"mixed"`` precision, only the nonlinear operator is
+    evaluated in single precision, and its result is accumulated into the
+    double precision stages. The step sizes, the phase of the linear
+    operator, and the local error estimate are always calculated in double
+    precision.
+
+    The rounding error of single precision floats, about 1e-7 relative to the
+    largest value, limits the local error estimate of the ``"single"``
+    precision model, so its `local_error` should be 1e-6 or larger. With
+    ``"mixed"`` precision, the rounding error of the nonlinear operator is
+    scaled by the step size and is much smaller than the local error. The
+    results of the examples in the ``examples`` directory, compared with
+    those of the ``"double"`` precision model at the end of each simulation,
+    are as follows:
+
+    ==========================  ======  ============  ============
+    Example                     Points  Mixed         Single
+    ==========================  ======  ============  ============
+    optical-solitons            2048    2e-5 (4e-8)   1e-4 (3e-7)
+    phase-matching              4       4e-8 (6e-9)   4e-4 (4e-6)
+    ppln_cascaded-chi2          8192    3e-7 (2e-8)   4e-6 (3e-7)
+    silica-pcf_supercontinuum   4096    4e-5 (7e-8)   7e-5 (6e-7)
+    ==========================  ======  ============  ============
+
+    The first number is the largest relative l2 norm difference of the
+    output spectra and the number in parentheses is the relative difference
+    of the output energy. The spectra agree to within 0.01 dB down to -40 dB
+    of their peaks, except for the ``"single"`` precision model in the
+    phase-matching example (0.04 dB), which requests a local error (1e-9)
+    below the rounding error of single precision floats. On a single core
+    with MKL transforms, the reduced precision models are 1.3-1.6x faster
+    in the examples with 4096 and 8192 points, while the examples with
+    smaller grids are not faster.
+
     """
-    def __init__(self, pulse, mode):
+    # The order of the local error estimate of each integration method, in
+    # powers of the step size. For "ssfm" and "rk4ip", the step size is
+    # scaled by 2**(+-1/q) as in Sinkin et al. (q=3, the difference of the
+    # coarse and fine split steps) and Heidt (q=5: the change of the
+    # conserved quantity over a step of the RK4IP is of the same order as its
+    # local error, O(dz**5), and Heidt's rule scales the step by 2**(1/5)).
+    _error_order = {"erk43ip": 4, "ssfm": 3, "rk4ip": 5}
+
+    # The parameters set by `update_linearity` and `update_nonlinearity` that
+    # are used by the operators, which are tabulated along with the mode
+    _z_attributes = {"linearity": ("kappa_cm",),
+                     "nonlinearity": ()}
+
+    def __init__(self, pulse, mode, precision="double"):
+        #---- Precision
+        assert (precision in ["double", "single", "mixed"]), (
+            "Precision choice '{:}' is unrecognized").format(precision)
+        self.precision = precision
+
         #---- Pulse Parameters
         assert isinstance(pulse, Pulse)
         self.pulse = pulse.copy()
@@ -132,23 +695,135 @@ class Model():
         self.l_grid = c/self.v_grid
         self.dv_dl = self.v_grid**2/c # power density conversion factor
 
+        # Weights of the quantities conserved by the nonlinearity, the photon
+        # number and the energy, in the order of the spectra passed to `step`
+        self._photon_weights = np.ascontiguousarray(self._step_order(1/self.v_grid))
+        self._energy_weights = np.ones(self.n_points)
+        self._cq_weights = self._photon_weights # the conserved quantity of "rk4ip"
+
         #---- Implementation Details
         # Define Operators
+        self._diagnostics = None
+        self._operators = {}
+        self._raw_operators = {}
         self._linear_operator = self.linear_operator
         self._nonlinear_operator = self.nonlinear_operator
+        self._nonlinear_step = self._nonlinear_step_midpoint
+
+        # Integration Method
+        self.method = "erk43ip"
+
+        # Work Arrays
+        self._buffers = {}
+
+        # Data Types
+        # The spectra and stages of the integration (`_dtype`), and the
+        # transforms and products of the nonlinear operator (`_nl_dtype`)
+        self._dtype = np.complex64 if precision == "single" else np.complex128
+        self._nl_dtype = np.complex128 if precision == "double" else np.complex64
+        self._nl_rdtype = np.float64 if precision == "double" else np.float32
+
+        # Tabulated Parameters
+        self._z_tables = {}
+        self._tabulating = False
 
         # Initialize Mode Parameters
         self.update_linearity(force_update=True)
         self.update_nonlinearity(force_update=True)
         self.update_poling(force_update=True)
 
-    def estimate_step_size(self, local_error=1e-6, dz=10e-6, n=10, a_v=None, z=0, db=False):
+    def _buffer(self, name, shape, dtype=None):
+        """
+        A preallocated work array, which is reused by every call with the same
+        name, shape, and data type. The default data type is that of the
+        spectra of the integration.
+
+        """
+        if dtype is None:
+            dtype = self._dtype
+        key = (name, shape, dtype)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.zeros(shape, dtype=dtype)
+        return buffer
+
+    def _nl_param(self, x):
+        """
+        A parameter of the nonlinear operator, cast to the precision of the
+        operator.
+
+        """
+        if x is None or self.precision == "double":
+            return x
+        return np.asarray(x, dtype=self._nl_dtype)
+
+    def _step_order(self, x):
+        """
+        Arrange `x`, defined over the frequency grid, in the same order as the
+        spectra passed to `step`.
+
+        """
+        return x
+
+    #---- Operator Timing
+    @property
+    def _linear_operator(self):
+        """The linear operator used by the integration methods."""
+        return self._operators["linear"]
+
+    @_linear_operator.setter
+    def _linear_operator(self, operator):
+        self._set_operator("linear", operator)
+
+    @property
+    def _nonlinear_operator(self):
+        """The nonlinear operator used by the integration methods."""
+        return self._operators["nonlinear"]
+
+    @_nonlinear_operator.setter
+    def _nonlinear_operator(self, operator):
+        self._set_operator("nonlinear", operator)
+
+    @property
+    def _nonlinear_step(self):
+        """The nonlinear substep of the split-step Fourier method."""
+        return self._operators["nonlinear step"]
+
+    @_nonlinear_step.setter
+    def _nonlinear_step(self, operator):
+        self._set_operator("nonlinear step", operator)
+
+    def _set_operator(self, kind, operator):
+        """
+        Set the `kind` operator, either ``"linear"``, ``"nonlinear"``, or the
+        ``"nonlinear step"`` of `step_ssfm`, which is timed while the steps of
+        a simulation are being diagnosed. The nonlinear step is timed as part
+        of the nonlinear operator, and calls the untimed operators.
+
+        """
+        self._raw_operators[kind] = operator
+        if self._diagnostics is not None:
+            operator = self._diagnostics.timed(kind.split()[0], operator)
+        self._operators[kind] = operator
+
+    def _set_diagnostics(self, diagnostics):
+        """
+        Pass each step of `propagate` to the given diagnostics, or stop if
+        ``None``.
+
+        """
+        self._diagnostics = diagnostics
+        for kind, operator in list(self._raw_operators.items()):
+            self._set_operator(kind, operator)
+
+    def estimate_step_size(self, local_error=1e-6, dz=10e-6, n=10, a_v=None, z=0, db=False,
+                           method=None):
         """
         Estimate the step size that yields the target local error.
 
-        This method uses the same adaptive step size algorithm as the main
-        simulation. For a more accurate estimate, increase `n` to iteratively
-        approach the optimal step size.
+        This method uses the same integration method and local error estimate
+        as the main simulation. For a more accurate estimate, increase `n` to
+        iteratively approach the optimal step size.
 
         Parameters
         ----------
@@ -166,6 +841,9 @@ class Model():
             The z position in the mode. The default is 0.
         db : bool, optional
             Debugging flag which turns on printing of intermediate results.
+        method : str, optional
+            The integration method, see `simulate`. The default is ``None``,
+            which uses the method of the last simulation.
 
         Returns
         -------
@@ -175,21 +853,26 @@ class Model():
         """
         if a_v is None:
             a_v = self.pulse.a_v
+        if method is None:
+            method = self.method
+        assert (method in self._error_order), (
+            "Method choice '{:}' is unrecognized").format(method)
 
         for _ in range(n):
             #---- Integrate by dz
-            a_RK4_v, a_RK3_v, _ = self.step(a_v, z, dz)
+            _, est_error, _ = self._method_step(a_v, z, z + dz, method=method)
 
             #---- Estimate the Relative Local Error
-            est_error = l2_error(a_RK4_v, a_RK3_v)
-            error_ratio = (est_error/local_error)**0.25
+            error_ratio = (est_error/local_error)**(1/self._error_order[method])
             if db: print("dz={:.3g},\t error={:.3g}".format(dz, est_error))
 
             #---- Update Step Size
             dz = dz/min(2, max(error_ratio, 0.5))
         return dz
 
-    def simulate(self, z_grid, dz=None, local_error=1e-6, n_records=None, plot=None):
+    def simulate(self, z_grid, dz=None, local_error=1e-6, n_records=None, plot=None,
+                 recorder=None, adaptive=None, checkpoint_path=None, checkpoint_every=600.0,
+                 method="erk43ip", diagnostics=None):
         """
         Simulate propagation of the input pulse through the optical mode.
 
@@ -212,13 +895,68 @@ class Model():
             `z_grid`. If ``None``, the default is to return all points as
             defined in `z_grid`. The record always includes the starting and
             ending points.
-        plot : None or string, optional
+        plot : None, string, or pynlo.utility.monitors.LivePlot, optional
             A flag that activates real-time visualization of the simulation.
             The options are ``"frq"``, ``"time"``, or ``"wvl"``, corresponding
             to the frequency, time, and wavelength domains. If set, the plot is
             updated each time the simulation reaches one of the z positions
-            returned at the output. If ``None``, the default is to run the
-            simulation without real-time plotting.
+            returned at the output. The plot is drawn by a separate process,
+            which skips frames instead of slowing the simulation. Pass a
+            `~pynlo.utility.monitors.LivePlot` to save the frames to disk
+            instead of showing them, or to adjust how frames are dropped. If
+            ``None``, the default is to run the simulation without real-time
+            plotting.
+        recorder : pynlo.utility.recorders.Recorder, optional
+            An object that receives the pulse at each of the z positions
+            returned at the output, as they are reached. Use one of the
+            recorders in `pynlo.utility.recorders` to only keep the spectrum,
+            a band of the spectrum in dB, or to write the records to a file.
+            The default is ``None``, which records the full spectrum and
+            complex envelope.
+        adaptive : pynlo.utility.recorders.AdaptiveRecording, optional
+            A policy that adds records between the points set by `z_grid` and
+            `n_records` wherever the pulse changes quickly, up to a maximum
+            number of records. The default is ``None``, which only records at
+            the given points.
+        checkpoint_path : str, optional
+            If set, the state of the simulation, including the records taken so
+            far, is periodically saved to this file. An interrupted simulation
+            can be continued with `resume`. The recorder and the adaptive
+            recording policy must be picklable. The default is ``None``, which
+            does not save checkpoints.
+        checkpoint_every : float, optional
+            The minimum wall time, in seconds, between checkpoints. Checkpoints
+            are only saved after reaching one of the points of the z grid (i.e.
+            the points in `z_grid`, the record points, and the adaptive check
+            points). The default is 600.
+        method : string, optional
+            The integration method. The options are ``"erk43ip"``, ``"ssfm"``,
+            or ``"rk4ip"``. The default, ``"erk43ip"``, is the embedded 4th-
+            and 3rd-order Runge-Kutta in the interaction picture method (see
+            `step`). ``"ssfm"`` is the symmetric split-step Fourier method with
+            the local error estimate of Sinkin et al. (see `step_ssfm`).
+            ``"rk4ip"`` is the 4th-order Runge-Kutta in the interaction picture
+            method, with the local error estimated from the relative change of
+            the photon number (see `step_rk4ip`). Since the photon number is
+            not conserved in modes with gain or loss, or by processes that
+            create or annihilate photons, e.g. 2nd-order sum- and
+            difference-frequency generation in the `UPE`, ``"rk4ip"`` is only
+            suitable for lossless modes with 3rd-order nonlinearities. The
+            `NLSE` with a frequency-independent nonlinear parameter conserves
+            the energy instead, which is then used. The local errors of each method are not
+            equivalent, ``"rk4ip"`` typically needs a target that is several
+            orders of magnitude smaller than the others for the same accuracy.
+        diagnostics : bool or pynlo.utility.diagnostics.Diagnostics, optional
+            If set, each step of the adaptive step size algorithm is recorded,
+            including the step size, the local error estimate, the energy and
+            photon number, the energy at the edges of the frequency window,
+            and the time spent in the linear and nonlinear operators. Pass a
+            `~pynlo.utility.diagnostics.Diagnostics` object to write the steps
+            to a log as they are taken, or to stop the simulation when the
+            energy or photon number drifts, energy reaches the edges of the
+            window, or the step size collapses. The steps are returned as the
+            ``diagnostics`` attribute of the results. The default is ``None``,
+            which does not record the steps.
 
         Returns
         -------
@@ -232,7 +970,45 @@ class Model():
             The root-power complex envelope of the pulse at each z position.
         a_v : ndarray of complex
             The root-power spectrum of the pulse at each z position.
+
+        Notes
+        -----
+        When a `recorder` is given, `a_t` and `a_v` are taken from its ``a_t``
+        and ``a_v`` attributes, and are ``None`` if it does not have them.
+
+        The results are a :py:class:`SimulationResult`, whose `diagnostics`
+        attribute is the structured array of the recorded steps, see
+        `~pynlo.utility.diagnostics.Diagnostics`.
+
+        The local error of the ``"ssfm"`` and ``"rk4ip"`` methods is
+        controlled as in [1]_ and [2]_. The step size is halved and the step
+        repeated if the error exceeds twice the target, and is otherwise
+        decreased or increased by a factor of ``2**(1/q)`` if the error is
+        above the target or below half of the target, where `q` is the order
+        of the error estimate.
+
+        References
+        ----------
+        .. [1] O. V. Sinkin, R. Holzlöhner, J. Zweck, and C. R. Menyuk,
+            "Optimization of the split-step Fourier method in modeling
+            optical-fiber communications systems," Journal of Lightwave
+            Technology, Volume 21, Issue 1, 2003, Pages 61-68,
+            https://doi.org/10.1109/JLT.2003.808628
+        .. [2] A. M. Heidt, "Efficient Adaptive Step Size Method for the
+            Simulation of Supercontinuum Generation in Optical Fibers,"
+            Journal of Lightwave Technology, Volume 27, Issue 18, 2009, Pages
+            3984-3991, https://doi.org/10.1109/JLT.2009.2021538
+
         """
+        #---- Method
+        assert (method in self._error_order), (
+            "Method choice '{:}' is unrecognized").format(method)
+        if method == "rk4ip" and (self.alpha is not None or self.mode.g2 is not None):
+            warnings.warn("The photon number is not conserved in modes with gain or loss, or with"
+                          " a 2nd-order nonlinearity, so the local error of the 'rk4ip' method is"
+                          " unreliable.", stacklevel=2)
+        self.method = method
+
         #---- Z Grid
         z_grid = np.asarray(z_grid, dtype=float)
         if z_grid.size==1:
@@ -248,85 +1024,372 @@ class Model():
             z_grid = np.unique(np.append(z_grid, z_record))
         z_record = {z:idx for idx, z in enumerate(z_record)}
 
-        if self.mode.z_nonlinear.pol: # support subclasses with poling
-            # always simulate up to the edge of a poled domain
-            z_grid = np.unique(np.append(z_grid, list(self.mode.g2_inv)))
+        if adaptive is not None:
+            assert (adaptive.max_records >= n_records), (
+                "The maximum number of records must include the given points.")
+            # check the pulse at these points, in addition to recording it at
+            # the given points
+            z_check = np.linspace(z_grid.min(), z_grid.max(), adaptive.n_checks)
+            z_grid = np.unique(np.append(z_grid, z_check))
 
         #---- Setup
         z = z_grid[0]
         pulse_out = self.pulse.copy()
 
-        # Frequency Domain
-        a_v_record = np.empty((n_records,pulse_out.n), dtype=complex)
-        a_v_record[0,:] = pulse_out.a_v
+        # Poling, which is otherwise left as it was at the end of the last simulation
+        if self.mode.z_nonlinear.pol:
+            self.mode.z = z
+            self.update_poling(force_update=True)
 
-        # Time Domain
-        a_t_record = np.empty((n_records,pulse_out.n), dtype=complex)
-        a_t_record[0,:] = pulse_out.a_t
+        # Records
+        if recorder is None:
+            recorder = FullRecorder()
+        if adaptive is None:
+            recorder.start(pulse_out, np.fromiter(z_record.keys(), dtype=float))
+        else:
+            recorder.start(pulse_out, np.full(adaptive.max_records, np.nan))
+            adaptive.reset(pulse_out)
+        recorder.record(0, pulse_out)
+        z_out = [z]
 
         # Step Size
         if dz is None:
-            dz = self.estimate_step_size(pulse_out.a_v, z, local_error)
+            dz = self.estimate_step_size(local_error=local_error, a_v=pulse_out.a_v, z=z)
             print("Initial Step Size:\t{:.3g}m".format(dz))
 
+        # Diagnostics
+        if diagnostics is True:
+            diagnostics = Diagnostics()
+        elif diagnostics is False:
+            diagnostics = None
+        if diagnostics is not None:
+            diagnostics.start(
+                self._step_order(self.v_grid), self.pulse.dv, self._step_order(pulse_out.a_v))
+
         # Plotting
         if plot is not None:
-            assert (plot in ["frq", "time", "wvl"]), (
-                "Plot choice '{:}' is unrecognized").format(plot)
-            # Setup Plots
-            self._setup_plots(plot, pulse_out, z)
+            if isinstance(plot, str):
+                plot = LivePlot(plot)
+            plot.start(pulse_out, z)
+
+        #---- Propagate
+        state = dict(
+            z_grid=z_grid, idx=1, z_record=z_record, z_out=z_out,
+            recorder=recorder, adaptive=adaptive, pulse_out=pulse_out,
+            z=z, dz=dz, k5_v=None, cont=False, local_error=local_error, method=method,
+            diagnostics=diagnostics)
+        return self._simulate(state, plot=plot, checkpoint_path=checkpoint_path,
+                              checkpoint_every=checkpoint_every)
+
+    def simulate_batch(self, a_v, z_grid, dz=None, local_error=1e-6, n_records=None,
+                       row_steps=False, method="erk43ip"):
+        """
+        Simulate propagation of a stack of input spectra through the optical
+        mode.
+
+        The spectra are propagated together, using 2D transforms over the
+        stack, which is more efficient than simulating each in turn when
+        only the input field changes, e.g. for noise ensembles or sweeps of
+        the pulse energy or width.
+
+        Parameters
+        ----------
+        a_v : array_like of complex
+            An `(m, n)` stack of root-power spectra, defined over the frequency
+            grid of the model.
+        z_grid : float or array_like of floats
+            The total propagation distance over which to simulate, or the z
+            positions at which to solve for the pulse spectra. See `simulate`.
+        dz : float, optional
+            The initial step size. If ``None``, one will be estimated.
+        local_error : float, optional
+            The target relative local error for the adaptive step size
+            algorithm. The default is 1e-6.
+        n_records : None or int, optional
+            The number of simulation points to return. See `simulate`.
+        row_steps : bool, optional
+            If ``False``, all spectra are advanced with a common step size
+            set by the spectrum with the largest error. If ``True``, each
+            spectrum has its own step size, which is more efficient if the
+            spectra evolve at different rates. Separate step sizes are only
+            supported in modes without z-dependent parameters and with the
+            ``"erk43ip"`` method. The default is ``False``.
+        method : string, optional
+            The integration method, see `simulate`. The default is
+            ``"erk43ip"``.
+
+        Returns
+        -------
+        pulse : list of :py:class:`~pynlo.light.Pulse`
+            The output pulses.
+        z : ndarray of float
+            The z positions at which the pulse spectra (`a_v`) and complex
+            envelopes (`a_t`) have been returned.
+        a_t : ndarray of complex
+            The root-power complex envelope of each pulse at each z position,
+            with shape `(m, n_records, n)`.
+        a_v : ndarray of complex
+            The root-power spectrum of each pulse at each z position, with
+            shape `(m, n_records, n)`.
+
+        """
+        #---- Input Spectra
+        a_v = np.array(a_v, dtype=complex, ndmin=2)
+        assert (a_v.ndim == 2 and a_v.shape[1] == self.n_points), (
+            "The input must be an (m, n) stack of spectra over the frequency grid of the model.")
+        n_pulses = a_v.shape[0]
+
+        #---- Method
+        assert (method in self._error_order), (
+            "Method choice '{:}' is unrecognized").format(method)
+        assert not (row_steps and method != "erk43ip"), (
+            "Separate step sizes are only supported with the 'erk43ip' method.")
+        self.method = method
+
+        #---- Z Grid
+        z_grid = np.asarray(z_grid, dtype=float)
+        if z_grid.size==1:
+            # Since only the end point was given, the start point is the origin
+            z_grid = np.append(0.0, z_grid)
+
+        if n_records is None:
+            z_record = z_grid
+        else:
+            assert (n_records >= 2), "The output must include atleast 2 points."
+            z_record = np.linspace(z_grid.min(), z_grid.max(), n_records)
+            z_grid = np.unique(np.append(z_grid, z_record))
+        z_record = {z:idx for idx, z in enumerate(z_record)}
+
+        #---- Setup
+        z = z_grid[0]
+        a_v_out = np.empty((n_pulses, len(z_record), self.n_points), dtype=complex)
+        a_v_out[:, 0] = a_v
+
+        # Poling
+        if self.mode.z_nonlinear.pol:
+            self.mode.z = z
+            self.update_poling(force_update=True)
+
+        # Step Size
+        if dz is None:
+            dz = self.estimate_step_size(local_error=local_error, a_v=a_v, z=z)
+            print("Initial Step Size:\t{:.3g}m".format(dz))
+        if row_steps:
+            z = np.full(n_pulses, z)
 
         #---- Propagate
         k5_v = None
         cont = False
         for z_stop in z_grid[1:]:
             # Step
-            (pulse_out.a_v, z, dz, k5_v, cont) = self.propagate(
+            a_v, z, dz, k5_v, cont = self.propagate(
+                a_v, z, z_stop, dz, local_error, k5_v=k5_v, cont=cont)
+
+            # Record
+            if z_stop in z_record:
+                a_v_out[:, z_record[z_stop]] = a_v
+
+        #---- Output
+        a_t_out = fft.fftshift(fft.ifft(fft.ifftshift(a_v_out), fsc=self.dt))
+        pulses = []
+        for a_v_row in a_v_out[:, -1]:
+            pulse_out = self.pulse.copy()
+            pulse_out.a_v = a_v_row
+            pulses.append(pulse_out)
+
+        sim_res = SimulationResult(
+            pulse=pulses, z=np.fromiter(z_record.keys(), dtype=float),
+            a_t=a_t_out, a_v=a_v_out)
+        return sim_res
+
+    def resume(self, checkpoint_path, plot=None, checkpoint_every=600.0):
+        """
+        Resume a simulation from a checkpoint.
+
+        The model must be constructed with the same pulse and mode as the one
+        that saved the checkpoint. The simulation continues exactly as it would
+        have without the interruption, and further checkpoints are saved to the
+        same file.
+
+        Parameters
+        ----------
+        checkpoint_path : str
+            The checkpoint file given to `simulate`.
+        plot : None, string, or pynlo.utility.monitors.LivePlot, optional
+            See `simulate`.
+        checkpoint_every : float, optional
+            See `simulate`.
+
+        Returns
+        -------
+        pulse : :py:class:`~pynlo.light.Pulse`
+        z : ndarray of float
+        a_t : ndarray of complex
+        a_v : ndarray of complex
+            See `simulate`.
+
+        """
+        with open(checkpoint_path, "rb") as file:
+            state = pickle.load(file)
+
+        assert (state["pulse_out"].v_grid == self.v_grid).all(), (
+            "The checkpoint was saved by a model with a different frequency grid.")
+
+        #---- Z-Dependent Parameters
+        # Update all parameters at the current position, as the first step of
+        # a non-continuous propagation would.
+        self.mode.z = state["z"]
+        self.update_linearity(force_update=True)
+        self.update_nonlinearity(force_update=True)
+        self.update_poling(force_update=True)
+        state["cont"] = False
+        self.method = state.get("method", "erk43ip")
+
+        if plot is not None:
+            if isinstance(plot, str):
+                plot = LivePlot(plot)
+            plot.start(state["pulse_out"], state["z"])
+        return self._simulate(state, plot=plot, checkpoint_path=checkpoint_path,
+                              checkpoint_every=checkpoint_every)
+
+    def _simulate(self, state, plot=None, checkpoint_path=None, checkpoint_every=600.0):
+        """
+        The main loop of `simulate`, which continues from the given state.
+
+        """
+        z_record = state["z_record"]
+        z_out = state["z_out"]
+        recorder = state["recorder"]
+        adaptive = state["adaptive"]
+        pulse_out = state["pulse_out"]
+        diagnostics = state.get("diagnostics")
+
+        #---- Propagate
+        if diagnostics is not None:
+            self._set_diagnostics(diagnostics)
+        try:
+            self._simulate_steps(state, plot=plot, checkpoint_path=checkpoint_path,
+                                 checkpoint_every=checkpoint_every)
+
+            #---- Output
+            if adaptive is None:
+                z_out = np.fromiter(z_record.keys(), dtype=float)
+            else:
+                z_out = np.array(z_out)
+                recorder.truncate(z_out)
+        finally:
+            # also on errors, so that the plotting thread and any open files
+            # do not keep the process alive
+            if diagnostics is not None:
+                self._set_diagnostics(None)
+                diagnostics.finish()
+            recorder.finish()
+            if plot is not None:
+                plot.finish()
+
+        sim_res = SimulationResult(
+            pulse=pulse_out, z=z_out,
+            a_t=getattr(recorder, "a_t", None), a_v=getattr(recorder, "a_v", None))
+        if diagnostics is not None:
+            sim_res.diagnostics = diagnostics.steps
+        return sim_res
+
+    def _simulate_steps(self, state, plot=None, checkpoint_path=None, checkpoint_every=600.0):
+        """
+        Propagate between the points of the z grid of `simulate`, recording
+        the pulse and saving checkpoints along the way.
+
+        """
+        z_grid = state["z_grid"]
+        z_record = state["z_record"]
+        z_out = state["z_out"]
+        recorder = state["recorder"]
+        adaptive = state["adaptive"]
+        pulse_out = state["pulse_out"]
+        if adaptive is not None:
+            z_fixed = np.fromiter(z_record.keys(), dtype=float)
+
+        t_checkpoint = time.perf_counter()
+        for idx_z in range(state["idx"], z_grid.size):
+            z_stop = z_grid[idx_z]
+
+            # Step
+            (pulse_out.a_v, state["z"], state["dz"], state["k5_v"], state["cont"]) = self.propagate(
                 pulse_out.a_v,
-                z, z_stop, dz,
-                local_error,
-                k5_v=k5_v,
-                cont=cont)
+                state["z"], z_stop, state["dz"],
+                state["local_error"],
+                k5_v=state["k5_v"],
+                cont=state["cont"])
+            z = state["z"]
 
             # Record
-            if z in z_record:
-                idx = z_record[z]
-                a_t_record[idx,:] = pulse_out.a_t
-                a_v_record[idx,:] = pulse_out.a_v
+            if adaptive is None:
+                record = z in z_record
+                idx = z_record.get(z)
+            else:
+                # always leave room for the given points
+                n_left = np.count_nonzero(z_fixed > z)
+                record = (z in z_record) or (
+                    len(z_out) + n_left < adaptive.max_records
+                    and adaptive.changed(pulse_out))
+                idx = len(z_out)
+
+            if record:
+                recorder.record(idx, pulse_out)
+                if adaptive is not None:
+                    adaptive.reset(pulse_out)
+                    z_out.append(z)
 
                 # Plot
                 if plot is not None:
-                    # Update Plots
-                    self._update_plots(plot, pulse_out, z)
+                    plot.update(pulse_out, z)
 
-                    if z==z_grid[-1]:
-                        # End animation with the last step
-                        for artist in self._artists:
-                            artist.set_animated(False)
+            # Checkpoint
+            if (checkpoint_path is not None and idx_z < z_grid.size-1
+                    and time.perf_counter() - t_checkpoint >= checkpoint_every):
+                state["idx"] = idx_z + 1
+                self._checkpoint(state, checkpoint_path)
+                t_checkpoint = time.perf_counter()
 
-            sim_res = SimulationResult(
-                pulse=pulse_out, z=np.fromiter(z_record.keys(), dtype=float),
-                a_t=a_t_record, a_v=a_v_record)
-        return sim_res
+    def _checkpoint(self, state, checkpoint_path):
+        """
+        Atomically save the state of a simulation.
+
+        The state is first written to a temporary file in the same directory,
+        which then replaces the checkpoint. An interruption while saving leaves
+        the previous checkpoint intact.
+
+        """
+        tmp_path = "{:}.{:}.tmp".format(checkpoint_path, os.getpid())
+        with open(tmp_path, "wb") as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, checkpoint_path)
 
     def propagate(self, a_v, z, z_stop, dz, local_error, k5_v=None, cont=False):
         """
         Propagate the given pulse spectrum from `z` to `z_stop` using an
         adaptive step size algorithm.
 
-        The step size algorithm utilizes an embedded Runge–Kutta scheme with
-        orders 3 and 4 (ERK4(3)-IP) [1]_.
+        With the default method, the step size algorithm utilizes an embedded
+        Runge–Kutta scheme with orders 3 and 4 (ERK4(3)-IP) [1]_. The method
+        set by the last call to `simulate` is used, see its documentation for
+        the other methods.
 
         Parameters
         ----------
         a_v : ndarray of complex
-            The root-power spectrum of the pulse.
-        z : float
-            The starting point.
+            The root-power spectrum of the pulse, or an `(m, n)` stack of
+            spectra. A stack is advanced with the step size of its largest
+            error, unless `z` and `dz` are arrays.
+        z : float or ndarray of float
+            The starting point. If an array, the position of each spectrum in
+            a stack, which are then advanced with separate step sizes.
         z_stop : float
             The stopping point.
-        dz : float
-            The initial step size.
+        dz : float or ndarray of float
+            The initial step size, or the step size of each spectrum.
         local_error : float
             The relative local error of the adaptive step size algorithm.
         k5_v : ndarray of complex, optional
@@ -346,7 +1409,8 @@ class Model():
         dz : float
             The step size.
         k5_v : ndarray of complex
-            The nonlinear action of the 4th-order result.
+            The nonlinear action of the 4th-order result, or ``None`` if the
+            method does not reuse it.
         cont : bool
             A flag indicating that the next step may be continuous.
 
@@ -358,6 +1422,9 @@ class Model():
             https://doi.org/10.1016/j.cpc.2012.12.020
 
         """
+        if np.ndim(z) > 0:
+            return self._propagate_rows(a_v, z, z_stop, dz, local_error, k5_v=k5_v)
+
         while z < z_stop:
             z_next = z + dz
             if z_next >= z_stop:
@@ -369,30 +1436,126 @@ class Model():
                 final_step = False
 
             #---- Integrate by dz
-            a_RK4_v, a_RK3_v, k5_v_next = self.step(a_v, z, z_next, k5_v=k5_v, cont=cont)
+            a_next_v, est_error, k5_v_next = self._method_step(a_v, z, z_next, k5_v=k5_v, cont=cont)
 
             #---- Estimate Relative Local Error
-            est_error = l2_error(a_RK4_v, a_RK3_v)
-            error_ratio = (est_error/local_error)**0.25
+            if self.method == "erk43ip":
+                error_ratio = (est_error/local_error)**0.25
+                reject = error_ratio > 2
+                dz_divisor = max(error_ratio, 0.5)
+            else:
+                # Sinkin et al. and Heidt
+                reject = est_error > 2*local_error
+                if est_error > local_error:
+                    dz_divisor = 2**(1/self._error_order[self.method])
+                elif est_error < 0.5*local_error:
+                    dz_divisor = 2**(-1/self._error_order[self.method])
+                else:
+                    dz_divisor = 1.0
+
+            #---- Diagnostics
+            if self._diagnostics is not None:
+                self._diagnostics.step(z, z_next - z, not reject, est_error, a_next_v)
 
             #---- Propagate Solution
-            if error_ratio > 2:
+            if reject:
                 # Reject this step and calculate with a smaller dz
                 dz = dz/2
                 cont = False
+                if self.method == "rk4ip":
+                    k5_v = k5_v_next # the action on the input is unchanged
             else:
                 # Update parameters for the next loop
                 z = z_next
-                a_v = a_RK4_v
-                k5_v = k5_v_next
-                if (not final_step) or (error_ratio > 1):
-                    dz = dz / max(error_ratio, 0.5)
+                a_v = a_next_v
+                k5_v = k5_v_next if self.method == "erk43ip" else None
+                if (not final_step) or (dz_divisor > 1):
+                    dz = dz / dz_divisor
                 else:
                     dz = dz_adaptive # if final step, use adaptive step size
                 cont = True
 
         return a_v, z, dz, k5_v, cont
 
+    def _propagate_rows(self, a_v, z, z_stop, dz, local_error, k5_v=None):
+        """
+        Propagate a stack of spectra from `z` to `z_stop`, with a separate
+        adaptive step size for each spectrum.
+
+        All spectra are evaluated at each step. Spectra that have reached
+        `z_stop` are advanced by a step size of zero, and only the spectra
+        whose steps are accepted are updated.
+
+        """
+        assert not (self.mode.z_mode or self.mode.z_nonlinear.pol), (
+            "Separate step sizes for each spectrum are only supported in modes without z-dependent parameters.")
+        a_v = np.array(a_v, dtype=self._dtype)
+        z = np.array(z, dtype=float)
+        dz = np.array(np.broadcast_to(dz, z.shape), dtype=float)
+        if k5_v is None:
+            k5_v = self._nonlinear_operator(a_v)
+        else:
+            k5_v = np.array(k5_v, dtype=self._dtype)
+        dz_adaptive = dz.copy()
+        est_error = np.zeros_like(z)
+
+        active = z < z_stop
+        while active.any():
+            z_next = np.where(active, z + dz, z)
+            final_step = active & (z_next >= z_stop)
+            z_next[final_step] = z_stop
+            dz_adaptive[final_step] = dz[final_step] # save value of last step size
+            dz[final_step] = z_stop - z[final_step] # force smaller step size to hit z_stop
+
+            #---- Integrate by dz
+            a_RK4_v, a_RK3_v, k5_v_next = self.step(a_v, z, z_next, k5_v=k5_v, cont=True)
+
+            #---- Estimate Relative Local Error
+            l2_error_out(a_RK4_v, a_RK3_v, est_error)
+            error_ratio = (est_error/local_error)**0.25
+
+            #---- Propagate Solution
+            # Reject these steps and calculate with a smaller dz
+            reject = active & (error_ratio > 2)
+            dz[reject] = dz[reject]/2
+
+            # Update parameters for the next loop
+            accept = active & ~reject
+            z[accept] = z_next[accept]
+            np.copyto(a_v, a_RK4_v, where=accept[:, np.newaxis])
+            np.copyto(k5_v, k5_v_next, where=accept[:, np.newaxis])
+            adapt = accept & (~final_step | (error_ratio > 1))
+            dz[adapt] = dz[adapt] / np.maximum(error_ratio[adapt], 0.5)
+            last = accept & final_step & (error_ratio <= 1)
+            dz[last] = dz_adaptive[last] # if final step, use adaptive step size
+
+            active = z < z_stop
+
+        return a_v, z, dz, k5_v, True
+
+    def _method_step(self, a_v, z, z_next, k5_v=None, cont=False, method=None):
+        """
+        Take a single step with the given integration method, or the current
+        method if ``None``.
+
+        Returns the result, the estimated relative local error, and the action
+        of the nonlinear operator that may be passed to the next call, i.e.
+        the `k5_v` of `step` or the `k1_v` of `step_rk4ip`.
+
+        """
+        if method is None:
+            method = self.method
+
+        if method == "erk43ip":
+            a_RK4_v, a_RK3_v, k5_v = self.step(a_v, z, z_next, k5_v=k5_v, cont=cont)
+            return a_RK4_v, l2_error(a_RK4_v, a_RK3_v), k5_v
+        elif method == "rk4ip":
+            a_RK4_v, k1_v = self.step_rk4ip(a_v, z, z_next, k1_v=k5_v, cont=cont)
+            return a_RK4_v, cq_error(a_v, a_RK4_v, self._cq_weights), k1_v
+        else:
+            a_next_v, est_error = self.step_ssfm(a_v, z, z_next, cont=cont)
+            return a_next_v, est_error, None
+
     def step(self, a_v, z, z_next, k5_v=None, cont=False):
         """
         Advance the given pulse spectrum from `z` to `z_next`.
@@ -403,10 +1566,13 @@ class Model():
         Parameters
         ----------
         a_v : ndarray of complex
-            The root-power spectrum of the pulse.
-        z : float
-            The starting point.
-        z_next : float
+            The root-power spectrum of the pulse, or an `(m, n)` stack of
+            spectra which are advanced together.
+        z : float or ndarray of float
+            The starting point. For a stack of spectra in a mode without
+            z-dependent parameters, this may be an array with the starting
+            point of each spectrum.
+        z_next : float or ndarray of float
             The next point.
         k5_v : ndarray of complex, optional
             The action of the nonlinear operator on the solution from the
@@ -429,6 +1595,14 @@ class Model():
         k5_v : ndarray of complex
             The nonlinear action of the 4th-order result.
 
+        Notes
+        -----
+        The stages are evaluated in work arrays that are allocated on the
+        first step, so no new arrays are created during subsequent steps. The
+        returned arrays are part of that workspace. The 4th-order result and
+        `k5_v` remain valid as the inputs of the next step, but all are
+        overwritten by later steps and must be copied if they are to be kept.
+
         References
         ----------
         .. [1] S. Balac and F. Mahé, "Embedded Runge–Kutta scheme for
@@ -437,56 +1611,273 @@ class Model():
             https://doi.org/10.1016/j.cpc.2012.12.020
 
         """
-        dz = z_next - z
+        a_RK4_v, b_v, k4_v, _, k5_next_v = self._step_rk4(a_v, z, z_next, k5_v=k5_v, cont=cont)
+
+        #---- k5
+        k5_v = self._nonlinear_operator(a_RK4_v, out=k5_next_v)
+
+        #---- RK3
+        a_RK3_v = rk3_out(b_v, k4_v, k5_v, self._buffer("dz", (np.size(z_next),), float),
+                          self._buffer("a_RK3_v", a_RK4_v.shape))
+        return a_RK4_v, a_RK3_v, k5_v
+
+    def step_rk4ip(self, a_v, z, z_next, k1_v=None, cont=False):
+        """
+        Advance the given pulse spectrum from `z` to `z_next` with the 4th-order
+        Runge-Kutta in the interaction picture method (RK4IP) [1]_.
+
+        This is the 4th-order part of `step`, without the embedded 3rd-order
+        solution. The local error is instead estimated from the relative change
+        of the photon number, which is conserved in lossless modes by the Kerr
+        and Raman effects with self-steepening [2]_. Unlike the energy, it is
+        not changed by the Raman self-frequency shift. Without
+        self-steepening, i.e. in the `NLSE` with a frequency-independent
+        nonlinear parameter, the energy is conserved instead and is used.
+
+        Parameters
+        ----------
+        a_v : ndarray of complex
+            The root-power spectrum of the pulse.
+        z : float
+            The starting point.
+        z_next : float
+            The next point.
+        k1_v : ndarray of complex, optional
+            The action of the nonlinear operator on `a_v`, i.e. from a
+            rejected step that started at the same point. The default is
+            ``None``.
+        cont : bool, optional
+            A flag that indicates the current step is continuous with the
+            previous. See `step`.
+
+        Returns
+        -------
+        a_RK4_v : ndarray of complex
+            The 4th-order result.
+        k1_v : ndarray of complex
+            The action of the nonlinear operator on the input `a_v`.
+
+        References
+        ----------
+        .. [1] J. Hult, "A Fourth-Order Runge–Kutta in the Interaction Picture
+            Method for Simulating Supercontinuum Generation in Optical Fibers,"
+            Journal of Lightwave Technology, Volume 25, Issue 12, 2007, Pages
+            3770-3775, https://doi.org/10.1109/JLT.2007.909373
+        .. [2] A. M. Heidt, "Efficient Adaptive Step Size Method for the
+            Simulation of Supercontinuum Generation in Optical Fibers,"
+            Journal of Lightwave Technology, Volume 27, Issue 18, 2009, Pages
+            3984-3991, https://doi.org/10.1109/JLT.2009.2021538
+
+        """
+        a_RK4_v, _, _, k1_v, _ = self._step_rk4(a_v, z, z_next, k5_v=k1_v, cont=cont)
+        return a_RK4_v, k1_v
+
+    def _step_rk4(self, a_v, z, z_next, k5_v=None, cont=False):
+        """
+        The 4th-order stages shared by `step` and `step_rk4ip`.
+
+        Returns the 4th-order result, the 4th-order result before the last
+        stage, the last stage, the action of the nonlinear operator on the
+        input, and an output buffer for the next action of the nonlinear
+        operator.
+
+        """
+        a_v = np.ascontiguousarray(a_v, dtype=self._dtype)
+        shape = a_v.shape
+
+        #---- Step Size
+        row_dz = np.ndim(z_next) > 0
+        assert not (row_dz and self.mode.z_mode), (
+            "Separate step sizes for each spectrum are only supported in modes without z-dependent parameters.")
+        dz = self._buffer("dz", (np.size(z_next),), float)
+        np.subtract(z_next, z, out=dz)
+        dz_2 = np.multiply(dz, 0.5, out=self._buffer("dz_2", dz.shape, float))
+        ip_shape = shape if row_dz else (self.n_points,)
+
+        # Output Buffers, chosen so that the inputs are not overwritten
+        a_RK4_v = self._buffer("a_RK4_v", shape)
+        if np.may_share_memory(a_v, a_RK4_v):
+            a_RK4_v = self._buffer("a_RK4_v'", shape)
+        k5_next_v = self._buffer("k5_v", shape)
+        if k5_v is not None and np.may_share_memory(k5_v, k5_next_v):
+            k5_next_v = self._buffer("k5_v'", shape)
 
         #---- k1
         if self.mode.z_mode and not cont:
             self.mode.z = z
             if self.mode.z_linear.any: self.update_linearity()
-        ip_v = self._linear_operator(0.5*dz)
+        ip_v = self._linear_operator(dz_2, out=self._buffer("ip_v", ip_shape))
 
         if k5_v is None:
             if self.mode.z_nonlinear.any and not cont: self.update_nonlinearity()
-            k5_v = self._nonlinear_operator(a_v)
+            k5_v = self._nonlinear_operator(a_v, out=k5_next_v)
 
-        ai_v = ip_v * a_v # into interaction picture
-        ki1_v = ip_v * k5_v # into interaction picture
+        ai_v = prod_out(ip_v, a_v, self._buffer("ai_v", shape)) # into interaction picture
+        ki1_v = prod_out(ip_v, k5_v, self._buffer("ki1_v", shape)) # into interaction picture
 
         #---- k2 and k3
         if self.mode.z_mode:
             self.mode.z = 0.5*(z + z_next)
             if self.mode.z_nonlinear.any: self.update_nonlinearity()
 
-        ai2_v = rk1(ai_v, ki1_v, 0.5*dz)
-        ki2_v = self._nonlinear_operator(ai2_v)
+        aj_v = self._buffer("aj_v", shape) # intermediate stages
+        ai2_v = rk1_out(ai_v, ki1_v, dz_2, aj_v)
+        ki2_v = self._nonlinear_operator(ai2_v, out=self._buffer("ki2_v", shape))
 
-        ai3_v = rk1(ai_v, ki2_v, 0.5*dz)
-        ki3_v = self._nonlinear_operator(ai3_v)
+        ai3_v = rk1_out(ai_v, ki2_v, dz_2, aj_v)
+        ki3_v = self._nonlinear_operator(ai3_v, out=self._buffer("ki3_v", shape))
 
         #---- k4
         if self.mode.z_mode:
             self.mode.z = z_next
             if self.mode.z_linear.any:
                 self.update_linearity()
-                ip_v = self._linear_operator(0.5*dz)
+                ip_v = self._linear_operator(dz_2, out=ip_v)
             if self.mode.z_nonlinear.any: self.update_nonlinearity()
 
-        ai4_v = rk1(ai_v, ki3_v, dz)
-        a4_v = ip_v * ai4_v # out of interaction picture
-        k4_v = self._nonlinear_operator(a4_v)
+        a4_v = rk1_ip_out(ai_v, ki3_v, dz, ip_v, aj_v) # out of interaction picture
+        k4_v = self._nonlinear_operator(a4_v, out=self._buffer("k4_v", shape))
 
         #---- RK4
-        a_RK4_v, b_v = rk4(ai_v, ki1_v, ki2_v, ki3_v, k4_v, ip_v, dz)
+        b_v = self._buffer("b_v", shape)
+        a_RK4_v = rk4_out(ai_v, ki1_v, ki2_v, ki3_v, k4_v, ip_v, dz, a_RK4_v, b_v)
+        return a_RK4_v, b_v, k4_v, k5_v, k5_next_v
 
-        #---- k5
-        k5_v = self._nonlinear_operator(a_RK4_v)
+    def step_ssfm(self, a_v, z, z_next, cont=False):
+        """
+        Advance the given pulse spectrum from `z` to `z_next` with the
+        symmetric split-step Fourier method.
+
+        The step is taken once over the full step size and twice over half of
+        the step size. The relative difference of the two results is the
+        local error estimate of Sinkin et al. [1]_, and the returned result is
+        their local extrapolation, ``(4*a_fine - a_coarse)/3``. Each split
+        step applies the linear operator over half of the step, the
+        nonlinear operator over the full step, and the linear operator over
+        the remaining half.
+
+        In the `NLSE` with a frequency-independent nonlinear parameter, the
+        nonlinear substep is the exact phase rotation of the complex envelope,
+        which costs about as much as one call to the nonlinear operator.
+        Otherwise, it is integrated with the 2nd-order midpoint method, which
+        takes two calls. In modes without z-dependent parameters, the linear
+        operator is evaluated once per step and shared by the split steps.
 
-        #---- RK3
-        a_RK3_v = rk3(b_v, k4_v, k5_v, dz)
-        return a_RK4_v, a_RK3_v, k5_v
+        Parameters
+        ----------
+        a_v : ndarray of complex
+            The root-power spectrum of the pulse.
+        z : float
+            The starting point.
+        z_next : float
+            The next point.
+        cont : bool, optional
+            A flag that indicates the current step is continuous with the
+            previous. See `step`.
+
+        Returns
+        -------
+        a_v : ndarray of complex
+            The extrapolated result.
+        est_error : float
+            The relative local error of the step.
+
+        References
+        ----------
+        .. [1] O. V. Sinkin, R. Holzlöhner, J. Zweck, and C. R. Menyuk,
+            "Optimization of the split-step Fourier method in modeling
+            optical-fiber communications systems," Journal of Lightwave
+            Technology, Volume 21, Issue 1, 2003, Pages 61-68,
+            https://doi.org/10.1109/JLT.2003.808628
+
+        """
+        a_v = np.ascontiguousarray(a_v, dtype=self._dtype)
+        shape = a_v.shape
+        z_mid = 0.5*(z + z_next)
+
+        # Output Buffer, chosen so that the input is not overwritten
+        a_next_v = self._buffer("a_ssfm_v", shape)
+        if np.may_share_memory(a_v, a_next_v):
+            a_next_v = self._buffer("a_ssfm_v'", shape)
+
+        #---- Linear Operators
+        if self.mode.z_mode:
+            ip_f_v = ip_c_v = None
+        else:
+            # The half steps of the coarse step are two of the fine steps
+            dz_4 = self._buffer("dz_4_ssfm", (1,), float)
+            dz_4[0] = 0.25*(z_next - z)
+            ip_f_v = self._linear_operator(dz_4, out=self._buffer("ip_f_v", (self.n_points,)))
+            ip_c_v = np.multiply(ip_f_v, ip_f_v, out=self._buffer("ip_c_v", (self.n_points,)))
+
+        #---- Coarse Step
+        a_c_v = self._split_step(a_v, z, z_next, self._buffer("a_c_v", shape), ip_v=ip_c_v,
+                                 cont=cont)
+
+        #---- Fine Steps
+        a_f_v = self._split_step(a_v, z, z_mid, self._buffer("a_f_v", shape), ip_v=ip_f_v)
+        a_f_v = self._split_step(a_f_v, z_mid, z_next, a_f_v, ip_v=ip_f_v, cont=True)
+
+        #---- Local Error
+        est_error = l2_error(a_f_v, a_c_v)
+
+        #---- Local Extrapolation
+        a_c_v = np.subtract(a_f_v, a_c_v, out=a_c_v)
+        a_c_v *= 1/3
+        a_next_v = np.add(a_f_v, a_c_v, out=a_next_v)
+        return a_next_v, est_error
+
+    def _split_step(self, a_v, z, z_next, out, ip_v=None, cont=False):
+        """
+        A single symmetric split step, evaluated into `out`. In modes without
+        z-dependent parameters, the linear operator over the half step may be
+        given as `ip_v`.
+
+        """
+        dz = self._buffer("dz_ssfm", (1,), float)
+        dz[0] = z_next - z
+        dz_2 = self._buffer("dz_2_ssfm", (1,), float)
+        dz_2[0] = 0.5*dz[0]
+
+        #---- Linear Half Step
+        if self.mode.z_mode and not cont:
+            self.mode.z = z
+            if self.mode.z_linear.any: self.update_linearity()
+        if ip_v is None:
+            ip_v = self._linear_operator(dz_2, out=self._buffer("ip_v", (self.n_points,)))
+        a_v = prod_out(ip_v, a_v, out)
+
+        #---- Nonlinear Step
+        if self.mode.z_mode:
+            self.mode.z = 0.5*(z + z_next)
+            if self.mode.z_nonlinear.any: self.update_nonlinearity()
+        a_v = self._nonlinear_step(a_v, dz, a_v)
+
+        #---- Linear Half Step
+        if self.mode.z_mode:
+            self.mode.z = z_next
+            if self.mode.z_linear.any:
+                self.update_linearity()
+                ip_v = self._linear_operator(dz_2, out=ip_v)
+        return prod_out(ip_v, a_v, out)
+
+    def _nonlinear_step_midpoint(self, a_v, dz, out):
+        """
+        The nonlinear substep of `step_ssfm`, integrated over the step size
+        with the 2nd-order midpoint method, evaluated into `out`.
+
+        This applies to any nonlinear operator, but takes two calls to it.
+
+        """
+        nonlinear_operator = self._raw_operators["nonlinear"]
+        dz_2 = np.multiply(dz, 0.5, out=self._buffer("dz_2_ssfm", (1,), float))
+        k_v = nonlinear_operator(a_v, out=self._buffer("k_ssfm_v", out.shape))
+        a_mid_v = rk1_out(a_v, k_v, dz_2, self._buffer("aj_v", out.shape))
+        k_v = nonlinear_operator(a_mid_v, out=k_v)
+        return rk1_out(a_v, k_v, dz, out)
 
     #---- Operators
-    def linear_operator(self, dz):
+    def linear_operator(self, dz, out=None):
         """
         The action of the linear operator integrated over the given step size.
 
@@ -494,6 +1885,11 @@ class Model():
         ----------
         dz : float
             The step size.
+        out : ndarray of complex, optional
+            An array in which to place the result. If `dz` is an array with
+            the step size of each spectrum in a stack, `out` must have one row
+            per step size. The default is ``None``, which allocates a new
+            array.
 
         Returns
         -------
@@ -501,9 +1897,11 @@ class Model():
 
         """
         # Linear Operator
-        return linear_operator(self.kappa_cm, dz)
+        if out is None:
+            return linear_operator(self.kappa_cm, dz)
+        return linear_operator_out(self.kappa_cm, np.atleast_1d(dz), out)
 
-    def nonlinear_operator(self, a_v):
+    def nonlinear_operator(self, a_v, out=None):
         """
         The action of the nonlinear operator on the given pulse spectrum.
 
@@ -513,6 +1911,9 @@ class Model():
         ----------
         a_v : array_like of complex
             The root-power spectrum of the pulse.
+        out : ndarray of complex, optional
+            An array in which to place the result. The default is ``None``,
+            which allocates a new array.
 
         Returns
         -------
@@ -526,7 +1927,10 @@ class Model():
             Implementation of both 2nd- and 3rd-order nonlinearities
 
         """
-        return 0.0j
+        if out is None:
+            return 0.0j
+        out[...] = 0.0
+        return out
 
     #---- Z-Dependency
     def update_linearity(self, force_update=False):
@@ -539,7 +1943,19 @@ class Model():
             Force an update of all linear parameters. The default will only
             update those that are z dependent.
 
+        Notes
+        -----
+        If the parameters of the mode are tabulated (see
+        `pynlo.medium.Mode.tabulate`), the parameters used by the linear
+        operator are tabulated over the same grid on first use, and are then
+        linearly interpolated. The other attributes of the model, i.e.
+        `beta`, keep their values from the last forced update.
+
         """
+        #---- Tabulated
+        if self._interpolate("linearity", force_update):
+            return
+
         #---- Gain self.mode.z_linear
         if self.mode.z_linear.alpha or force_update:
             self.alpha = self.mode.alpha
@@ -573,220 +1989,85 @@ class Model():
         if self.mode.g3 is not None:
             warnings.warn("3rd-order nonlinearity is not implemented in this model", stacklevel=2)
 
-    def update_poling(self, force_update=False):
+    def _interpolate(self, kind, force_update=False):
         """
-        Update the poled sign of the 2nd-order nonlinearity.
+        Set the z-dependent parameters of the model, either of the
+        ``"linearity"`` or ``"nonlinearity"``, by interpolating between those
+        tabulated over the z grid of the mode's table.
 
-        Parameters
-        ----------
-        force_update : bool, optional
-            Force an update of the poling. The default will only update if the
-            z position is at a domain inversion.
+        The parameters are tabulated on first use, or if the mode has been
+        tabulated over a new grid. Returns ``False`` if there is no table, in
+        which case the parameters must be calculated directly.
 
         """
-        if self.mode.z_nonlinear.pol:
-            warnings.warn("Poling is not implemented in this model", stacklevel=2)
+        z_table = self.mode.z_table
+        if (z_table is None) or self._tabulating or not self._z_attributes[kind]:
+            return False
+
+        update = getattr(self, "update_" + kind)
+        if force_update:
+            # Set the parameters that are not z dependent
+            self._tabulating = True
+            try:
+                update(force_update=True)
+            finally:
+                self._tabulating = False
+
+        #---- Tabulate
+        if (kind not in self._z_tables) or (self._z_tables[kind][0] is not z_table):
+            self._z_tables[kind] = (z_table, self._tabulate(kind))
+        tables = self._z_tables[kind][1]
+        if not tables:
+            return force_update
+
+        #---- Interpolate
+        for name, table in tables.items():
+            out = self._buffer("z_table " + name, table.values.shape[1:], table.values.dtype)
+            setattr(self, name, table(self.mode.z, out=out))
+        return True
+
+    def _tabulate(self, kind):
+        """
+        Tabulate the z-dependent parameters of the model over the z grid of
+        the mode's table.
 
-    #---- Plotting
-    def _setup_plots(self, plot, pulse_out, z):
         """
-        Initialize a figure for real-time visualization of a simulation.
+        z_table = self.mode.z_table
+        update = getattr(self, "update_" + kind)
+        names = self._z_attributes[kind]
+        values = {name: [] for name in names}
 
-        Parameters
-        ----------
-        plot : string
-            The type of plot. The options are "frq", "time", or "wvl" and
-            correspond to the frequency, time, and wavelength domains.
-        pulse_out : :py:class:`~pynlo.light.Pulse`
-            The pulse to be plotted.
-        z : float
-            The z position in the mode.
+        z = self.mode.z
+        self._tabulating = True
+        try:
+            for z_i in z_table:
+                self.mode.z = z_i
+                update()
+                for name in names:
+                    values[name].append(getattr(self, name, None))
+        finally:
+            self._tabulating = False
+            self.mode.z = z
 
+        # Parameters that are not z dependent are not reassigned by the update
+        return {name: _ZTable(z_table, np.array(value)) for name, value in values.items()
+                if any(v is not value[0] for v in value[1:])}
+
+    def update_poling(self, force_update=False):
         """
-        # Import if needed
-        try:
-            self._plt
-        except AttributeError:
-            import matplotlib.pyplot as plt
-            self._plt = plt
-
-        #---- Figure and Axes
-        self._rt_fig = self._plt.figure("Real-Time Simulation", clear=True)
-        self._ax_0 = self._plt.subplot2grid((2,1), (0,0), fig=self._rt_fig)
-        self._ax_1 = self._plt.subplot2grid((2,1), (1,0), sharex=self._ax_0, fig=self._rt_fig)
-        self._rt_fig.show()
-
-        #---- Time Domain
-        if plot=="time":
-            # Lines
-            self._ln_pwr, = self._ax_0.semilogy(
-                1e12*self.t_grid,
-                pulse_out.p_t,
-                '.',
-                markersize=1,
-                animated=True)
-            self._ln_phs, = self._ax_1.plot(
-                1e12*self.t_grid,
-                1e-12*pulse_out.vg_t,
-                '.',
-                markersize=1,
-                animated=True)
-
-            # Labels
-            self._ax_0.set_title("Instantaneous Power")
-            self._ax_0.set_ylabel("J / s")
-            self._ax_0.set_xlabel("Delay (ps)")
-            self._ax_1.set_ylabel("Frequency (THz)")
-            self._ax_1.set_xlabel("Delay (ps)")
-
-            # Y Boundaries
-            self._ax_0.set_ylim(
-                top=max(self._ln_pwr.get_ydata())*1e1,
-                bottom=max(self._ln_pwr.get_ydata())*1e-9)
-            excess = 0.05*(self.v_grid.max()-self.v_grid.min())
-            self._ax_1.set_ylim(
-                top=1e-12*(self.v_grid.max() + excess),
-                bottom=1e-12*(self.v_grid.min() - excess))
-
-        #---- Frequency Domain
-        if plot=="frq":
-            # Lines
-            self._ln_pwr, = self._ax_0.semilogy(
-                1e-12*self.v_grid,
-                pulse_out.p_v,
-                '.',
-                markersize=1,
-                animated=True)
-            self._ln_phs, = self._ax_1.plot(
-                1e-12*self.v_grid,
-                1e12*pulse_out.tg_v,
-                '.',
-                markersize=1,
-                animated=True)
-
-            # Labels
-            self._ax_0.set_title("Power Spectrum")
-            self._ax_0.set_ylabel("J / Hz")
-            self._ax_0.set_xlabel("Frequency (THz)")
-            self._ax_1.set_ylabel("Delay (ps)")
-            self._ax_1.set_xlabel("Frequency (THz)")
-
-            # Y Boundaries
-            self._ax_0.set_ylim(
-                top=max(self._ln_pwr.get_ydata())*1e1,
-                bottom=max(self._ln_pwr.get_ydata())*1e-9)
-            excess = 0.05*(self.t_grid.max()-self.t_grid.min())
-            self._ax_1.set_ylim(
-                top=1e12*(self.t_grid.max() + excess),
-                bottom=1e12*(self.t_grid.min() - excess))
-
-        #---- Wavelength Domain
-        if plot=="wvl":
-            # Lines
-            self._ln_pwr, = self._ax_0.semilogy(
-                1e9*self.l_grid,
-                self.dv_dl * pulse_out.p_v,
-                '.',
-                markersize=1,
-                animated=True)
-            self._ln_phs, = self._ax_1.plot(
-                1e9*self.l_grid,
-                1e12*pulse_out.tg_v,
-                '.',
-                markersize=1,
-                animated=True)
-
-            # Labels
-            self._ax_0.set_title("Power Spectrum")
-            self._ax_0.set_ylabel("J / m")
-            self._ax_0.set_xlabel("Wavelength (nm)")
-            self._ax_1.set_ylabel("Delay (ps)")
-            self._ax_1.set_xlabel("Wavelength (nm)")
-
-            # Y Boundaries
-            self._ax_0.set_ylim(
-                top=max(self._ln_pwr.get_ydata())*1e1,
-                bottom=max(self._ln_pwr.get_ydata())*1e-9)
-            excess = 0.05*(self.t_grid.max()-self.t_grid.min())
-            self._ax_1.set_ylim(
-                top=1e12*(self.t_grid.max() + excess),
-                bottom=1e12*(self.t_grid.min() - excess))
-
-        #---- Z Label
-        #TODO: change to plt.barh, progress bar
-        self._z_label = self._ax_1.legend(
-            [],[],
-            title='z = {:.6g} m'.format(z),
-            loc=9,
-            labelspacing=0,
-            framealpha=1,
-            shadow=False)
-        self._z_label.set_animated(True)
-
-        #---- Layout
-        self._rt_fig.tight_layout()
-        self._rt_fig.canvas.draw()
-
-        #---- Blit
-        self._artists = (self._ln_pwr, self._ln_phs, self._z_label)
-
-        self._rt_fig_bkg_0 = self._rt_fig.canvas.copy_from_bbox(self._ax_0.bbox)
-        self._rt_fig_bkg_1 = self._rt_fig.canvas.copy_from_bbox(self._ax_1.bbox)
-
-    def _update_plots(self, plot, pulse_out, z):
-        """
-        Update the figure used for real-time visualization of a simulation.
+        Update the poling of the 2nd-order nonlinearity.
 
         Parameters
         ----------
-        plot : string
-            The type of plot. The options are "frq", "time", or "wvl" and
-            correspond to the frequency, time, and wavelength domains.
-        pulse_out : :py:class:`~pynlo.light.Pulse`
-            The pulse to be plotted.
-        z : float
-            The z position in the mode.
+        force_update : bool, optional
+            Force an update of the poling for the domain, or averaged region,
+            that begins at or contains the current z position. The default
+            only updates the Fourier series of an averaged region, as the sign
+            of a domain does not change within it.
 
         """
-        #---- Restore Background
-        self._rt_fig.canvas.restore_region(self._rt_fig_bkg_0)
-        self._rt_fig.canvas.restore_region(self._rt_fig_bkg_1)
-
-        #---- Update Data
-        if plot=="time":
-            self._ln_pwr.set_data(
-                1e12*self.t_grid,
-                pulse_out.p_t)
-            self._ln_phs.set_data(
-                1e12*self.t_grid,
-                1e-12*pulse_out.vg_t)
-
-        if plot=="frq":
-            self._ln_pwr.set_data(
-                1e-12*self.v_grid,
-                pulse_out.p_v)
-            self._ln_phs.set_data(
-                1e-12*self.v_grid,
-                1e12*pulse_out.tg_v)
-
-        if plot=="wvl":
-            self._ln_pwr.set_data(
-                1e9*self.l_grid,
-                self.dv_dl * pulse_out.p_v)
-            self._ln_phs.set_data(
-                1e9*self.l_grid,
-                1e12*pulse_out.tg_v)
-
-        #---- Update Z Label
-        self._z_label.set_title('z = {:.6g} m'.format(z))
-
-        #---- Blit
-        for artist in self._artists:
-            artist.axes.draw_artist(artist)
-
-        self._rt_fig.canvas.blit(self._ax_0.bbox)
-        self._rt_fig.canvas.blit(self._ax_1.bbox)
-        self._rt_fig.canvas.flush_events()
+        if self.mode.z_nonlinear.pol:
+            warnings.warn("Poling is not implemented in this model", stacklevel=2)
 
 
 class NLSE(Model):
@@ -804,6 +2085,10 @@ class NLSE(Model):
         The input pulse.
     mode : :py:class:`~pynlo.medium.Mode`
         The optical mode in which the pulse propagates.
+    precision : str, optional
+        The floating-point precision of the simulation, either ``"double"``,
+        ``"single"``, or ``"mixed"``. The default is ``"double"``. See
+        :py:class:`~pynlo.model.Model` for details.
 
     See Also
     --------
@@ -812,8 +2097,11 @@ class NLSE(Model):
         inherited methods.
 
     """
-    def __init__(self, pulse, mode):
-        super().__init__(pulse, mode)
+    _z_attributes = {"linearity": ("_kappa_cm",),
+                     "nonlinearity": ("_1j_gamma", "_r3")}
+
+    def __init__(self, pulse, mode, precision="double"):
+        super().__init__(pulse, mode, precision=precision)
 
         if mode.rv_grid is not None:
             assert (mode.rv_grid.size == pulse.rtf_grids(alias=0).v_grid.size), (
@@ -822,6 +2110,22 @@ class NLSE(Model):
         #---- Implementation Details
         self._linear_operator = self._linear_operator_fft_order
         self._nonlinear_operator = self._nonlinear_operator_fft_order
+        self._nonlinear_step = self._nonlinear_step_fft_order
+
+    def estimate_step_size(self, local_error=1e-6, dz=10e-6, n=10, a_v=None, z=0, db=False,
+                           method=None):
+        #---- Standard FFT Order
+        if a_v is None:
+            a_v = self.pulse.a_v
+        a_v = fft.ifftshift(a_v)
+
+        #---- Estimate
+        return super().estimate_step_size(
+            local_error=local_error, dz=dz, n=n, a_v=a_v, z=z, db=db, method=method)
+
+    def _step_order(self, x):
+        #---- Standard FFT Order
+        return fft.ifftshift(x)
 
     def propagate(self, a_v, z, z_stop, dz, local_error, k5_v=None, cont=False):
         #---- Standard FFT Order
@@ -836,7 +2140,7 @@ class NLSE(Model):
         return a_v, z, dz, k5_v, cont
 
     #---- Operators
-    def _linear_operator_fft_order(self, dz):
+    def _linear_operator_fft_order(self, dz, out=None):
         """
         The action of the linear operator integrated over the given step size,
         arranged in standard fft order.
@@ -845,15 +2149,22 @@ class NLSE(Model):
         ----------
         dz : float
             The step size.
+        out : ndarray of complex, optional
+            An array in which to place the result. If `dz` is an array with
+            the step size of each spectrum in a stack, `out` must have one row
+            per step size. The default is ``None``, which allocates a new
+            array.
 
         Returns
         -------
         ndarray of complex
 
         """
-        return linear_operator(self._kappa_cm, dz)
+        if out is None:
+            return linear_operator(self._kappa_cm, dz)
+        return linear_operator_out(self._kappa_cm, np.atleast_1d(dz), out)
 
-    def _nonlinear_operator_fft_order(self, a_v):
+    def _nonlinear_operator_fft_order(self, a_v, out=None):
         """
         The action of the nonlinear operator on the given pulse spectrum,
         arranged in standard fft order.
@@ -864,26 +2175,83 @@ class NLSE(Model):
         ----------
         a_v : array_like of complex
             The root-power spectrum of the pulse, in standard fft order.
+        out : ndarray of complex, optional
+            An array in which to place the result. The default is ``None``,
+            which allocates a new array.
 
         Returns
         -------
         ndarray of complex
 
+        Notes
+        -----
+        The transforms are calculated in place in preallocated arrays. The
+        Raman convolution uses complex instead of real-valued transforms,
+        which avoids reinitializing the MKL transform descriptors between real
+        and complex transforms of the same size.
+
+        """
+        if out is None:
+            out = np.empty(np.shape(a_v), dtype=self._dtype)
+
+        #---- Setup
+        a_t = self._buffer("a_t", out.shape, self._nl_dtype)
+        a_t[...] = a_v
+        a_t = fft.ifft(a_t, fsc=self.dt, overwrite_x=True)
+
+        #---- Raman
+        if self.r3 is not None:
+            a2_t = abs2_out(a_t, self._buffer("a2_t", out.shape, self._nl_dtype))
+            a2_v = fft.fft(a2_t, fsc=self.dt, overwrite_x=True)
+            a2r_v = prod_out(self._r3, a2_v, a2_v)
+            a2_t = fft.ifft(a2r_v, fsc=self.dt, overwrite_x=True)
+
+        #---- Kerr
+        if self.r3 is not None:
+            a3_t = kerr_out(a_t, a2_t, a_t) # real part of the convolution
+        else:
+            a3_t = kerr_abs2_out(a_t, a_t)
+        a3_v = fft.fft(a3_t, fsc=self.dt, overwrite_x=True)
+        return prod_out(self._1j_gamma, a3_v, out) # minus sign included in _1j_gamma
+
+    def _nonlinear_step_fft_order(self, a_v, dz, out):
+        """
+        The nonlinear substep of `step_ssfm`, arranged in standard fft order
+        and evaluated into `out`.
+
+        If the nonlinear parameter is real and independent of frequency, the
+        Kerr and Raman effects only rotate the phase of the complex envelope,
+        and the substep is the exact phase rotation by the (Raman-weighted)
+        intensity. This takes the transforms of a single call to the
+        nonlinear operator. Otherwise, the substep falls back to the midpoint
+        method.
+
         """
+        if not self._kerr_phase:
+            return self._nonlinear_step_midpoint(a_v, dz, out)
+
         #---- Setup
-        a_t = fft.ifft(a_v, fsc=self.dt)
-        a2_t = abs2(a_t)
+        a_t = self._buffer("a_t", out.shape, self._nl_dtype)
+        a_t[...] = a_v
+        a_t = fft.ifft(a_t, fsc=self.dt, overwrite_x=True)
+        phi = self._1j_gamma[0].imag * dz[0] # minus sign included in _1j_gamma
 
         #---- Raman
         if self.r3 is not None:
-            a2_rv = fft.rfft(a2_t, fsc=self.dt)
-            a2r_rv = prod(self.r3, a2_rv)
-            a2_t = fft.irfft(a2r_rv, fsc=self.dt, n=self.n_points)
+            a2_t = abs2_out(a_t, self._buffer("a2_t", out.shape, self._nl_dtype))
+            a2_v = fft.fft(a2_t, fsc=self.dt, overwrite_x=True)
+            a2r_v = prod_out(self._r3, a2_v, a2_v)
+            a2_t = fft.ifft(a2r_v, fsc=self.dt, overwrite_x=True)
 
         #---- Kerr
-        a3_t = prod(a_t, a2_t)
-        a3_v = fft.fft(a3_t, fsc=self.dt)
-        return prod(self._1j_gamma, a3_v) # minus sign included in _1j_gamma
+        # the change of the envelope, which keeps the precision of the spectra
+        # if the transforms are of lower precision
+        if self.r3 is not None:
+            da_t = kerr_phase_out(a_t, a2_t, phi, a_t)
+        else:
+            da_t = kerr_abs2_phase_out(a_t, phi, a_t)
+        da_v = fft.fft(da_t, fsc=self.dt, overwrite_x=True)
+        return np.add(a_v, da_v, out=out)
 
     def nonlinear_operator(self, a_v):
         """
@@ -914,21 +2282,44 @@ class NLSE(Model):
 
     #---- Z-Dependency
     def update_linearity(self, force_update=False):
+        #---- Tabulated
+        if self._interpolate("linearity", force_update):
+            return
+
+        #---- Standard FFT Order
         super().update_linearity(force_update=force_update)
         self._kappa_cm = fft.ifftshift(self.kappa_cm)
 
     def update_nonlinearity(self, force_update=False):
+        #---- Tabulated
+        if self._interpolate("nonlinearity", force_update):
+            return
+
         if self.mode.g2 is not None:
             warnings.warn("2nd-order nonlinearity is not implemented in this model", stacklevel=2)
 
         #---- Gamma
         if self.mode.z_nonlinear.g3 or force_update:
             self.gamma = self.mode.gamma
-            self._1j_gamma = fft.ifftshift(-1j * self.gamma)
+            self._1j_gamma = self._nl_param(fft.ifftshift(-1j * self.gamma))
+
+            # Whether the nonlinear step of the split-step method is a phase
+            # rotation, at every z position if the parameter is z dependent
+            gamma = np.ravel(self.gamma)
+            kerr_phase = not gamma.imag.any() and np.allclose(gamma, gamma[0], rtol=1e-12, atol=0)
+            self._kerr_phase = kerr_phase and (force_update or self._kerr_phase)
+
+            # Without self-steepening, the Raman effect conserves the energy
+            # instead of the photon number
+            self._cq_weights = self._energy_weights if self._kerr_phase else self._photon_weights
 
         #---- Raman
         if self.mode.z_nonlinear.r3 or force_update:
             self.r3 = self.mode.r3
+            if self.r3 is not None:
+                # Full response of the real-valued intensity, in fft order
+                n = self.n_points
+                self._r3 = self._nl_param(np.concatenate([self.r3, self.r3[1:n - n//2][::-1].conj()]))
 
 
 class UPE(Model):
@@ -944,6 +2335,10 @@ class UPE(Model):
         The input pulse.
     mode : :py:class:`~pynlo.medium.Mode`
         The optical mode in which the pulse propagates.
+    precision : str, optional
+        The floating-point precision of the simulation, either ``"double"``,
+        ``"single"``, or ``"mixed"``. The default is ``"double"``. See
+        :py:class:`~pynlo.model.Model` for details.
 
     See Also
     --------
@@ -969,9 +2364,16 @@ class UPE(Model):
     matching can suppress aliased interactions, but it is best practice to
     verify that behavior on a case-by-case basis.
 
+    In a poled mode, the propagation stops at each domain inversion boundary
+    where the sign of the 2nd-order nonlinearity changes. If the poling of
+    the mode is given as a :py:class:`~pynlo.medium.Poling` object, long
+    periodic stretches are instead averaged with the quasi-phase-matching
+    terms of its Fourier series, and the step size is only limited by the
+    accuracy of the solution.
+
     """
-    def __init__(self, pulse, mode):
-        super().__init__(pulse, mode)
+    def __init__(self, pulse, mode, precision="double"):
+        super().__init__(pulse, mode, precision=precision)
 
         if mode.rv_grid is not None:
             assert (pulse.rv_grid.size == mode.rv_grid.size), (
@@ -979,7 +2381,7 @@ class UPE(Model):
 
         #---- Implementation Details
         # Frequency Grid
-        self._1j_w_grid = 1j * self.w_grid
+        self._1j_w_grid = self._nl_param(1j * self.w_grid)
 
         # Real-Valued Time Domain Grid
         self.rn_points = self.pulse.rn
@@ -988,27 +2390,35 @@ class UPE(Model):
         # Carrier-Resolved Slice
         self.rn_slice = self.pulse.rn_slice
 
-        # Initialize Arrays
-        self._0_v = np.zeros_like(self.pulse.v_grid, dtype=complex)
-        self._nl_v = np.zeros_like(self.pulse.v_grid, dtype=complex)
-        self._a_rv = np.zeros_like(self.pulse.rv_grid, dtype=complex)
-        self._0_rt = np.zeros_like(self.pulse.rt_grid, dtype=float)
-        self._a2_rt = np.zeros_like(self.pulse.rt_grid, dtype=float)
-        self._a3_rt = np.zeros_like(self.pulse.rt_grid, dtype=float)
+        # Real-Valued Frequency Grid
+        self.rv_points = self.pulse.rv_grid.size
 
-    def propagate(self, a_v, z, z_stop, dz, local_error, k5_v=None, cont=False):
-        #---- Update Poling
-        if self.mode.z_nonlinear.pol:
-            if not cont: self.mode.z = z
-            if self.mode.z in self.mode.g2_inv:
-                self.update_poling()
-                k5_v = None # reset k5_v, 2nd-order nonlinearity changed sign
+        # Negative Frequencies of the Carrier-Resolved Slice
+        self._rn_slice_neg = -np.arange(self.rv_points)[self.rn_slice] % self.rn_points
 
-        #---- Propagate
-        return super().propagate(a_v, z, z_stop, dz, local_error, k5_v=k5_v, cont=cont)
+    def propagate(self, a_v, z, z_stop, dz, local_error, k5_v=None, cont=False):
+        if not self.mode.z_nonlinear.pol or np.ndim(z) > 0:
+            return super().propagate(a_v, z, z_stop, dz, local_error, k5_v=k5_v, cont=cont)
+
+        poling = self.mode.poling
+        while True:
+            #---- Update Poling
+            # Only domain inversion boundaries that are stepped through
+            # exactly, and the edges of averaged regions, split the propagation
+            if np.searchsorted(poling.stops, z, side="right") != self._pol_segment:
+                self.mode.z = z
+                self.update_poling(force_update=True)
+                k5_v = None # reset k5_v, 2nd-order nonlinearity changed
+
+            #---- Propagate
+            z_next = min(poling.next_stop(z), z_stop)
+            a_v, z, dz, k5_v, cont = super().propagate(
+                a_v, z, z_next, dz, local_error, k5_v=k5_v, cont=cont)
+            if z >= z_stop:
+                return a_v, z, dz, k5_v, cont
 
     #---- Operators
-    def nonlinear_operator(self, a_v):
+    def nonlinear_operator(self, a_v, out=None):
         """
         The action of the nonlinear operator on the given pulse spectrum.
 
@@ -1019,43 +2429,74 @@ class UPE(Model):
         ----------
         a_v : array_like of complex
             The root-power spectrum of the pulse.
+        out : ndarray of complex, optional
+            An array in which to place the result. The default is ``None``,
+            which allocates a new array.
 
         Returns
         -------
         ndarray of complex
 
         """
+        if out is None:
+            out = np.empty(np.shape(a_v), dtype=self._dtype)
+
+        # Work Arrays
+        shape = out.shape[:-1]
+        nl_v = self._buffer("nl_v", out.shape, self._nl_dtype)
+        tmp_v = self._buffer("tmp_v", out.shape, self._nl_dtype)
+        a_rv = self._buffer("a_rv", shape + (self.rv_points,), self._nl_dtype)
+        a2_rt = self._buffer("a2_rt", shape + (self.rn_points,), self._nl_rdtype)
+        a3_rt = self._buffer("a3_rt", shape + (self.rn_points,), self._nl_rdtype)
+
         #---- Setup
-        self._nl_v[...] = self._0_v # zero
-        self._a_rv[self.rn_slice] = a_v
-        a_rt = fft.irfft(self._a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
-        a2_rt = a_rt * a_rt
+        nl_v[...] = 0.0 # zero
+        if self.g2 is not None and self.g2_qpm is not None: # averaged poling
+            a_cv = self._buffer("a_cv", shape + (self.rn_points,), self._nl_dtype) # positive frequencies of a complex transform
+            a_cv[..., self.rn_slice] = a_v
+            a_ct = fft.ifft(a_cv, fsc=self.rdt * 2**0.5) # analytic signal
+            a_rt = np.multiply(a_ct.real, 2, out=self._buffer("a_rt", shape + (self.rn_points,), self._nl_rdtype))
+        else:
+            a_rv[..., self.rn_slice] = a_v
+            a_rt = fft.irfft(a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
+        a2_rt = np.multiply(a_rt, a_rt, out=a2_rt)
+        a2_rv = None
 
         #---- 2nd-Order Nonlinearity
         if self.g2 is not None:
-            a2_rv = fft.rfft(a2_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
-            if self.g2_pol: # poled
-                self._nl_v += prod(self.g2, a2_rv[self.rn_slice])
-            else: # not poled
-                self._nl_v -= prod(self.g2, a2_rv[self.rn_slice])
+            if self.g2_qpm is not None: # averaged poling
+                a2_abs_rt = abs2_out(a_ct, self._buffer("a2_abs_rt", shape + (self.rn_points,), self._nl_rdtype))
+                a2_ct = np.multiply(a_ct, a_ct, out=a_ct)
+                a2_ct += a2_abs_rt
+                a2_v = self._averaged_poling(a2_ct, tmp_v)
+                nl_v += np.multiply(self.g2, a2_v, out=tmp_v)
+            else:
+                a2_rv = fft.rfft(a2_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
+                g2_a2_v = np.multiply(self.g2, a2_rv[..., self.rn_slice], out=tmp_v)
+                if self.g2_pol: # poled
+                    nl_v += g2_a2_v
+                else: # not poled
+                    nl_v -= g2_a2_v
 
         #---- 3rd-Order Nonlinearity
         if self.g3 is not None:
             # Raman
             if self.r3 is not None:
-                a2_rv = (fft.rfft(a2_rt, fsc=self.rdt) if self.g2 is None
-                           else a2_rv * 2**-0.5) # 1/2**0.5 for analytic to real
-                a2r_rv = prod(self.r3, a2_rv)
+                if a2_rv is None:
+                    a2_rv = fft.rfft(a2_rt, fsc=self.rdt)
+                else:
+                    a2_rv *= 2**-0.5 # 1/2**0.5 for analytic to real
+                a2r_rv = np.multiply(self.r3, a2_rv, out=a2_rv)
                 a2_rt = fft.irfft(a2r_rv, fsc=self.rdt, n=self.rn_points)
             # Kerr
-            a3_rt = a_rt * a2_rt
+            a3_rt = np.multiply(a_rt, a2_rt, out=a3_rt)
             a3_rv = fft.rfft(a3_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
-            self._nl_v -= prod(self.g3, a3_rv[self.rn_slice])
+            nl_v -= np.multiply(self.g3, a3_rv[..., self.rn_slice], out=tmp_v)
 
         #---- Nonlinear Response
-        return prod(self._1j_w_grid, self._nl_v) # minus sign included in _nl_v
+        return np.multiply(self._1j_w_grid, nl_v, out=out) # minus sign included in nl_v
 
-    def nonlinear_operator_separable(self, a_v):
+    def nonlinear_operator_separable(self, a_v, out=None):
         """
         The action of the nonlinear operator on the given pulse spectrum. This
         operator is active when the nonlinear parameters have been input in
@@ -1068,6 +2509,9 @@ class UPE(Model):
         ----------
         a_v : array_like of complex
             The root-power spectrum of the pulse.
+        out : ndarray of complex, optional
+            An array in which to place the result. The default is ``None``,
+            which allocates a new array.
 
         Returns
         -------
@@ -1097,53 +2541,108 @@ class UPE(Model):
         :py:func:`~pynlo.utility.chi3.g3_split` functions.
 
         """
+        if out is None:
+            out = np.empty(np.shape(a_v), dtype=self._dtype)
+
+        # Work Arrays
+        shape = out.shape[:-1]
+        nl_v = self._buffer("nl_v", out.shape, self._nl_dtype)
+        tmp_v = self._buffer("tmp_v", out.shape, self._nl_dtype)
+        a_rv = self._buffer("a_rv", shape + (self.rv_points,), self._nl_dtype)
+        a2_rt = self._buffer("a2_rt", shape + (self.rn_points,), self._nl_rdtype)
+        a3_rt = self._buffer("a3_rt", shape + (self.rn_points,), self._nl_rdtype)
+        tmp_rt = self._buffer("tmp_rt", shape + (self.rn_points,), self._nl_rdtype)
+
         #---- Setup
-        self._nl_v[...] = self._0_v # zero
+        nl_v[...] = 0.0 # zero
 
         #---- 2nd-Order Nonlinearity
-        if self.g2 is not None:
-            self._a2_rt[...] = self._0_rt # zero
+        if self.g2 is not None and self.g2_qpm is not None: # averaged poling
+            a_cv = self._buffer("a_cv", shape + (self.rn_points,), self._nl_dtype) # positive frequencies of a complex transform
+            a2_ct = self._buffer("a2_ct", shape + (self.rn_points,), self._nl_dtype)
+            a2_ct[...] = 0.0 # zero
             for g2_internal in self.g2[1:]:
-                self._a_rv[self.rn_slice] = prod(a_v, g2_internal)
-                a_rt = fft.irfft(self._a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
-                self._a2_rt += a_rt * a_rt
-            a2_rv = fft.rfft(self._a2_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
+                np.multiply(a_v, g2_internal, out=a_cv[..., self.rn_slice])
+                a_ct = fft.ifft(a_cv, fsc=self.rdt * 2**0.5) # analytic signal
+                a2_ct += abs2_out(a_ct, tmp_rt)
+                a2_ct += np.multiply(a_ct, a_ct, out=a_ct)
+            a2_v = self._averaged_poling(a2_ct, tmp_v)
+            nl_v += np.multiply(self.g2[0], a2_v, out=tmp_v)
+        elif self.g2 is not None:
+            a2_rt[...] = 0.0 # zero
+            for g2_internal in self.g2[1:]:
+                np.multiply(a_v, g2_internal, out=a_rv[..., self.rn_slice])
+                a_rt = fft.irfft(a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
+                a2_rt += np.multiply(a_rt, a_rt, out=tmp_rt)
+            a2_rv = fft.rfft(a2_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
+            g2_a2_v = np.multiply(self.g2[0], a2_rv[..., self.rn_slice], out=tmp_v)
             if self.g2_pol: # poled
-                self._nl_v += prod(self.g2[0], a2_rv[self.rn_slice])
+                nl_v += g2_a2_v
             else: # not poled
-                self._nl_v -= prod(self.g2[0], a2_rv[self.rn_slice])
+                nl_v -= g2_a2_v
 
         #---- 3rd-Order Nonlinearity
         if self.g3 is not None:
-            self._a3_rt[...] = self._0_rt # zero
+            a3_rt[...] = 0.0 # zero
             for g3_internal in self.g3[1:]:
-                self._a_rv[self.rn_slice] = prod(a_v, g3_internal)
-                a_rt = fft.irfft(self._a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
-                a2_rt = a_rt * a_rt
+                np.multiply(a_v, g3_internal, out=a_rv[..., self.rn_slice])
+                a_rt = fft.irfft(a_rv, fsc=self.rdt * 2**0.5, n=self.rn_points) # 1/2**0.5 for analytic to real
+                a2_rt = np.multiply(a_rt, a_rt, out=tmp_rt)
                 if self.r3 is not None:
                     a2_rv = fft.rfft(a2_rt, fsc=self.rdt)
-                    a2r_rv = prod(self.r3, a2_rv)
+                    a2r_rv = np.multiply(self.r3, a2_rv, out=a2_rv)
                     a2_rt = fft.irfft(a2r_rv, fsc=self.rdt, n=self.rn_points)
-                self._a3_rt += a_rt * a2_rt
-            a3_rv = fft.rfft(self._a3_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
-            self._nl_v -= prod(self.g3[0], a3_rv[self.rn_slice])
+                a3_rt += np.multiply(a_rt, a2_rt, out=a_rt)
+            a3_rv = fft.rfft(a3_rt, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
+            nl_v -= np.multiply(self.g3[0], a3_rv[..., self.rn_slice], out=tmp_v)
 
         #---- Nonlinear Response
-        return prod(self._1j_w_grid, self._nl_v) # minus sign included in _nl_v
+        return np.multiply(self._1j_w_grid, nl_v, out=out) # minus sign included in nl_v
+
+    def _averaged_poling(self, a2_ct, out):
+        """
+        The 2nd-order products of the pulse weighted by the Fourier series of
+        the poling.
+
+        The input is the sum of the square and the absolute square of the
+        analytic signal, whose spectra contain the sum-frequency and
+        difference-frequency terms. The real-valued products, ``a_rt**2``,
+        contain both, with the absolute square counted twice. The square only
+        has positive frequencies and the spectrum of the absolute square is
+        Hermitian, so both are separated from a single transform.
+
+        Parameters
+        ----------
+        a2_ct : ndarray of complex
+            The square plus the absolute square of the analytic signal.
+        out : ndarray of complex
+            An array in which to place the result.
+
+        Returns
+        -------
+        ndarray of complex
+
+        """
+        a2_ct = fft.fft(a2_ct, fsc=self.rdt * 2**0.5) # 2**0.5 for real to analytic
+        a2_v = a2_ct[..., self.rn_slice] # sum- and difference-frequency terms
+        a2_dfg_v = np.conj(a2_ct[..., self._rn_slice_neg]) # difference-frequency terms
+        np.multiply(self.g2_qpm, a2_v, out=out)
+        out += (2*np.conj(self.g2_qpm) - self.g2_qpm) * a2_dfg_v
+        return out
 
     #---- Z-Dependency
     def update_nonlinearity(self, force_update=False):
         #---- 2nd Order
         if self.mode.z_nonlinear.g2 or force_update:
-            self.g2 = self.mode.g2
+            self.g2 = self._nl_param(self.mode.g2)
             self._g2_dim = len(self.g2.shape) if self.g2 is not None else 0
 
         #---- 3rd Order
         if self.mode.z_nonlinear.g3 or force_update:
-            self.g3 = self.mode.g3
+            self.g3 = self._nl_param(self.mode.g3)
             self._g3_dim = len(self.g3.shape) if self.g3 is not None else 0
         if self.mode.z_nonlinear.r3 or force_update:
-            self.r3 = self.mode.r3
+            self.r3 = self._nl_param(self.mode.r3)
 
         #---- Select Nonlinear Operator
         if self.mode.z_nonlinear.g2 or self.mode.z_nonlinear.g3 or force_update:
@@ -1162,12 +2661,22 @@ class UPE(Model):
             else:
                 self._nonlinear_operator = self.nonlinear_operator
 
+        #---- Poling
+        if self.mode.z_nonlinear.pol and not force_update:
+            self.update_poling()
+
     def update_poling(self, force_update=False):
-        if self.mode.z_nonlinear.pol or force_update:
-            try:
-                self.g2_pol = self.mode.g2_inv[self.mode.z]
-            except (KeyError, TypeError):
-                if force_update: self.g2_pol = self.mode.g2_pol
+        poling = self.mode.poling
+        if force_update:
+            self.g2_pol = self.mode.g2_pol
+            if poling is None:
+                self.g2_qpm = None
+                self._pol_segment = None
+            else:
+                self.g2_qpm = poling.coefficient(self.mode.z) if poling.averaged(self.mode.z) else None
+                self._pol_segment = np.searchsorted(poling.stops, self.mode.z, side="right")
+        elif self.g2_qpm is not None:
+            self.g2_qpm = poling.coefficient(self.mode.z)
 
 
 # %% Multi-Mode Models
@@ -8,7 +8,7 @@ susceptibilities, as well as an efficient interface to fast Fourier transforms.
 
 """
 
-__all__ = ["chi1", "chi2", "chi3", "fft",
+__all__ = ["chi1", "chi2", "chi3", "fft", "diagnostics", "monitors", "recorders",
            "vacuum", "taylor_series",
            "shift", "resample_v", "resample_t",
            "TFGrid"]
@@ -22,7 +22,8 @@ import copy
 import numpy as np
 from scipy.constants import pi, h
 
-from pynlo.utility import chi1, chi2, chi3, fft
+from pynlo.utility import chi1, chi2, chi3, diagnostics, fft, monitors, recorders
+from pynlo.utility.misc import read_only, deepcopy_shared
 
 
 # %% Collections
@@ -385,7 +386,12 @@ class TFGrid():
     real Fourier transforms, which have grids that start at zero frequency. The
     `rtf_grids` method and the `rn_range` and `rn_slice` attributes are useful
     when transitioning between the analytic representation of this class to the
-    real-valued representation.
+    real-valued representation. The `rv_scatter` and `rv_gather` methods
+    perform that transition for spectra defined over the grids.
+
+    The grids are read-only arrays that are computed once and shared, not
+    copied, between copies of the class. Grids returned by `rtf_grids` are
+    cached for each value of `alias`.
 
     By definition of the DFT, the time and frequency grids must range
     symmetrically about the origin, with the time grid incrementing in unit
@@ -419,18 +425,21 @@ class TFGrid():
         self._rn_slice = slice(self.rn_range.min(), self.rn_range.max() + 1)
 
         #---- Define Frequency Grid
-        self.__v_grid = self.dv*(np.arange(self.n) - self.n//2) + self.v_ref
+        self.__v_grid = read_only(self.dv*(np.arange(self.n) - self.n//2) + self.v_ref)
+        self.__v_grid_fft = read_only(fft.ifftshift(self.v_grid))
         self._v_ref = self.v_grid[self.n//2]
         self._v_window = self.n*self.dv
 
         #---- Define Complex Time Grid
         self._dt = 1/(self.n*self.dv)
-        self.__t_grid = self.dt*(np.arange(self.n) - self.n//2)
+        self.__t_grid = read_only(self.dt*(np.arange(self.n) - self.n//2))
+        self.__t_grid_fft = read_only(fft.ifftshift(self.t_grid))
         self._t_ref = self.t_grid[self.n//2]
         self._t_window = self.n*self.dt
 
         #---- Define Real-Valued Time and Frequency Domain Grids
         assert (alias >= 1), "There must be atleast 1 alias-free Nyquist zone."
+        self._rtf_cache = {}
         self.rtf_grids(alias=alias, update=True)
 
     #---- Class Methods
@@ -548,7 +557,7 @@ class TFGrid():
         ndarray of float
 
         """
-        return fft.ifftshift(self.v_grid)
+        return self.__v_grid_fft
 
     @property
     def v_ref(self):
@@ -622,7 +631,7 @@ class TFGrid():
         ndarray of float
 
         """
-        return fft.ifftshift(self.t_grid)
+        return self.__t_grid_fft
 
     @property
     def t_ref(self):
@@ -757,7 +766,7 @@ class TFGrid():
         ndarray of float
 
         """
-        return fft.ifftshift(self.rt_grid)
+        return self.__rt_grid_fft
 
     @property
     def rt_ref(self):
@@ -812,7 +821,8 @@ class TFGrid():
 
         The resulting frequency grid contains the origin and positive
         frequencies and is suitable for use with real DFTs (see `fft.rfft` and
-        `fft.irfft`).
+        `fft.irfft`). The grids are calculated once for each combination of
+        `alias` and `fast_n` and are returned as read-only arrays.
 
         Parameters
         ----------
@@ -879,7 +889,33 @@ class TFGrid():
             ra_t = fft.irfft(ra_v, fsc=rtf.dt, n=rtf.n)
             np.sum(ra_t**2 * rtf.dt) == np.sum(np.abs(a_v)**2 * tf.dv)
 
+        For the real-valued grids of the class itself, the `rv_scatter` and
+        `rv_gather` methods implement the same steps.
+
         """
+        key = (0,) if alias==0 else (alias, bool(fast_n))
+        rtf_grids = self._rtf_cache.get(key)
+        if rtf_grids is None:
+            rtf_grids = self._rtf_cache[key] = self._calc_rtf_grids(alias, fast_n)
+
+        if update and alias!=0:
+            self._rn = rtf_grids.n
+
+            # Frequency Grid
+            self.__rv_grid = rtf_grids.v_grid
+            self._rv_ref = rtf_grids.v_ref
+            self._rv_window = rtf_grids.v_window
+
+            # Time Grid
+            self.__rt_grid = rtf_grids.t_grid
+            self.__rt_grid_fft = read_only(fft.ifftshift(rtf_grids.t_grid))
+            self._rt_ref = rtf_grids.t_ref
+            self._rdt = rtf_grids.dt
+            self._rt_window = rtf_grids.t_window
+        return rtf_grids
+
+    def _calc_rtf_grids(self, alias, fast_n):
+        """Calculate the real-valued time and frequency grids."""
         #---- Number of Points
         if alias==0:
             n = self.n
@@ -891,16 +927,17 @@ class TFGrid():
             else:
                 n = 2*(target_n_v - 1) # even
             if fast_n:
-                n = fft.next_fast_len(n)
+                from scipy.fft import next_fast_len
+                n = next_fast_len(n)
         n_v = n//2 + 1 # points in the frequency grid
 
         #---- Define Frequency Grid
-        v_grid = self.dv*np.arange(n_v)
+        v_grid = read_only(self.dv*np.arange(n_v))
         v_ref = v_grid[0]
 
         #---- Define Time Grid
         dt = 1/(n*self.dv)
-        t_grid = dt*(np.arange(n) - n//2)
+        t_grid = read_only(dt*(np.arange(n) - n//2))
         t_ref = t_grid[n//2] # 0 by definition
 
         #---- Construct RTFGrid
@@ -908,23 +945,80 @@ class TFGrid():
             n=n,
             v_grid=v_grid, v_ref=v_ref, dv=self.dv, v_window=n_v*self.dv,
             t_grid=t_grid, t_ref=t_ref, dt=dt, t_window=n*dt)
+        return rtf_grids
 
-        if update and alias!=0:
-            self._rn = rtf_grids.n
+    #---- Real-Valued Representation
+    def rv_scatter(self, a_v, out=None):
+        """
+        Scatter an analytic spectrum onto the origin-contiguous frequency grid
+        of the real-valued time domain representation.
 
-            # Frequency Grid
-            self.__rv_grid = rtf_grids.v_grid
-            self._rv_ref = rtf_grids.v_ref
-            self._rv_window = rtf_grids.v_window
+        The inverse of `rv_gather`. The spectrum is scaled by ``2**-0.5`` and
+        placed at `rn_slice`, all other frequencies are set to zero.
 
-            # Time Grid
-            self.__rt_grid = rtf_grids.t_grid
-            self._rt_ref = rtf_grids.t_ref
-            self._rdt = rtf_grids.dt
-            self._rt_window = rtf_grids.t_window
-        return rtf_grids
+        Parameters
+        ----------
+        a_v : array_like of complex
+            The spectrum, defined over `v_grid` along the last axis.
+        out : ndarray of complex, optional
+            An array, with the size of `rv_grid` along the last axis, in which
+            to place the result. The default allocates a new array.
+
+        Returns
+        -------
+        ndarray of complex
+
+        """
+        a_v = np.asarray(a_v)
+        if out is None:
+            out = np.zeros(a_v.shape[:-1] + self.rv_grid.shape, dtype=complex)
+        else:
+            out[..., :self.rn_slice.start] = 0
+            out[..., self.rn_slice.stop:] = 0
+        np.multiply(a_v, 2**-0.5, out=out[..., self.rn_slice])
+        return out
+
+    def rv_gather(self, ra_v, out=None):
+        """
+        Gather an analytic spectrum from the origin-contiguous frequency grid
+        of the real-valued time domain representation.
+
+        The inverse of `rv_scatter`. The spectrum at `rn_slice` is scaled by
+        ``2**0.5``, all other frequencies are discarded.
+
+        Parameters
+        ----------
+        ra_v : array_like of complex
+            The spectrum, defined over `rv_grid` along the last axis.
+        out : ndarray of complex, optional
+            An array, with the size of `v_grid` along the last axis, in which to
+            place the result. The default allocates a new array.
+
+        Returns
+        -------
+        ndarray of complex
+
+        """
+        ra_v = np.asarray(ra_v)
+        return np.multiply(ra_v[..., self.rn_slice], 2**0.5, out=out)
 
     #---- Misc
     def copy(self):
         """A copy of the time and frequency grids."""
         return copy.deepcopy(self)
+
+    def __deepcopy__(self, memo):
+        # The grids are read-only, only mutable attributes need to be copied
+        return deepcopy_shared(self, memo)
+
+    def __getstate__(self):
+        # The cached grids are recalculated on demand
+        state = self.__dict__.copy()
+        state["_rtf_cache"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        for grid in [self.__v_grid, self.__v_grid_fft, self.__t_grid, self.__t_grid_fft,
+                     self.__rv_grid, self.__rt_grid, self.__rt_grid_fft]:
+            read_only(grid)
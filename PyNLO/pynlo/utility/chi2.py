@@ -10,10 +10,17 @@ __all__ = ["g2_split", "g2_shg", "domain_inversions"]
 
 # %% Imports
 
+import concurrent.futures
+
 import numpy as np
 from scipy.constants import pi, c, epsilon_0 as e0
 
 
+# %% Constants
+
+_DIAGONAL_BLOCK = 2**20 # combinations per block of `dominant_paths`
+
+
 # %% Converters
 
 #---- 2nd-Order Nonlinear Susceptibilities chi2 and d
@@ -258,7 +265,7 @@ def domain_inversions(z, dk, intp_order=1):
         domains = np.append(domains, z.max() - z_invs.max())
     return z_invs[1:], domains, poled
 
-def dominant_paths(v_grid, beta, beta_qpm=None, full=False): #TODO: add extent (for imshow)
+def dominant_paths(v_grid, beta, beta_qpm=None, full=False, n_threads=1): #TODO: add extent (for imshow)
     """
     For each output frequency, find the input frequencies that are coupled
     with the least phase mismatch.
@@ -279,6 +286,9 @@ def dominant_paths(v_grid, beta, beta_qpm=None, full=False): #TODO: add extent (
         A flag determining the nature of the return value. When ``False`` (the
         default) just the path indices are returned, when ``True`` the
         calculated wavenumber mismatch arrays are also returned.
+    n_threads : int, optional
+        The number of threads over which the combinations are divided. The
+        default is 1.
 
     Returns
     -------
@@ -302,87 +312,65 @@ def dominant_paths(v_grid, beta, beta_qpm=None, full=False): #TODO: add extent (
             The wavenumber mismatch for all DFG combinations. The mismatch of
             invalid paths are given as NaN.
 
+    Notes
+    -----
+    The input frequencies that combine into the same output frequency lie
+    along the anti-diagonals (SFG) and diagonals (DFG) of the ``n x n``
+    combinations of the frequency grid. The diagonals are calculated in blocks
+    of about ``2**20`` combinations, so only the full arrays returned when
+    ``full=True`` take memory that scales with ``n**2``.
+
     """
     #---- Setup
     v_grid = np.asarray(v_grid, dtype=float)
     n = v_grid.size
-    v_idx = np.arange(n)
-    v_idx2 = np.dstack(np.indices((n,n)))
     beta = np.asarray(beta, dtype=float)
 
-    #---- Sum Frequency
-    v_sfg = np.add.outer(v_grid, v_grid)
+    #---- Minimum Phase Mismatch
+    # Sum Frequency
+    min_dk_sfgs, sfg_paths, (sfg_first, sfg_size) = _diagonal_paths(
+        v_grid, beta, beta_qpm, +1, n_threads)
 
-    # Indexing
-    v_idx_sfg = np.interp(v_sfg, v_grid, v_idx, left=np.nan, right=np.nan).round()
-    sfg_idxs = np.arange(np.nanmin(v_idx_sfg), np.nanmax(v_idx_sfg)+1, dtype=int)
-    sfg_diag_offset = (n-1) - np.arange(sfg_idxs.size)
-
-    # Wavenumber Mismatch
-    beta_sfg_12 = np.add.outer(beta, beta)
-    beta_sfg_3 = np.interp(v_sfg, v_grid, beta, left=np.nan, right=np.nan)
-    if beta_qpm is None:
-        dk_sfg = np.abs(beta_sfg_12 - beta_sfg_3)
-    else:
-        dk_sfg = np.abs(np.abs(beta_sfg_12 - beta_sfg_3) - beta_qpm)
-
-    #---- Difference Frequency
-    v_dfg = np.subtract.outer(v_grid, v_grid)
-
-    # Indexing
-    v_idx_dfg = np.interp(v_dfg, v_grid, v_idx, left=np.nan, right=np.nan).round()
-    dfg_idxs = np.arange(np.nanmin(v_idx_dfg), np.nanmax(v_idx_dfg)+1, dtype=int)
-    dfg_diag_offset = -(n-1) + np.arange(dfg_idxs.size)[::-1]
-
-    # Wavenumber Mismatch
-    beta_dfg_31 = np.subtract.outer(beta, beta)
-    beta_dfg_2 = np.interp(v_dfg, v_grid, beta, left=np.nan, right=np.nan)
-    if beta_qpm is None:
-        dk_dfg = np.abs(beta_dfg_31 - beta_dfg_2)
-    else:
-        dk_dfg = np.abs(np.abs(beta_dfg_31 - beta_dfg_2) - beta_qpm)
+    # Difference Frequency
+    min_dk_dfgs, dfg_paths, (dfg_first, dfg_size) = _diagonal_paths(
+        v_grid, beta, beta_qpm, -1, n_threads)
+    dfg_diag_offset = (2*n - 1) - dfg_size # the diagonal of the first DFG output
 
     #---- Paths of Minimum Phase Mismatch
     paths = []
     dk = []
-    for idx in v_idx:
-        valid_sfg = (idx in sfg_idxs)
-        valid_dfg = (idx in dfg_idxs)
+    for idx in range(n):
+        valid_sfg = (0 <= idx - sfg_first < sfg_size)
+        valid_dfg = (0 <= idx - dfg_first < dfg_size)
 
         # SFG
         if valid_sfg:
-            diag_offset = sfg_diag_offset[idx==sfg_idxs][0]
-            sfg_diag = np.fliplr(dk_sfg).diagonal(diag_offset)
-            min_dk_sfg = np.nanmin(sfg_diag)
-            min_dk_sfg_idx = np.nonzero(sfg_diag==min_dk_sfg)
-            sfg_path = np.fliplr(v_idx2).diagonal(diag_offset).T[min_dk_sfg_idx]
+            min_dk_sfg = min_dk_sfgs[idx - sfg_first]
+            sfg_path = sfg_paths[idx - sfg_first]
 
         # DFG
         if valid_dfg:
-            diag_offset = dfg_diag_offset[idx==dfg_idxs][0]
-            dfg_diag = dk_dfg.diagonal(diag_offset)
-            min_dk_dfg = np.nanmin(dfg_diag)
-            min_dk_dfg_idx = np.nonzero(dfg_diag==min_dk_dfg)
-            dfg_path = v_idx2.diagonal(diag_offset).T[min_dk_dfg_idx]
+            min_dk_dfg = min_dk_dfgs[dfg_diag_offset + idx - dfg_first]
+            dfg_path = dfg_paths[dfg_diag_offset + idx - dfg_first]
 
         if valid_sfg and valid_dfg:
             if min_dk_sfg < min_dk_dfg:
                 # SFG smaller
-                paths.append(sfg_path.tolist())
+                paths.append(sfg_path)
             elif min_dk_sfg > min_dk_dfg:
                 # DFG smaller
-                paths.append(dfg_path.tolist())
+                paths.append(dfg_path)
             else:
                 # Equal
-                paths.append(sfg_path.tolist() + dfg_path.tolist())
+                paths.append(sfg_path + dfg_path)
             dk.append(min_dk_sfg) if min_dk_sfg < min_dk_dfg else dk.append(min_dk_dfg)
         elif valid_sfg:
             # Only SFG
-            paths.append(sfg_path.tolist())
+            paths.append(sfg_path)
             dk.append(min_dk_sfg)
         elif valid_dfg:
             # Only DFG
-            paths.append(dfg_path.tolist())
+            paths.append(dfg_path)
             dk.append(min_dk_dfg)
         else:
             # No path
@@ -390,10 +378,110 @@ def dominant_paths(v_grid, beta, beta_qpm=None, full=False): #TODO: add extent (
             dk.append(None)
 
     if full:
+        #---- Sum Frequency
+        v_sfg = np.add.outer(v_grid, v_grid)
+        beta_sfg_12 = np.add.outer(beta, beta)
+        beta_sfg_3 = np.interp(v_sfg, v_grid, beta, left=np.nan, right=np.nan)
+        if beta_qpm is None:
+            dk_sfg = np.abs(beta_sfg_12 - beta_sfg_3)
+        else:
+            dk_sfg = np.abs(np.abs(beta_sfg_12 - beta_sfg_3) - beta_qpm)
+
+        #---- Difference Frequency
+        v_dfg = np.subtract.outer(v_grid, v_grid)
+        beta_dfg_31 = np.subtract.outer(beta, beta)
+        beta_dfg_2 = np.interp(v_dfg, v_grid, beta, left=np.nan, right=np.nan)
+        if beta_qpm is None:
+            dk_dfg = np.abs(beta_dfg_31 - beta_dfg_2)
+        else:
+            dk_dfg = np.abs(np.abs(beta_dfg_31 - beta_dfg_2) - beta_qpm)
         return paths, (dk, v_sfg, dk_sfg, v_dfg, dk_dfg)
     else:
         return paths
 
+def _diagonal_paths(v_grid, beta, beta_qpm, sign, n_threads=1):
+    """
+    The minimum wavenumber mismatch along each diagonal of the SFG
+    (``sign=+1``) or DFG (``sign=-1``) combinations, and the pairs of input
+    indices at which it occurs.
+
+    The SFG diagonals are ordered by ``i + j``, and the DFG diagonals by
+    ``i - j``, where ``i`` and ``j`` are the indices of the 1st and 2nd input
+    frequencies. Along each diagonal, the pairs are ordered by ``i``. The
+    range of output indices, ``(first, size)``, is also returned. Diagonals
+    without any valid combinations have a mismatch of NaN and no pairs.
+
+    """
+    n = v_grid.size
+    n_diags = 2*n - 1
+    block = max(1, _DIAGONAL_BLOCK//n)
+    beta_finite = np.isfinite(beta).all()
+
+    def calc_block(d_start):
+        #---- Combinations
+        # only the columns that intersect the diagonals of the block
+        d_stop = min(d_start + block, n_diags)
+        i = np.arange(max(0, d_start - (n-1)), min(n, d_stop), dtype=np.int64)
+        d = np.arange(d_start, d_stop, dtype=np.int64)[:, np.newaxis]
+        j = (d - i) if sign > 0 else (i - (d - (n-1)))
+        invalid = (j.view(np.uint64) >= n) # also j < 0
+
+        #---- Wavenumber Mismatch
+        # the same operations as for the full arrays, in place
+        v_out = np.take(v_grid, j, mode="clip")
+        if sign > 0:
+            np.add(v_grid[i], v_out, out=v_out)
+        else:
+            np.subtract(v_grid[i], v_out, out=v_out)
+        beta_out = np.interp(v_out, v_grid, beta, left=np.nan, right=np.nan)
+        dk = np.take(beta, j, mode="clip")
+        if sign > 0:
+            np.add(beta[i], dk, out=dk)
+        else:
+            np.subtract(beta[i], dk, out=dk)
+        np.subtract(dk, beta_out, out=dk)
+        np.abs(dk, out=dk)
+        if beta_qpm is not None:
+            np.subtract(dk, beta_qpm, out=dk)
+            np.abs(dk, out=dk)
+        dk[invalid] = np.nan
+
+        #---- Minimum
+        min_dk = np.fmin.reduce(dk, axis=1)
+        rows, cols = np.nonzero(dk == min_dk[:, np.newaxis])
+        pairs = np.stack([i[cols], j[rows, cols]], axis=1).tolist()
+        bounds = np.searchsorted(rows, np.arange(d.size + 1))
+        paths = [pairs[bounds[idx]:bounds[idx+1]] for idx in range(d.size)]
+
+        # Range of Output Frequencies
+        # i.e. where the interpolation is not out of bounds
+        if beta_finite:
+            v_out[np.isnan(beta_out)] = np.nan
+        else:
+            v_out[(v_out < v_grid[0]) | (v_out > v_grid[-1])] = np.nan
+        v_out[invalid] = np.nan
+        return min_dk, paths, np.fmin.reduce(v_out, axis=None), np.fmax.reduce(v_out, axis=None)
+
+    #---- Blocks of Diagonals
+    d_starts = range(0, n_diags, block)
+    if n_threads > 1:
+        with concurrent.futures.ThreadPoolExecutor(n_threads) as pool:
+            results = list(pool.map(calc_block, d_starts))
+    else:
+        results = [calc_block(d_start) for d_start in d_starts]
+
+    min_dk = np.concatenate([result[0] for result in results])
+    paths = [path for result in results for path in result[1]]
+
+    #---- Output Indices
+    v_min = np.fmin.reduce([result[2] for result in results])
+    v_max = np.fmax.reduce([result[3] for result in results])
+    if np.isnan(v_min):
+        return min_dk, paths, (0, 0)
+    v_idx = np.arange(n)
+    first, last = np.interp([v_min, v_max], v_grid, v_idx).round().astype(int)
+    return min_dk, paths, (first, last - first + 1)
+
 
 # %% Calculator Functions
 
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+Diagnostics of the steps taken by a simulation.
+
+`pynlo.model.Model.simulate` passes each step of the adaptive step-size
+algorithm to a `Diagnostics` object, which records the step size, whether the
+step was accepted, the local error estimate, the conserved quantities, the
+time spent in the linear and nonlinear operators, and the energy at the edges
+of the frequency window. Aliasing and truncation show up as energy at the
+edges of the window and as a drift of the energy or photon number, and a
+collapse of the step size shows up as a run of rejected steps. The steps can
+also be written to a text log as they are taken, and the simulation can be
+stopped when a limit is exceeded, so that bad runs are caught early.
+
+"""
+
+__all__ = ["Diagnostics"]
+
+
+# %% Imports
+
+import time
+
+import numpy as np
+from scipy.constants import h
+
+
+# %% Diagnostics
+
+class Diagnostics():
+    """
+    Record statistics of each step of a simulation.
+
+    After the simulation, the steps are available as the structured array
+    `steps`, which is also returned as the ``diagnostics`` attribute of the
+    simulation result. It has the following fields:
+
+    ================  ======================================================
+    Field             Description
+    ================  ======================================================
+    ``z``             The starting point of the step.
+    ``dz``            The step size.
+    ``accepted``      ``True`` if the step was accepted.
+    ``error``         The relative local error estimate.
+    ``energy``        The pulse energy after the step, with units of ``J``.
+    ``photons``       The photon number after the step.
+    ``energy_drift``  The relative change of the energy since the start.
+    ``photon_drift``  The relative change of the photon number since the
+                      start.
+    ``edge``          The fraction of the energy at the edges of the
+                      frequency window.
+    ``t_linear``      The time spent in the linear operator, in ``s``.
+    ``t_nonlinear``   The time spent in the nonlinear operator, in ``s``.
+    ================  ======================================================
+
+    The conserved quantities and the edge energy are ``nan`` for rejected
+    steps.
+
+    Parameters
+    ----------
+    log : str or file-like, optional
+        A file name or open text file in which each step is written as it is
+        taken, as a tab-separated line with the fields of `steps`. A file
+        name is opened in append mode, and is reopened when a simulation is
+        resumed from a checkpoint. The default is ``None``, which does not
+        write a log.
+    edge : float, optional
+        The fraction of the frequency window on each side that is considered
+        the edge of the window. The default is 0.05.
+    max_energy_drift : float, optional
+        The largest relative change of the energy, above which a
+        ``RuntimeError`` stops the simulation. The default is ``None``.
+    max_photon_drift : float, optional
+        The largest relative change of the photon number, above which a
+        ``RuntimeError`` stops the simulation. The default is ``None``.
+    max_edge : float, optional
+        The largest fraction of the energy at the edges of the frequency
+        window, above which a ``RuntimeError`` stops the simulation. The
+        default is ``None``.
+    min_dz : float, optional
+        The smallest step size of a rejected step, below which a
+        ``RuntimeError`` stops the simulation. Accepted steps may be smaller,
+        i.e. the steps that end on the record points. The default is
+        ``None``.
+
+    Notes
+    -----
+    Which of the quantities is conserved depends on the model. The energy is
+    conserved by the `~pynlo.model.NLSE` model, which does not include
+    self-steepening. In the `~pynlo.model.UPE` model, the energy is conserved
+    by instantaneous nonlinearities, e.g. 2nd-order processes and the Kerr
+    effect, and the photon number is approximately conserved by the Kerr and
+    Raman effects. Neither is conserved in modes with gain or loss. The drift
+    of the conserved quantity and the edge energy are indicators of aliasing
+    and of a frequency window that is too small.
+
+    The operator times include the overhead of the timers, about a
+    microsecond per call, and the diagnostics add a few operations over the
+    spectrum to each accepted step.
+
+    """
+    dtype = np.dtype([
+        ("z", float), ("dz", float), ("accepted", bool), ("error", float),
+        ("energy", float), ("photons", float),
+        ("energy_drift", float), ("photon_drift", float), ("edge", float),
+        ("t_linear", float), ("t_nonlinear", float)])
+
+    def __init__(self, log=None, edge=0.05, max_energy_drift=None, max_photon_drift=None,
+                 max_edge=None, min_dz=None):
+        assert (0 < edge < 0.5), "The edge must be less than half of the window."
+        self.log = log
+        self.edge = edge
+        self.max_energy_drift = max_energy_drift
+        self.max_photon_drift = max_photon_drift
+        self.max_edge = max_edge
+        self.min_dz = min_dz
+
+    def start(self, v_grid, dv, a_v):
+        """
+        Prepare for the simulation.
+
+        Parameters
+        ----------
+        v_grid : ndarray of float
+            The frequency grid, in the same order as the spectra of the steps.
+        dv : float
+            The frequency step.
+        a_v : ndarray of complex
+            The root-power spectrum of the input pulse.
+
+        """
+        #---- Weights
+        self._w_photons = dv/(h*v_grid)
+        v_min, v_max = v_grid.min(), v_grid.max()
+        v_edge = self.edge*(v_max - v_min)
+        self._edges = (v_grid < v_min + v_edge) | (v_grid > v_max - v_edge)
+        self._dv = dv
+        self._p_v = np.empty(a_v.shape, dtype=float)
+
+        #---- Initial Values
+        self.energy_0, self.photons_0, _ = self._moments(a_v)
+        self._steps = np.zeros(64, dtype=self.dtype)
+        self.n_steps = 0
+        self._time = {"linear": 0.0, "nonlinear": 0.0}
+        self._time_last = dict(self._time)
+
+        #---- Log
+        self._open_log(header=True)
+
+    @property
+    def steps(self):
+        """The steps taken so far, as a structured array."""
+        return self._steps[:self.n_steps]
+
+    @property
+    def n_accepted(self):
+        """The number of accepted steps."""
+        return int(np.count_nonzero(self.steps["accepted"]))
+
+    @property
+    def n_rejected(self):
+        """The number of rejected steps."""
+        return self.n_steps - self.n_accepted
+
+    def timed(self, kind, operator):
+        """
+        Wrap an operator of the model so that the time spent in it is added
+        to the time of the `kind` operator, either ``"linear"`` or
+        ``"nonlinear"``.
+
+        """
+        clock = time.perf_counter
+        times = self._time
+
+        def timed_operator(*args, **kwargs):
+            t_start = clock()
+            try:
+                return operator(*args, **kwargs)
+            finally:
+                times[kind] += clock() - t_start
+        return timed_operator
+
+    def step(self, z, dz, accepted, error, a_v=None):
+        """
+        Record a step.
+
+        Parameters
+        ----------
+        z : float
+            The starting point.
+        dz : float
+            The step size.
+        accepted : bool
+            A flag that indicates whether the step was accepted.
+        error : float
+            The relative local error estimate.
+        a_v : ndarray of complex, optional
+            The root-power spectrum after an accepted step.
+
+        """
+        #---- Conserved Quantities
+        if accepted and a_v is not None:
+            energy, photons, edge = self._moments(a_v)
+            energy_drift = energy/self.energy_0 - 1
+            photon_drift = photons/self.photons_0 - 1
+        else:
+            energy = photons = edge = energy_drift = photon_drift = np.nan
+
+        #---- Operator Times
+        t_linear = self._time["linear"] - self._time_last["linear"]
+        t_nonlinear = self._time["nonlinear"] - self._time_last["nonlinear"]
+        self._time_last.update(self._time)
+
+        #---- Record
+        if self.n_steps == self._steps.size:
+            self._steps = np.resize(self._steps, 2*self._steps.size)
+        row = (z, dz, accepted, error, energy, photons, energy_drift, photon_drift, edge,
+               t_linear, t_nonlinear)
+        self._steps[self.n_steps] = row
+        self.n_steps += 1
+        if self._file is not None:
+            self._file.write("\t".join("{:.9g}".format(x) for x in row) + "\n")
+            self._file.flush()
+
+        #---- Limits
+        if self.min_dz is not None and dz < self.min_dz and not accepted:
+            raise RuntimeError("The step size collapsed to {:.3g} m at z={:.6g} m.".format(dz, z))
+        if self.max_energy_drift is not None and abs(energy_drift) > self.max_energy_drift:
+            raise RuntimeError(
+                "The energy drifted by {:.3g} at z={:.6g} m.".format(energy_drift, z + dz))
+        if self.max_photon_drift is not None and abs(photon_drift) > self.max_photon_drift:
+            raise RuntimeError(
+                "The photon number drifted by {:.3g} at z={:.6g} m.".format(photon_drift, z + dz))
+        if self.max_edge is not None and edge > self.max_edge:
+            raise RuntimeError(
+                "The energy at the edges of the frequency window reached {:.3g} at z={:.6g} m.".format(
+                    edge, z + dz))
+
+    def finish(self):
+        """Close the log at the end of the simulation."""
+        self._steps = self.steps.copy()
+        if self._file is not None and self._file is not self.log:
+            self._file.close()
+        self._file = None
+
+    def _moments(self, a_v):
+        """The energy, photon number, and edge fraction of a spectrum."""
+        p_v = np.abs(a_v, out=self._p_v)
+        p_v = np.square(p_v, out=p_v)
+        energy = p_v.sum()
+        photons = p_v @ self._w_photons
+        edge = p_v[self._edges].sum()/energy
+        return energy*self._dv, photons, edge
+
+    def _open_log(self, header=False):
+        """Open the log and write the names of the fields."""
+        if self.log is None:
+            self._file = None
+            return
+        self._file = open(self.log, "a") if isinstance(self.log, str) else self.log
+        if header:
+            self._file.write("\t".join(self.dtype.names) + "\n")
+            self._file.flush()
+
+    #---- Pickling
+    def __getstate__(self):
+        # the open log is not picklable, so it is reopened when unpickled
+        # (i.e. when resuming from a checkpoint)
+        state = self.__dict__.copy()
+        state.pop("_file", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open_log()
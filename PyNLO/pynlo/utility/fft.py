@@ -2,17 +2,220 @@
 """
 Aliases to fast FFT implementations and associated helper functions.
 
+The transforms use MKL, which runs each transform on a pool of threads. The
+JIT-compiled routines of `pynlo.model` run on a separate pool managed by
+``numba``. When running many simulations on the same machine, these pools
+should be limited to avoid oversubscribing the processor, see `set_threads`
+and `threads`. The time spent in each type and size of transform can be
+measured with `timers`.
+
 """
 
 __all__ = ["fft", "ifft", "rfft", "irfft",
-           "fftshift", "ifftshift"]
+           "fftshift", "ifftshift",
+           "set_threads", "get_threads", "threads",
+           "timers", "get_timers", "reset_timers"]
 
 
 # %% Imports
 
-from scipy.fft import next_fast_len, fftshift as _fftshift, ifftshift as _ifftshift
+import collections
+import contextlib
+import functools
+import time
+import warnings
+
+import numpy as np
 import mkl_fft
 
+try:
+    import mkl
+except ImportError:
+    mkl = None
+
+
+# %% Collections
+
+_Threads = collections.namedtuple("Threads", ["mkl", "numba"])
+
+_Timer = collections.namedtuple("Timer", ["calls", "time"])
+
+
+# %% Threads
+
+def get_threads():
+    """
+    The number of threads used by MKL and by numba.
+
+    Returns
+    -------
+    mkl : int or None
+        The maximum number of MKL threads. This is ``None`` if the
+        ``mkl-service`` package is not installed.
+    numba : int
+        The number of threads of the numba thread pool.
+
+    """
+    import numba # only imported when needed, see `pynlo`
+
+    n_mkl = mkl.get_max_threads() if mkl is not None else None
+    return _Threads(mkl=n_mkl, numba=numba.get_num_threads())
+
+def set_threads(n=None, n_mkl=None, n_numba=None):
+    """
+    Set the number of threads used by MKL and by numba.
+
+    The MKL threads run the transforms of this module, and the numba threads
+    run the parallel JIT-compiled routines of `pynlo.model`. The number of
+    numba threads is limited by the size of its thread pool, which is set by
+    the ``NUMBA_NUM_THREADS`` environment variable before numba is imported.
+
+    Parameters
+    ----------
+    n : int, optional
+        The number of threads of both MKL and numba.
+    n_mkl : int, optional
+        The number of MKL threads. Overrides `n`.
+    n_numba : int, optional
+        The number of numba threads. Overrides `n`.
+
+    Returns
+    -------
+    mkl : int or None
+        The previous number of MKL threads.
+    numba : int
+        The previous number of numba threads.
+
+    """
+    previous = get_threads()
+    n_mkl = n if n_mkl is None else n_mkl
+    n_numba = n if n_numba is None else n_numba
+
+    #---- MKL
+    if n_mkl is not None:
+        if mkl is not None:
+            mkl.set_num_threads(n_mkl)
+        else:
+            warnings.warn("The number of MKL threads can only be set if the mkl-service"
+                          " package is installed", stacklevel=2)
+
+    #---- Numba
+    if n_numba is not None:
+        import numba
+        numba.set_num_threads(max(1, min(n_numba, numba.config.NUMBA_NUM_THREADS)))
+    return previous
+
+@contextlib.contextmanager
+def threads(n=None, n_mkl=None, n_numba=None):
+    """
+    A context manager that sets the number of MKL and numba threads, and
+    restores the previous values on exit.
+
+    Parameters
+    ----------
+    n, n_mkl, n_numba : int, optional
+        See `set_threads`.
+
+    Examples
+    --------
+    Run a simulation on a single thread, e.g. one of many simulations running
+    in parallel on the same machine::
+
+        with pynlo.utility.fft.threads(1):
+            model.simulate(length)
+
+    """
+    previous = set_threads(n=n, n_mkl=n_mkl, n_numba=n_numba)
+    try:
+        yield get_threads()
+    finally:
+        set_threads(n_mkl=previous.mkl, n_numba=previous.numba)
+
+
+# %% Timers
+
+_timers = {}
+_timing = False
+
+def _timed(name):
+    """
+    Record the time of each call to the decorated transform, keyed by `name`
+    and the number of points of the transform, while timing is enabled.
+
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(x, *args, **kwargs):
+            if not _timing:
+                return func(x, *args, **kwargs)
+
+            t_0 = time.perf_counter()
+            result = func(x, *args, **kwargs)
+            dt = time.perf_counter() - t_0
+
+            size = kwargs.get("n", args[1] if len(args) > 1 else None)
+            if size is None:
+                axis = kwargs.get("axis", args[2] if len(args) > 2 else -1)
+                size = np.shape(x if name == "rfft" else result)[axis]
+            key = (name, size)
+            calls, total = _timers.get(key, (0, 0.0))
+            _timers[key] = _Timer(calls + 1, total + dt)
+            return result
+        return wrapper
+    return decorator
+
+def get_timers():
+    """
+    The cumulative time spent in each type and size of transform.
+
+    Returns
+    -------
+    dict
+        The keys are ``(name, n)`` tuples, where `name` is the name of the
+        transform (i.e. "fft") and `n` the number of points in the time
+        domain. The values are ``(calls, time)`` tuples, with the number of
+        calls and the total time in seconds.
+
+    """
+    return dict(_timers)
+
+def reset_timers():
+    """Clear the times recorded by `timers`."""
+    _timers.clear()
+
+@contextlib.contextmanager
+def timers(reset=True):
+    """
+    A context manager that records the time spent in the transforms of this
+    module.
+
+    Timing adds a small overhead to each transform, so it is only enabled
+    within the context.
+
+    Parameters
+    ----------
+    reset : bool, optional
+        Clear the previously recorded times on entry. The default is ``True``.
+
+    Examples
+    --------
+    ::
+
+        with pynlo.utility.fft.timers():
+            model.simulate(length)
+        print(pynlo.utility.fft.get_timers())
+
+    """
+    global _timing
+    if reset:
+        reset_timers()
+    timing = _timing
+    _timing = True
+    try:
+        yield _timers
+    finally:
+        _timing = timing
+
 
 # %% Helper Functions
 
@@ -37,7 +240,7 @@ def fftshift(x, axis=-1):
         The shifted array.
 
     """
-    return _fftshift(x, axes=axis)
+    return np.fft.fftshift(x, axes=axis)
 
 def ifftshift(x, axis=-1):
     """
@@ -60,12 +263,13 @@ def ifftshift(x, axis=-1):
         The shifted array.
 
     """
-    return _ifftshift(x, axes=axis)
+    return np.fft.ifftshift(x, axes=axis)
 
 
 # %% Transforms
 
 #---- FFTs
+@_timed("fft")
 def fft(x, fsc=1.0, n=None, axis=-1, overwrite_x=False):
     """
     Use MKL to perform a 1D FFT of the input array along the given axis.
@@ -94,6 +298,7 @@ def fft(x, fsc=1.0, n=None, axis=-1, overwrite_x=False):
     """
     return mkl_fft.fft(x, n=n, axis=axis, overwrite_x=overwrite_x, forward_scale=fsc)
 
+@_timed("ifft")
 def ifft(x, fsc=1.0, n=None, axis=-1, overwrite_x=False):
     """
     Use MKL to perform a 1D IFFT of the input array along the given axis.
@@ -125,6 +330,7 @@ def ifft(x, fsc=1.0, n=None, axis=-1, overwrite_x=False):
     return mkl_fft.ifft(x, n=n, axis=axis, overwrite_x=overwrite_x, forward_scale=fsc)
 
 #---- Real FFTs
+@_timed("rfft")
 def rfft(x, fsc=1.0, n=None, axis=-1):
     """
     Use MKL to perform a 1D FFT of the real input array along the given axis.
@@ -153,6 +359,7 @@ def rfft(x, fsc=1.0, n=None, axis=-1):
     """
     return mkl_fft.rfft_numpy(x, n=n, axis=axis, forward_scale=fsc)
 
+@_timed("irfft")
 def irfft(x, fsc=1.0, n=None, axis=-1):
     """
     Use MKL to perform a 1D IFFT of the input array along the given axis. The
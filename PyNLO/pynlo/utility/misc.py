@@ -9,6 +9,8 @@ __all__ = []
 
 # %% Imports
 
+import copy
+
 import numpy as np
 
 
@@ -20,6 +22,49 @@ def replace(array, values, key):
     array[key] = values
     return array
 
+def read_only(array):
+    """Lock `array` against in-place modification and return it."""
+    array.setflags(write=False)
+    return array
+
+def _is_immutable(array):
+    """Check that neither `array` nor any array it views can be modified."""
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        array = array.base
+    return True
+
+def _immutable_arrays(value):
+    """Iterate over the immutable arrays held by `value`."""
+    if isinstance(value, np.ndarray):
+        if _is_immutable(value):
+            yield value
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _immutable_arrays(item)
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            yield from _immutable_arrays(item)
+
+def deepcopy_shared(obj, memo):
+    """
+    Deep copy `obj`, sharing instead of copying its immutable arrays.
+
+    Arrays that have been locked with `read_only`, and which do not view any
+    writeable memory, cannot change after creation and are safe to reference
+    from both the original and the copy. All other attributes are deep copied
+    as usual. This function is meant to be called from `__deepcopy__`.
+    """
+    cls = obj.__class__
+    new = cls.__new__(cls)
+    memo[id(obj)] = new
+    for array in _immutable_arrays(vars(obj)):
+        memo[id(array)] = array
+    for key, value in vars(obj).items():
+        new.__dict__[key] = copy.deepcopy(value, memo)
+    return new
+
 
 # %% Array Properties for Classes
 
@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Monitors that display the pulse during a simulation.
+
+`pynlo.model.Model.simulate` passes the pulse to a monitor at each record
+point. The monitor only copies the spectrum into a bounded queue, and the
+figures are drawn by a separate Python process, so the simulation never waits
+on the rendering. If the drawing falls behind, frames are dropped instead.
+The figures can be shown in a window or, for simulations without a display
+(e.g. cluster jobs), saved as a numbered sequence of images for a later
+animation. Plotting requires ``matplotlib``.
+
+"""
+
+__all__ = ["LivePlot"]
+
+
+# %% Imports
+
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import threading
+
+from scipy.constants import c
+
+
+# %% Monitors
+
+class LivePlot():
+    """
+    Plot the pulse in a separate process while a simulation is running.
+
+    The pulse is plotted in the time, frequency, or wavelength domain at each
+    record point of the simulation. The spectrum is copied into a queue of at
+    most `maxsize` frames, which a background thread sends to the plotting
+    process. When the queue is full, the frame is dropped and the simulation
+    continues. The last frame of the simulation is always plotted.
+
+    Parameters
+    ----------
+    plot : string, optional
+        The type of plot. The options are ``"frq"``, ``"time"``, or
+        ``"wvl"``, corresponding to the frequency, time, and wavelength
+        domains. The default is ``"frq"``.
+    path : str, optional
+        A directory in which to save each frame as a PNG image, named
+        ``frame_00000.png``, ``frame_00001.png``, etc., without opening a
+        window. The directory is created if it does not exist. The default is
+        ``None``, which shows the frames in a window.
+    maxsize : int, optional
+        The maximum number of frames waiting to be plotted. The default is 2.
+    drop : bool, optional
+        If ``False``, the simulation waits for room in the queue instead of
+        dropping frames, e.g. to save every frame of an animation. The default
+        is ``True``.
+    dpi : float, optional
+        The resolution of the saved images. The default is 100.
+
+    Notes
+    -----
+    After the simulation, the window stays open until it is closed. When saving
+    images, `finish` waits until all frames in the queue have been saved, which
+    includes the time to start the plotting process. The number of frames that
+    were dropped is available as `dropped`.
+
+    """
+    def __init__(self, plot="frq", path=None, maxsize=2, drop=True, dpi=100):
+        assert (plot in ["frq", "time", "wvl"]), (
+            "Plot choice '{:}' is unrecognized").format(plot)
+        assert (maxsize >= 1), "The queue must hold atleast 1 frame."
+        self.plot = plot
+        self.path = path
+        self.maxsize = maxsize
+        self.drop = drop
+        self.dpi = dpi
+
+    def start(self, pulse, z):
+        """
+        Start the plotting process and plot the input pulse.
+
+        Parameters
+        ----------
+        pulse : pynlo.light.Pulse
+            The input pulse.
+        z : float
+            The z position of the input pulse.
+
+        """
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        self.dropped = 0
+        self._pending = None
+
+        #---- Plotting Process
+        # the process is started from a fresh interpreter (instead of with
+        # multiprocessing) so that the main script is not run again
+        pkg_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join([pkg_dir] + ([env["PYTHONPATH"]] if "PYTHONPATH" in env else []))
+        self._process = subprocess.Popen(
+            [sys.executable, "-c", "from pynlo.utility.monitors import _view; _view()"],
+            stdin=subprocess.PIPE, env=env)
+
+        #---- Sender
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        # not a daemon, so the remaining frames are sent before Python exits
+        self._thread = threading.Thread(target=self._send)
+        self._thread.start()
+        self._queue.put((self.plot, self.path, self.dpi, pulse.copy(), z))
+        self._queue.put((z, pulse.a_v.copy()))
+
+    def update(self, pulse, z):
+        """
+        Queue the pulse to be plotted.
+
+        Parameters
+        ----------
+        pulse : pynlo.light.Pulse
+            The pulse at the record point.
+        z : float
+            The z position of the record point.
+
+        """
+        frame = (z, pulse.a_v.copy())
+        if not self.drop:
+            self._queue.put(frame)
+            return
+        try:
+            self._queue.put_nowait(frame)
+            self._pending = None
+        except queue.Full:
+            self.dropped += 1
+            self._pending = frame # plotted at the end if it is the last frame
+
+    def finish(self):
+        """Plot the last frame and close the connection to the process."""
+        if self._pending is not None:
+            self._queue.put(self._pending)
+            self.dropped -= 1
+            self._pending = None
+        self._queue.put(None)
+        if self.path is not None:
+            self._thread.join()
+            self._process.wait()
+
+    def _send(self):
+        """Send the queued frames to the plotting process."""
+        connected = True
+        while True:
+            frame = self._queue.get()
+            if connected:
+                try:
+                    pickle.dump(frame, self._process.stdin, protocol=pickle.HIGHEST_PROTOCOL)
+                    self._process.stdin.flush()
+                except (BrokenPipeError, OSError):
+                    # the window was closed, discard the remaining frames
+                    connected = False
+            if frame is None:
+                break
+        if connected:
+            self._process.stdin.close()
+
+
+# %% Plotting Process
+
+class _Figure():
+    """
+    The figure of a `LivePlot`, drawn in the plotting process.
+
+    """
+    def __init__(self, fig, plot, pulse, z, animated):
+        self.fig = fig
+        self.plot = plot
+        self.pulse = pulse
+        self.animated = animated
+
+        #---- Figure and Axes
+        self._ax_0 = fig.add_subplot(2, 1, 1)
+        self._ax_1 = fig.add_subplot(2, 1, 2, sharex=self._ax_0)
+
+        #---- Lines
+        self._ln_pwr, = self._ax_0.semilogy(*self._data()[0], '.', markersize=1, animated=animated)
+        self._ln_phs, = self._ax_1.plot(*self._data()[1], '.', markersize=1, animated=animated)
+
+        #---- Time Domain
+        if plot=="time":
+            # Labels
+            self._ax_0.set_title("Instantaneous Power")
+            self._ax_0.set_ylabel("J / s")
+            self._ax_0.set_xlabel("Delay (ps)")
+            self._ax_1.set_ylabel("Frequency (THz)")
+            self._ax_1.set_xlabel("Delay (ps)")
+
+            # Y Boundaries
+            excess = 0.05*(pulse.v_grid.max()-pulse.v_grid.min())
+            self._ax_1.set_ylim(
+                top=1e-12*(pulse.v_grid.max() + excess),
+                bottom=1e-12*(pulse.v_grid.min() - excess))
+
+        #---- Frequency Domain
+        if plot=="frq":
+            # Labels
+            self._ax_0.set_title("Power Spectrum")
+            self._ax_0.set_ylabel("J / Hz")
+            self._ax_0.set_xlabel("Frequency (THz)")
+            self._ax_1.set_ylabel("Delay (ps)")
+            self._ax_1.set_xlabel("Frequency (THz)")
+
+        #---- Wavelength Domain
+        if plot=="wvl":
+            # Labels
+            self._ax_0.set_title("Power Spectrum")
+            self._ax_0.set_ylabel("J / m")
+            self._ax_0.set_xlabel("Wavelength (nm)")
+            self._ax_1.set_ylabel("Delay (ps)")
+            self._ax_1.set_xlabel("Wavelength (nm)")
+
+        if plot in ["frq", "wvl"]:
+            # Y Boundaries
+            excess = 0.05*(pulse.t_grid.max()-pulse.t_grid.min())
+            self._ax_1.set_ylim(
+                top=1e12*(pulse.t_grid.max() + excess),
+                bottom=1e12*(pulse.t_grid.min() - excess))
+
+        y_max = max(self._ln_pwr.get_ydata())
+        self._ax_0.set_ylim(top=y_max*1e1, bottom=y_max*1e-9)
+
+        #---- Z Label
+        #TODO: change to plt.barh, progress bar
+        self._z_label = self._ax_1.legend(
+            [],[],
+            title='z = {:.6g} m'.format(z),
+            loc=9,
+            labelspacing=0,
+            framealpha=1,
+            shadow=False)
+        self._z_label.set_animated(animated)
+
+        #---- Layout
+        fig.tight_layout()
+        fig.canvas.draw()
+
+        #---- Blit
+        self._artists = (self._ln_pwr, self._ln_phs, self._z_label)
+        if animated:
+            self._bkg_0 = fig.canvas.copy_from_bbox(self._ax_0.bbox)
+            self._bkg_1 = fig.canvas.copy_from_bbox(self._ax_1.bbox)
+
+    def _data(self):
+        """The x and y data of the power and phase lines."""
+        pulse = self.pulse
+        if self.plot=="time":
+            return ((1e12*pulse.t_grid, pulse.p_t),
+                    (1e12*pulse.t_grid, 1e-12*pulse.vg_t))
+        if self.plot=="frq":
+            return ((1e-12*pulse.v_grid, pulse.p_v),
+                    (1e-12*pulse.v_grid, 1e12*pulse.tg_v))
+        if self.plot=="wvl":
+            return ((1e9*c/pulse.v_grid, pulse.v_grid**2/c * pulse.p_v),
+                    (1e9*c/pulse.v_grid, 1e12*pulse.tg_v))
+
+    def update(self, z, a_v):
+        """Draw the given spectrum."""
+        #---- Update Data
+        self.pulse.a_v = a_v
+        data_pwr, data_phs = self._data()
+        self._ln_pwr.set_data(*data_pwr)
+        self._ln_phs.set_data(*data_phs)
+
+        #---- Update Z Label
+        self._z_label.set_title('z = {:.6g} m'.format(z))
+
+        if not self.animated:
+            self.fig.canvas.draw()
+            return
+
+        #---- Restore Background
+        self.fig.canvas.restore_region(self._bkg_0)
+        self.fig.canvas.restore_region(self._bkg_1)
+
+        #---- Blit
+        for artist in self._artists:
+            artist.axes.draw_artist(artist)
+
+        self.fig.canvas.blit(self._ax_0.bbox)
+        self.fig.canvas.blit(self._ax_1.bbox)
+        self.fig.canvas.flush_events()
+
+    def end_animation(self):
+        """Leave the last frame drawn as a regular figure."""
+        for artist in self._artists:
+            artist.set_animated(False)
+        self.fig.canvas.draw_idle()
+
+
+def _view(stream=None):
+    """
+    The main loop of the plotting process, which draws the frames sent by a
+    `LivePlot` through standard input.
+
+    """
+    if stream is None:
+        stream = sys.stdin.buffer
+    plot, path, dpi, pulse, z = pickle.load(stream)
+
+    #---- Save Frames
+    if path is not None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        figure = _Figure(fig, plot, pulse, z, animated=False)
+        idx = 0
+        for frame in iter(lambda: _load(stream), None):
+            figure.update(*frame)
+            fig.savefig(os.path.join(path, "frame_{:05d}.png".format(idx)), dpi=dpi)
+            idx += 1
+        return
+
+    #---- Show Frames
+    import matplotlib.pyplot as plt
+
+    # Only the latest frame is kept, the others are dropped
+    latest = []
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def read():
+        for frame in iter(lambda: _load(stream), None):
+            with lock:
+                latest[:] = [frame]
+        done.set()
+    threading.Thread(target=read, daemon=True).start()
+
+    fig = plt.figure("Real-Time Simulation", clear=True)
+    figure = _Figure(fig, plot, pulse, z, animated=True)
+    fig.show()
+    while plt.fignum_exists(fig.number):
+        finished = done.is_set()
+        with lock:
+            frame = latest.pop() if latest else None
+        if frame is not None:
+            figure.update(*frame)
+        elif finished:
+            break
+        plt.pause(0.02)
+
+    #---- End Animation
+    if plt.fignum_exists(fig.number):
+        figure.end_animation()
+        plt.show()
+
+
+def _load(stream):
+    """Load the next frame, or ``None`` at the end of the stream."""
+    try:
+        return pickle.load(stream)
+    except EOFError:
+        return None
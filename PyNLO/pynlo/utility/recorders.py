@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+Recorders that receive the pulse at each record point of a simulation.
+
+By default, `pynlo.model.Model.simulate` stores the complex envelope and
+spectrum at every record point, which takes ``2*n_records*n*16`` bytes. A
+recorder can be passed to `simulate` to store less, i.e. only the spectrum,
+a decimated band of the spectrum, the power in dB as single-precision floats,
+or to write each record to an HDF5 file or Zarr store as it is produced.
+
+"""
+
+__all__ = ["Recorder", "FullRecorder", "SpectrumRecorder", "FileRecorder",
+           "AdaptiveRecording"]
+
+
+# %% Imports
+
+import numpy as np
+
+
+# %% Recorders
+
+class Recorder():
+    """
+    The base class for recorders.
+
+    Subclasses override the `start`, `record`, and `finish` methods, which are
+    called by `pynlo.model.Model.simulate` at the beginning of the simulation,
+    once at each of the record points (including the starting point), and at
+    the end.
+
+    """
+    def start(self, pulse, z):
+        """
+        Prepare for the simulation.
+
+        Parameters
+        ----------
+        pulse : pynlo.light.Pulse
+            The input pulse.
+        z : ndarray of float
+            The z positions at which the pulse will be recorded.
+
+        """
+        self.z = z
+        self.v_grid = pulse.v_grid
+        self.t_grid = pulse.t_grid
+
+    def record(self, idx, pulse):
+        """
+        Record the pulse at the `idx` record point.
+
+        Parameters
+        ----------
+        idx : int
+            The index of the record point.
+        pulse : pynlo.light.Pulse
+            The pulse at the record point. The pulse is updated in place
+            throughout the simulation, so any stored data must be copied.
+
+        """
+        pass
+
+    def truncate(self, z):
+        """
+        Keep only the first ``len(z)`` records.
+
+        This is called before `finish` when the record points are chosen
+        during the simulation (see `AdaptiveRecording`), in which case `start`
+        is given the maximum number of records with undetermined positions.
+
+        Parameters
+        ----------
+        z : ndarray of float
+            The z positions of the records that were taken.
+
+        """
+        self.z = z
+
+    def finish(self):
+        """Clean up at the end of the simulation."""
+        pass
+
+
+class FullRecorder(Recorder):
+    """
+    Record the full spectrum and complex envelope.
+
+    This is the default behavior of `pynlo.model.Model.simulate`.
+
+    Parameters
+    ----------
+    time_domain : bool, optional
+        If ``False``, the complex envelope `a_t` is not recorded and is
+        ``None``. The default is ``True``.
+
+    """
+    def __init__(self, time_domain=True):
+        self.time_domain = time_domain
+
+    def start(self, pulse, z):
+        super().start(pulse, z)
+        self.a_v = np.empty((len(z), pulse.n), dtype=complex)
+        self.a_t = np.empty_like(self.a_v) if self.time_domain else None
+
+    def record(self, idx, pulse):
+        self.a_v[idx,:] = pulse.a_v
+        if self.time_domain:
+            self.a_t[idx,:] = pulse.a_t
+
+    def truncate(self, z):
+        super().truncate(z)
+        self.a_v = self.a_v[:len(z)]
+        if self.time_domain:
+            self.a_t = self.a_t[:len(z)]
+
+
+class SpectrumRecorder(Recorder):
+    """
+    Record a band of the spectrum, optionally as the power in dB.
+
+    After the simulation, the records are available as `spectrum`, with the
+    matching frequency grid `v_grid`.
+
+    Parameters
+    ----------
+    v_range : tuple of float, optional
+        The minimum and maximum frequency of the recorded band. The default
+        is ``None``, which records the whole spectrum.
+    decimation : int, optional
+        Record only every `decimation` point in the band. The default is 1.
+    db : bool, optional
+        If ``True``, record the power spectral density in dB, i.e.
+        ``10*log10(p_v)``. Otherwise, record the root-power spectrum `a_v`.
+        The default is ``False``.
+    dtype : data-type, optional
+        The data type of the records. The default is ``None``, which uses
+        single-precision floats for dB and double-precision complex numbers
+        otherwise.
+
+    """
+    def __init__(self, v_range=None, decimation=1, db=False, dtype=None):
+        self.v_range = v_range
+        self.decimation = decimation
+        self.db = db
+        if dtype is None:
+            dtype = np.float32 if db else complex
+        self.dtype = np.dtype(dtype)
+
+    def start(self, pulse, z):
+        super().start(pulse, z)
+        if self.v_range is None:
+            band = np.arange(pulse.n)
+        else:
+            band = np.flatnonzero((self.v_grid >= min(self.v_range))
+                                  & (self.v_grid <= max(self.v_range)))
+        self._band = band[::self.decimation]
+        self.v_grid = self.v_grid[self._band]
+        self._allocate((len(z), self._band.size))
+
+    def _allocate(self, shape):
+        self.spectrum = np.empty(shape, dtype=self.dtype)
+
+    def _convert(self, pulse):
+        if self.db:
+            with np.errstate(divide="ignore"):
+                data = 10*np.log10(pulse.p_v[self._band])
+        else:
+            data = pulse.a_v[self._band]
+        return data.astype(self.dtype, copy=False)
+
+    def record(self, idx, pulse):
+        self.spectrum[idx,:] = self._convert(pulse)
+
+    def truncate(self, z):
+        super().truncate(z)
+        self.spectrum = self.spectrum[:len(z)]
+
+
+class FileRecorder(SpectrumRecorder):
+    """
+    Write a band of the spectrum to an HDF5 file or Zarr store.
+
+    Each record is written as it is produced, so only one spectrum is held in
+    memory at a time. The group `name` of the file contains the datasets
+    ``z``, ``v_grid``, and ``spectrum``. HDF5 files require ``h5py`` and Zarr
+    stores require ``zarr``.
+
+    Parameters
+    ----------
+    path : str
+        The file name. A ``.zarr`` extension selects a Zarr store, all others
+        an HDF5 file.
+    name : str, optional
+        The name of the group in which the records are stored. Existing data
+        in the group is replaced. The default is ``"simulation"``.
+    v_range, decimation, db, dtype : optional
+        See `SpectrumRecorder`.
+
+    """
+    def __init__(self, path, name="simulation", v_range=None, decimation=1,
+                 db=False, dtype=None):
+        super().__init__(v_range=v_range, decimation=decimation, db=db,
+                         dtype=dtype)
+        self.path = path
+        self.name = name
+        self.zarr = path.rstrip("/").endswith(".zarr")
+        if self.zarr:
+            import zarr # noqa: F401
+        else:
+            import h5py # noqa: F401
+
+    def _allocate(self, shape):
+        if self.zarr:
+            import zarr
+            self._file = zarr.open_group(self.path, mode="a")
+        else:
+            import h5py
+            self._file = h5py.File(self.path, "a")
+
+        group = self._file.require_group(self.name)
+        for key in ["z", "v_grid", "spectrum"]:
+            if key in group:
+                del group[key]
+        # HDF5 datasets need a maxshape to be resized, Zarr arrays do not
+        z_kwargs = {} if self.zarr else {"maxshape": (None,)}
+        spectrum_kwargs = {} if self.zarr else {"maxshape": (None, shape[1])}
+
+        group.create_dataset("z", data=self.z, **z_kwargs)
+        group.create_dataset("v_grid", data=self.v_grid)
+        self.spectrum = group.create_dataset(
+            "spectrum", shape=shape, dtype=self.dtype, chunks=(1, shape[1]),
+            **spectrum_kwargs)
+        self._group = group
+
+    def truncate(self, z):
+        self.z = z
+        self._group["z"].resize((len(z),))
+        self._group["z"][:] = z
+        self.spectrum.resize((len(z), self.spectrum.shape[1]))
+
+    def finish(self):
+        if not self.zarr:
+            self._file.close()
+
+    #---- Pickling
+    def __getstate__(self):
+        # the open file is not picklable, so the file is flushed and then
+        # reopened when unpickled (i.e. when resuming from a checkpoint)
+        if not self.zarr:
+            self._file.flush()
+        state = self.__dict__.copy()
+        for key in ["_file", "_group", "spectrum"]:
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.zarr:
+            import zarr
+            self._file = zarr.open_group(self.path, mode="a")
+        else:
+            import h5py
+            self._file = h5py.File(self.path, "a")
+        self._group = self._file[self.name]
+        self.spectrum = self._group["spectrum"]
+
+
+# %% Record Policies
+
+class AdaptiveRecording():
+    """
+    Choose the record points of a simulation based on the pulse dynamics.
+
+    The pulse is checked at `n_checks` evenly spaced points along the mode,
+    and a record is taken whenever the rms bandwidth, the peak power, or a
+    user defined metric has changed by more than the given relative threshold
+    since the last record. The points given to
+    `pynlo.model.Model.simulate` (i.e. the start and end points) are always
+    recorded, and the total number of records never exceeds `max_records`.
+    This concentrates the records where the pulse evolves quickly, e.g.
+    around soliton fission.
+
+    Parameters
+    ----------
+    max_records : int, optional
+        The maximum number of records. The default is 100.
+    n_checks : int, optional
+        The number of evenly spaced points at which the pulse is checked. The
+        default is ``10*max_records``.
+    bandwidth : float or None, optional
+        The relative change in the rms bandwidth that triggers a record. If
+        ``None``, the bandwidth is not checked. The default is 0.05.
+    peak_power : float or None, optional
+        The relative change in the peak power that triggers a record. If
+        ``None``, the peak power is not checked. The default is 0.05.
+    metric : callable, optional
+        A function that takes the pulse and returns a float.
+    metric_threshold : float, optional
+        The relative change in `metric` that triggers a record.
+
+    """
+    def __init__(self, max_records=100, n_checks=None, bandwidth=0.05,
+                 peak_power=0.05, metric=None, metric_threshold=None):
+        assert (max_records >= 2), "The output must include atleast 2 points."
+        assert (metric is None) or (metric_threshold is not None), (
+            "A threshold is required for the user metric.")
+        self.max_records = max_records
+        self.n_checks = 10*max_records if n_checks is None else n_checks
+        self.thresholds = []
+        if bandwidth is not None:
+            self.thresholds.append((self._bandwidth, bandwidth))
+        if peak_power is not None:
+            self.thresholds.append((self._peak_power, peak_power))
+        if metric is not None:
+            self.thresholds.append((metric, metric_threshold))
+
+    @staticmethod
+    def _bandwidth(pulse):
+        return pulse.v_width().rms
+
+    @staticmethod
+    def _peak_power(pulse):
+        return pulse.p_t.max()
+
+    def reset(self, pulse):
+        """Store the metrics of the pulse at a record point."""
+        self._last = [fn(pulse) for fn, _ in self.thresholds]
+
+    def changed(self, pulse):
+        """Test if the pulse has changed enough to be recorded."""
+        for (fn, threshold), last in zip(self.thresholds, self._last):
+            if np.abs(fn(pulse) - last) > threshold*np.abs(last):
+                return True
+        return False
@@ -97,10 +97,66 @@ def test_pulse_properties():
     ac = test.autocorrelation()
     assert np.isclose(ac.rms, 2**0.5 * t_w.rms, atol=0)
 
+def test_cached_views():
+    test = light.Pulse.Sech(2**8, 100e12, 500e12, 300e12, 1, 100e-15)
+    a_t = test.a_t.__array__()
+    assert test.a_t.__array__().base is a_t.base # cached
+    assert not a_t.flags.writeable
+
+    #--- Invalidation
+    test.a_v = test.a_v * np.exp(0.5j*1e-27*(2*pi*(test.v_grid - 300e12))**2)
+    assert np.allclose(test.a_t, fft.fftshift(fft.ifft(fft.ifftshift(test.a_v), fsc=test.dt)))
+    test.p_v[:10] = 0
+    assert (test.p_v[:10] == 0).all() and np.allclose(test.p_t, np.abs(test.a_t)**2)
+    test.phi_v = 0
+    assert np.allclose(test.phi_v, 0) and np.isclose(test.phi_t[test.n//2], 0)
+    test.a_v[test.n//2] *= 2 # in-place modification
+    test.a_v = test.a_v
+    assert np.isclose(test.p_v[test.n//2], np.abs(test.a_v[test.n//2])**2)
+
+    version = test._version
+    test.e_p = 2*test.e_p
+    assert test._version == version + 1 # one update per setter
+    test.a_v = test.a_v
+    assert test.p_t.__array__().base is test.p_t.__array__().base
+
+    #--- Copies
+    copy = test.copy()
+    copy.e_p = 2*test.e_p
+    assert np.allclose(copy.p_t, 2*test.p_t)
+
+def test_spectrogram(monkeypatch):
+    n = 2**8
+    t_fwhm = 50e-15
+    test = light.Pulse.Sech(n, 100e12, 500e12, 300e12, 1, 100e-15)
+    test.a_v = test.a_v * np.exp(0.5j*1e-27*(2*pi*(test.v_grid - 300e12))**2)
+
+    #--- Gated Spectra
+    # each delay as a separate transform of the gated pulse
+    spg = test.spectrogram(t_fwhm=t_fwhm, n_t=21)
+    g_t = 2**(-0.5*(2*test.t_grid/t_fwhm)**2)
+    g_t /= np.sum(g_t**2 * test.dt)**0.5
+    g_v = fft.fftshift(fft.fft(fft.ifftshift(g_t), fsc=test.dt))
+    for idx, delay in enumerate(spg.t_grid):
+        gate_t = fft.fftshift(fft.ifft(fft.ifftshift(g_v * np.exp(-1j*2*pi*delay*test.v_grid)), fsc=test.dt))
+        p_v = np.abs(fft.fftshift(fft.fft(fft.ifftshift(test.a_t * gate_t), fsc=test.dt)))**2
+        assert np.allclose(spg.spg[:, idx], p_v, rtol=0, atol=1e-10*p_v.max())
+
+    #--- Blocks and Threads
+    monkeypatch.setattr(light, "_SPECTROGRAM_BLOCK", 4*n)
+    assert np.array_equal(test.spectrogram(t_fwhm=t_fwhm, n_t=21, n_threads=2).spg, spg.spg)
+
+    #--- Frequency Range
+    spg = test.spectrogram(t_fwhm=t_fwhm, v_range=(200e12, 400e12), n_t="equal")
+    assert spg.spg.shape == (spg.v_grid.size, spg.v_grid.size) == (spg.v_grid.size, spg.t_grid.size)
+    assert np.isclose(spg.v_grid.min(), 200e12, atol=test.dv, rtol=0)
+    assert np.isclose(spg.v_grid.max(), 400e12, atol=test.dv, rtol=0)
+
 #--- Exploratory
 if __name__ == "__main__":
     test_pulse_shapes()
     test_pulse_properties()
+    test_cached_views()
 
     v_min = 100e12
     v_max = 500e12
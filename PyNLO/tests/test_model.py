@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for pynlo.model methods and classes.
+"""
+
+# %% Imports
+
+import os
+import subprocess
+import sys
+
+import numpy as np
+from scipy import constants
+
+import pynlo
+from pynlo import utility as ut
+
+
+# %% Constants
+
+pi = constants.pi
+
+
+# %% Helper Functions
+
+def soliton_model(n=2**9, N=3, raman=False):
+    """A higher-order soliton in a fiber with only 2nd-order dispersion."""
+    T0 = 50e-15
+    gamma = 1
+    beta2 = -10 * 1e-12**2/1e3
+    v0 = 300e12
+
+    e_p = N**2 / (gamma/np.abs(beta2) * T0/2)
+    t_fwhm = np.arccosh(2**0.5) * 2*T0
+    pulse = pynlo.light.Pulse.Sech(n, 100e12, 500e12, v0, e_p, t_fwhm)
+
+    beta = ut.taylor_series(2*pi*v0, [0, 0, beta2])(2*pi*pulse.v_grid)
+    g3 = ut.chi3.gamma_to_g3(pulse.v_grid, gamma)
+    if raman:
+        r_weights = [0.245*(1-0.21), 12.2e-15, 32e-15]
+        b_weights = [0.245*0.21, 96e-15]
+        rv_grid, r3 = ut.chi3.raman(pulse.n, pulse.dt, r_weights, b_weights)
+    else:
+        rv_grid, r3 = None, None
+    mode = pynlo.medium.Mode(pulse.v_grid, beta, g3=g3, rv_grid=rv_grid, r3=r3)
+
+    L_S = pi/2 * T0**2/np.abs(beta2)
+    return pynlo.model.NLSE(pulse, mode), L_S
+
+
+# %% Stepping
+
+def test_step_workspace():
+    model, L_S = soliton_model(raman=True)
+    a_v = ut.fft.ifftshift(model.pulse.a_v)
+    dz = 1e-2*L_S
+
+    #---- Nonlinear Operator
+    nl_v = model._nonlinear_operator(a_v)
+    out = np.zeros_like(a_v)
+    assert model._nonlinear_operator(a_v, out=out) is out
+    assert np.allclose(out, nl_v, rtol=0, atol=1e-12*np.abs(nl_v).max())
+
+    # Real-valued Raman convolution, as in the previous implementation
+    a_t = ut.fft.ifft(a_v, fsc=model.dt)
+    a2_rv = ut.fft.rfft(np.abs(a_t)**2, fsc=model.dt)
+    a2_t = ut.fft.irfft(model.r3*a2_rv, fsc=model.dt, n=model.n_points)
+    nl_ref_v = model._1j_gamma * ut.fft.fft(a_t*a2_t, fsc=model.dt)
+    assert np.allclose(nl_v, nl_ref_v, rtol=0, atol=1e-12*np.abs(nl_v).max())
+
+    #---- Step
+    ip_v = model._linear_operator(0.5*dz)
+    ai_v = ip_v*a_v
+    ki1_v = ip_v*model._nonlinear_operator(a_v)
+    ki2_v = model._nonlinear_operator(pynlo.model.rk1(ai_v, ki1_v, 0.5*dz))
+    ki3_v = model._nonlinear_operator(pynlo.model.rk1(ai_v, ki2_v, 0.5*dz))
+    k4_v = model._nonlinear_operator(ip_v*pynlo.model.rk1(ai_v, ki3_v, dz))
+    a_RK4_ref, b_v = pynlo.model.rk4(ai_v, ki1_v, ki2_v, ki3_v, k4_v, ip_v, dz)
+    a_RK3_ref = pynlo.model.rk3(b_v, k4_v, model._nonlinear_operator(a_RK4_ref), dz)
+
+    a_RK4_v, a_RK3_v, k5_v = model.step(a_v, 0, dz)
+    assert np.allclose(a_RK4_v, a_RK4_ref, rtol=0, atol=1e-12*np.abs(a_v).max())
+    assert np.allclose(a_RK3_v, a_RK3_ref, rtol=0, atol=1e-12*np.abs(a_v).max())
+
+    # The results of a step are not overwritten by the next step
+    a_RK4_copy, k5_copy = a_RK4_v.copy(), k5_v.copy()
+    a_RK4_next, _, k5_next = model.step(a_RK4_v, dz, 2*dz, k5_v=k5_v, cont=True)
+    assert a_RK4_next is not a_RK4_v and k5_next is not k5_v
+    assert np.array_equal(a_RK4_v, a_RK4_copy)
+    assert np.array_equal(k5_v, k5_copy)
+
+
+def test_simulate_batch():
+    model, L_S = soliton_model(raman=True)
+    length = 0.5*L_S
+    scales = np.array([0.9, 1.0, 1.1])
+    a_v = scales[:, np.newaxis] * model.pulse.a_v
+
+    sims = []
+    for a_v_row in a_v:
+        model.pulse.a_v = a_v_row
+        sims.append(model.simulate(length, dz=1e-4, local_error=1e-6, n_records=5))
+
+    #---- Separate Step Sizes
+    batch = model.simulate_batch(a_v, length, dz=1e-4, local_error=1e-6, n_records=5,
+                                 row_steps=True)
+    assert batch.a_v.shape == (3, 5, model.n_points)
+    assert batch.a_t.shape == (3, 5, model.n_points)
+    assert len(batch.pulse) == 3
+    for idx, sim in enumerate(sims):
+        assert np.allclose(batch.z, sim.z)
+        assert np.allclose(batch.a_v[idx], sim.a_v, rtol=0, atol=1e-10*np.abs(sim.a_v).max())
+        assert np.allclose(batch.a_t[idx], sim.a_t, rtol=0, atol=1e-10*np.abs(sim.a_t).max())
+        assert np.allclose(batch.pulse[idx].a_v, sim.pulse.a_v, rtol=0, atol=1e-10*np.abs(sim.a_v).max())
+
+    #---- Common Step Size
+    batch = model.simulate_batch(a_v, length, dz=1e-4, local_error=1e-6, n_records=5)
+    for idx, sim in enumerate(sims):
+        assert np.allclose(batch.a_v[idx], sim.a_v, rtol=0, atol=1e-3*np.abs(sim.a_v).max())
+
+
+def test_methods():
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+    ref = model.simulate(length, dz=1e-4, local_error=1e-9).pulse.a_v
+
+    for method, local_error in [("ssfm", 1e-6), ("rk4ip", 1e-12)]:
+        #---- Step Size Estimate
+        method_last = model.method
+        dz = model.estimate_step_size(local_error=local_error, method=method)
+        assert model.method == method_last
+        # independent of the starting point in a z-independent mode
+        dz_z = model.estimate_step_size(local_error=local_error, method=method, z=length)
+        assert np.isclose(dz_z, dz, rtol=1e-3)
+
+        #---- Simulation
+        pulse_out = model.simulate(length, dz=dz, local_error=local_error, method=method).pulse
+        assert model.method == method
+        err = np.linalg.norm(pulse_out.a_v - ref)/np.linalg.norm(ref)
+        assert err < 1e-3, (method, err)
+        assert np.isclose(pulse_out.e_p, model.pulse.e_p, rtol=1e-6)
+
+
+def test_rk4ip_conserved_quantity():
+    model, L_S = soliton_model(raman=True)
+    length = 2*L_S
+    v_grid = model.v_grid
+    # without self-steepening, the Raman effect conserves the energy
+    assert model._cq_weights is model._energy_weights
+
+    #---- Self-Steepening
+    # the Raman self-frequency shift changes the energy, but not the photon number
+    mode = pynlo.medium.Mode(v_grid, model.mode.beta, g3=model.mode.g3*v_grid/model.pulse.v0,
+                             rv_grid=model.mode.rv_grid, r3=model.mode.r3)
+    model = pynlo.model.NLSE(model.pulse, mode)
+    assert model._cq_weights is model._photon_weights
+    ref = model.simulate(length, local_error=1e-10).pulse
+    assert ref.e_p/model.pulse.e_p - 1 < -0.05
+
+    sim = model.simulate(length, local_error=1e-10, method="rk4ip", diagnostics=True)
+    err = np.linalg.norm(sim.pulse.a_v - ref.a_v)/np.linalg.norm(ref.a_v)
+    assert err < 1e-3, err
+    assert len(sim.diagnostics) < 5000 # a step size that is set by the error, not the drift
+    photons = [np.sum(p_v/v_grid) for p_v in [model.pulse.p_v, sim.pulse.p_v]]
+    assert np.isclose(photons[1], photons[0], rtol=1e-6)
+
+
+def test_ssfm_kerr_phase():
+    model, L_S = soliton_model(raman=True)
+    assert model._kerr_phase
+    a_v = ut.fft.ifftshift(model.pulse.a_v)
+    dz = 1e-2*L_S
+
+    #---- Exact Phase Rotation
+    # energy conserving, and equal to the midpoint method to 2nd order
+    a_1_v = model.step_ssfm(a_v, 0, dz)[0].copy()
+    diffs = []
+    for dz_nl in [dz, 0.5*dz]:
+        a_2_v = model._nonlinear_step(a_v, np.array([dz_nl]), np.empty_like(a_v))
+        assert np.isclose(np.sum(np.abs(a_2_v)**2), np.sum(np.abs(a_v)**2), rtol=1e-12)
+        a_3_v = model._nonlinear_step_midpoint(a_v, np.array([dz_nl]), np.empty_like(a_v))
+        diffs.append(np.linalg.norm(a_3_v - a_2_v))
+    assert np.isclose(diffs[0]/diffs[1], 2**3, rtol=0.1)
+
+    model._kerr_phase = False
+    a_4_v = model.step_ssfm(a_v, 0, dz)[0]
+    assert np.linalg.norm(a_4_v - a_1_v) < 1e-4*np.linalg.norm(a_v)
+    model.update_nonlinearity(force_update=True)
+    assert model._kerr_phase
+
+    #---- Efficiency
+    # more accurate than erk43ip with fewer steps
+    length = L_S
+    ref = model.simulate(length, local_error=1e-10).pulse.a_v
+    sims = {method: model.simulate(length, local_error=local_error, method=method,
+                                   diagnostics=True)
+            for method, local_error in [("erk43ip", 1e-6), ("ssfm", 1e-4)]}
+    errs = {method: np.linalg.norm(sim.pulse.a_v - ref)/np.linalg.norm(ref)
+            for method, sim in sims.items()}
+    assert errs["ssfm"] < errs["erk43ip"], errs
+    assert len(sims["ssfm"].diagnostics) < len(sims["erk43ip"].diagnostics)
+
+    #---- Frequency-Dependent Nonlinearity
+    mode = pynlo.medium.Mode(model.mode.v_grid, model.mode.beta,
+                             g3=model.mode.g3*(model.mode.v_grid/model.pulse.v0))
+    assert not pynlo.model.NLSE(model.pulse, mode)._kerr_phase
+
+
+def test_precision():
+    model, L_S = soliton_model(raman=True)
+    length = 2*L_S
+    methods = ["erk43ip", "ssfm"]
+    refs = {method: model.simulate(length, n_records=5, method=method).pulse for method in methods}
+
+    for precision, rtol in [("mixed", 1e-4), ("single", 1e-2)]:
+        model_p = pynlo.model.NLSE(model.pulse, model.mode, precision=precision)
+
+        #---- Nonlinear Operator
+        a_v = ut.fft.ifftshift(model.pulse.a_v)
+        nl_v = model._nonlinear_operator(a_v)
+        nl_p_v = model_p._nonlinear_operator(a_v)
+        assert nl_p_v.dtype == (np.complex64 if precision == "single" else np.complex128)
+        assert np.allclose(nl_p_v, nl_v, rtol=0, atol=1e-6*np.abs(nl_v).max())
+
+        #---- Simulation
+        for method in methods:
+            sim = model_p.simulate(length, n_records=5, method=method)
+            assert model_p._buffer("aj_v", (model.n_points,)).dtype == model_p._dtype
+            assert sim.a_v.dtype == complex
+            ref = refs[method]
+            err = np.linalg.norm(sim.pulse.a_v - ref.a_v)/np.linalg.norm(ref.a_v)
+            assert err < rtol, (precision, method, err)
+            assert np.isclose(sim.pulse.e_p, ref.e_p, rtol=rtol)
+
+
+# %% Z-Dependence
+
+def test_tabulated_mode():
+    model, L_S = soliton_model(raman=True)
+    pulse, mode = model.pulse, model.mode
+    length = 0.5*L_S
+    v0 = 300e12
+
+    def beta(z):
+        beta2 = -10 * 1e-12**2/1e3 * (1 - (z/length)**2)
+        return 0.5*beta2 * (2*pi*(pulse.v_grid - v0))**2
+
+    def g3(z):
+        return ut.chi3.gamma_to_g3(pulse.v_grid, 1 + z/length)
+
+    taper = pynlo.medium.Mode(pulse.v_grid, beta, g3=g3, rv_grid=mode.rv_grid, r3=mode.r3)
+    sim = pynlo.model.NLSE(pulse, taper).simulate(length, dz=1e-4, local_error=1e-6)
+
+    #---- Mode
+    z_table = np.linspace(0, length, 101)
+    taper.tabulate(z_table)
+    assert np.array_equal(taper.z_table, z_table)
+    taper.z = z_table[10]
+    assert np.array_equal(taper.beta, beta(z_table[10]))
+    taper.z = 0.5*(z_table[10] + z_table[11])
+    assert np.allclose(taper.beta, 0.5*(beta(z_table[10]) + beta(z_table[11])), rtol=1e-12, atol=0)
+    taper.z = 2*length # end points are held outside of the table
+    assert np.array_equal(taper.g3, g3(length))
+
+    #---- Model
+    model = pynlo.model.NLSE(pulse, taper)
+    model.mode.z = z_table[20]
+    model.update_linearity()
+    model.update_nonlinearity()
+    ref = pynlo.model.NLSE(pulse, pynlo.medium.Mode(
+        pulse.v_grid, beta(z_table[20]), g3=g3(z_table[20]), rv_grid=mode.rv_grid, r3=mode.r3))
+    assert np.allclose(model._kappa_cm, ref._kappa_cm, rtol=1e-12, atol=0)
+    assert np.allclose(model._1j_gamma, ref._1j_gamma, rtol=1e-12, atol=0)
+
+    model.mode.tabulate(np.linspace(0, length, 1001)) # resolve the taper
+    sim_table = model.simulate(length, dz=1e-4, local_error=1e-6)
+    err = np.linalg.norm(sim_table.pulse.a_v - sim.pulse.a_v)/np.linalg.norm(sim.pulse.a_v)
+    assert err < 1e-3
+
+    #---- Remove Table
+    taper.tabulate(None)
+    assert taper.z_table is None
+    assert np.array_equal(taper.beta, beta(taper.z))
+
+def test_poling():
+    #---- Fourier Series
+    z_invs = np.cumsum(np.tile([7e-6, 3e-6], 50)) # 30% duty cycle
+    poling = pynlo.medium.Poling(z_invs, orders=range(-200, 201))
+    assert np.allclose(poling.period(1e-4), 10e-6) and np.allclose(poling.duty(1e-4), 0.3)
+    assert np.array_equal(poling.stops, z_invs[[0, -2, -1]]) # edges of the averaged region
+    z_mid = 0.5*(z_invs[:-1] + z_invs[1:])
+    z_mid = z_mid[(z_mid > z_invs[0]) & (z_mid < z_invs[-2])]
+    series = np.array([poling.coefficient(z) for z in z_mid])
+    assert np.allclose(series, 2*poling.pol(z_mid) - 1, rtol=0, atol=1e-2)
+
+    #---- Second-Harmonic Generation
+    v0 = 190e12
+    pulse = pynlo.light.Pulse.Gaussian(2**7, 100e12, 500e12, v0, 0.2e-9, 2e-12, alias=2)
+    beta = ut.taylor_series(2*pi*v0, [2.14*2*pi*v0/constants.c, 2.18/constants.c, 100e-27])(2*pi*pulse.v_grid)
+    g2 = ut.chi2.g2_shg(v0, pulse.v_grid, np.full(pulse.n, 2.14), 15e-6**2, 2*27e-12)
+    g2[pulse.v_grid > 450e12] = 0 # only the 2nd harmonic
+    b = np.interp([v0, 2*v0], pulse.v_grid, beta)
+    length = 2e-3
+    z_invs = ut.chi2.domain_inversions(length, b[1] - 2*b[0])[0]
+
+    sims = {}
+    for key, g2_inv in [("array", z_invs), ("exact", pynlo.medium.Poling(z_invs, orders=None)),
+                        ("averaged", pynlo.medium.Poling(z_invs))]:
+        mode = pynlo.medium.Mode(pulse.v_grid, beta, g2=g2, g2_inv=g2_inv)
+        assert list(mode.g2_inv) == list(z_invs) and np.array_equal(mode.poling.z_invs, z_invs)
+        assert z_invs[0] in mode.g2_inv
+        assert mode.g2_inv[z_invs[0]] == 1 and mode.g2_inv[z_invs[1]] == 0
+        sims[key] = pynlo.model.UPE(pulse, mode).simulate(length, dz=1e-6, local_error=1e-6, n_records=5)
+    assert np.array_equal(sims["array"].a_v, sims["exact"].a_v)
+    sh = pulse.v_grid > 1.5*v0
+    p_sh = {key: sim.pulse.p_v[sh].sum()/sim.pulse.p_v.sum() for key, sim in sims.items()}
+    assert p_sh["exact"] > 0.1 # efficient SHG
+    assert np.isclose(p_sh["averaged"], p_sh["exact"], rtol=0.02)
+
+
+# %% Recorders
+
+def test_recorders():
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+
+    pulse_out, z, a_t, a_v = model.simulate(
+        length, dz=1e-4, local_error=1e-6, n_records=10)
+
+    #--- Full Records
+    recorder = ut.recorders.FullRecorder(time_domain=False)
+    sim = model.simulate(length, dz=1e-4, local_error=1e-6, n_records=10,
+                         recorder=recorder)
+    assert sim.a_t is None
+    assert np.allclose(sim.a_v, a_v)
+    assert np.allclose(sim.pulse.a_v, pulse_out.a_v)
+
+    #--- Band in dB
+    v_range = (250e12, 350e12)
+    recorder = ut.recorders.SpectrumRecorder(v_range=v_range, decimation=2, db=True)
+    sim = model.simulate(length, dz=1e-4, local_error=1e-6, n_records=10,
+                         recorder=recorder)
+    band = (pulse_out.v_grid >= v_range[0]) & (pulse_out.v_grid <= v_range[1])
+    p_v_db = 10*np.log10(np.abs(a_v[:, band][:, ::2])**2)
+    assert sim.a_v is None
+    assert recorder.spectrum.dtype == np.float32
+    assert np.allclose(recorder.v_grid, pulse_out.v_grid[band][::2])
+    assert np.allclose(recorder.spectrum, p_v_db, atol=1e-3)
+
+
+def test_spectrograms():
+    model, L_S = soliton_model()
+    sim = model.simulate(0.5*L_S, dz=1e-4, local_error=1e-6, n_records=4)
+
+    spgs = list(sim.spectrograms(v_range=(250e12, 350e12), n_t=32))
+    assert len(spgs) == 4
+    pulse = sim.pulse.copy()
+    pulse.a_v = sim.a_v[0]
+    t_fwhm = pulse._gate_fwhm()
+    for a_v, spg in zip(sim.a_v, spgs):
+        pulse.a_v = a_v
+        ref = pulse.spectrogram(t_fwhm=t_fwhm, v_range=(250e12, 350e12), n_t=32)
+        assert np.array_equal(spg.t_grid, spgs[0].t_grid) # shared delays
+        assert np.array_equal(spg.spg, ref.spg)
+
+
+def test_analysis():
+    model, L_S = soliton_model()
+    sim = model.simulate(0.5*L_S, dz=1e-4, local_error=1e-6, n_records=5)
+    v_w, t_w = sim.v_width(), sim.t_width()
+    assert sim.v_width() is v_w # memoized
+
+    #--- Individual Pulses
+    pulse = sim.pulse.copy()
+    for idx, a_v in enumerate(sim.a_v):
+        pulse.a_v = a_v
+        assert np.isclose(sim.e_p[idx], pulse.e_p)
+        assert np.allclose([w[idx] for w in v_w], pulse.v_width())
+        assert np.allclose([w[idx] for w in t_w], pulse.t_width())
+        assert np.isclose(sim.v_centroid[idx], np.sum(pulse.v_grid*pulse.p_v)/np.sum(pulse.p_v))
+        assert np.isclose(sim.t_centroid[idx], 0, atol=pulse.dt)
+
+        selector = pulse.v_grid[pulse.p_v >= 1e-3*pulse.p_v.max()]
+        edges = sim.v_edges()
+        assert edges.v_min[idx] == selector.min() and edges.v_max[idx] == selector.max()
+        assert np.isclose(edges.l_min[idx], constants.c/selector.max())
+
+    #--- Wavelength Spectra
+    spectra = sim.p_l()
+    l_grid = constants.c/pulse.v_grid[::-1]
+    for idx, p_v in enumerate(sim.p_v):
+        p_l = (p_v * pulse.v_grid**2/constants.c)[::-1]
+        assert np.allclose(spectra.p_l[idx], np.interp(spectra.l_grid, l_grid, p_l, left=0, right=0))
+    assert np.allclose(spectra.l_grid[[0, -1]], l_grid[[0, -1]])
+    assert np.isclose(np.sum(spectra.p_l[0]) * np.diff(spectra.l_grid).mean(), sim.e_p[0], rtol=1e-2)
+    with np.errstate(divide="ignore"):
+        assert np.allclose(sim.p_l(db=True).p_l, 10*np.log10(spectra.p_l/spectra.p_l.max()))
+
+    #--- Without Complex Envelopes
+    sim_v = model.simulate(0.5*L_S, dz=1e-4, local_error=1e-6, n_records=5,
+                           recorder=ut.recorders.FullRecorder(time_domain=False))
+    assert sim_v.a_t is None
+    assert np.allclose(sim_v.t_width().fwhm, t_w.fwhm)
+
+def test_adaptive_recording():
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+
+    adaptive = ut.recorders.AdaptiveRecording(max_records=12, n_checks=60)
+    pulse_out, z, a_t, a_v = model.simulate(
+        length, dz=1e-4, local_error=1e-6, adaptive=adaptive)
+
+    #--- Records
+    assert 2 < z.size <= 12
+    assert z[0] == 0 and z[-1] == length
+    assert np.all(np.diff(z) > 0)
+    assert a_v.shape == a_t.shape == (z.size, pulse_out.n)
+    assert np.allclose(a_v[-1], pulse_out.a_v)
+
+    #--- Thresholds
+    # no changes are large enough, so only the end points are recorded
+    adaptive = ut.recorders.AdaptiveRecording(
+        max_records=12, n_checks=60, bandwidth=None, peak_power=10)
+    sim = model.simulate(length, dz=1e-4, local_error=1e-6, adaptive=adaptive)
+    assert np.all(sim.z == [0, length])
+
+
+def test_live_plot(tmp_path):
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+
+    #---- Frames
+    plot = ut.monitors.LivePlot("wvl", path=str(tmp_path), drop=False)
+    sim = model.simulate(length, dz=1e-4, local_error=1e-6, n_records=5, plot=plot)
+    assert plot.dropped == 0
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "frame_{:05d}.png".format(idx) for idx in range(5)]
+
+    #---- Dropped Frames
+    # the last frame is always saved
+    plot = ut.monitors.LivePlot("time", path=str(tmp_path / "drop"), maxsize=1)
+    model.simulate(length, dz=1e-4, local_error=1e-6, n_records=50, plot=plot)
+    n_frames = len(list((tmp_path / "drop").iterdir()))
+    assert n_frames + plot.dropped == 50
+    assert np.allclose(sim.pulse.a_v, model.simulate(length, dz=1e-4, local_error=1e-6).pulse.a_v)
+
+
+def test_live_plot_error(tmp_path):
+    # the plotting thread must not keep the process alive after an error
+    code = "\n".join([
+        "import sys; sys.path.insert(0, {!r})".format(os.path.dirname(__file__)),
+        "from test_model import soliton_model",
+        "from pynlo import utility as ut",
+        "class Failing(ut.recorders.FullRecorder):",
+        "    def record(self, idx, pulse):",
+        "        if idx == 2: raise RuntimeError('recorder')",
+        "        super().record(idx, pulse)",
+        "model, L_S = soliton_model()",
+        "try:",
+        "    model.simulate(0.5*L_S, n_records=5, recorder=Failing(),",
+        "                   plot=ut.monitors.LivePlot('wvl', path={!r}))".format(str(tmp_path)),
+        "except RuntimeError as error:",
+        "    print(error)"])
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         timeout=120, cwd=os.path.dirname(os.path.dirname(pynlo.__file__)))
+    assert out.stdout.splitlines()[-1] == "recorder"
+    assert len(list(tmp_path.iterdir())) == 2
+
+def test_diagnostics(tmp_path):
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+    log = str(tmp_path / "steps.tsv")
+
+    pulse_out, z, a_t, a_v = model.simulate(length, dz=1e-4, local_error=1e-6, n_records=10)
+
+    #---- Steps
+    diagnostics = ut.diagnostics.Diagnostics(log=log)
+    sim = model.simulate(length, dz=1e-4, local_error=1e-6, n_records=10, diagnostics=diagnostics)
+    steps = sim.diagnostics
+    assert steps.dtype.names == ut.diagnostics.Diagnostics.dtype.names
+    assert steps.size == diagnostics.n_accepted + diagnostics.n_rejected
+    assert np.isclose(steps["dz"][steps["accepted"]].sum(), length)
+    assert np.all(np.isnan(steps["energy"][~steps["accepted"]]))
+    assert np.all(steps["t_nonlinear"] > 0)
+    assert np.allclose(sim.a_v, a_v) # does not change the simulation
+
+    #---- Conserved Quantities
+    # the NLSE model without self-steepening conserves energy
+    accepted = steps[steps["accepted"]]
+    assert np.isclose(accepted["energy"][-1], pulse_out.e_p)
+    assert np.abs(accepted["energy_drift"]).max() < 1e-5
+    assert accepted["edge"].max() < 1e-3
+
+    #---- Log
+    with open(log) as file:
+        lines = file.read().splitlines()
+    assert lines[0].split("\t") == list(steps.dtype.names)
+    assert len(lines) == steps.size + 1
+
+    #---- Limits
+    # the operators are restored when the simulation is stopped
+    diagnostics = ut.diagnostics.Diagnostics(max_edge=1e-12)
+    try:
+        model.simulate(length, dz=1e-4, local_error=1e-6, diagnostics=diagnostics)
+    except RuntimeError:
+        pass
+    else:
+        assert False, "The simulation was not stopped."
+    assert diagnostics.steps["edge"][-1] > 1e-12
+    assert not np.any(diagnostics.steps["edge"][:-1] > 1e-12)
+    assert model._linear_operator is model._raw_operators["linear"]
+    assert model._nonlinear_operator is model._raw_operators["nonlinear"]
+
+
+# %% Checkpoints
+
+class InterruptingRecorder(ut.recorders.FullRecorder):
+    """Raises an exception before taking the `interrupt` record."""
+    interrupt = None
+
+    def record(self, idx, pulse):
+        if idx == InterruptingRecorder.interrupt:
+            raise KeyboardInterrupt
+        super().record(idx, pulse)
+
+
+def test_checkpoint_resume(tmp_path):
+    model, L_S = soliton_model()
+    length = 0.5*L_S
+    checkpoint_path = str(tmp_path / "checkpoint.pkl")
+
+    pulse_out, z, a_t, a_v = model.simulate(
+        length, dz=1e-4, local_error=1e-6, n_records=10)
+
+    #--- Interrupted Simulation
+    InterruptingRecorder.interrupt = 6
+    try:
+        model.simulate(length, dz=1e-4, local_error=1e-6, n_records=10,
+                       recorder=InterruptingRecorder(),
+                       checkpoint_path=checkpoint_path, checkpoint_every=0)
+    except KeyboardInterrupt:
+        pass
+    else:
+        assert False, "The simulation was not interrupted."
+
+    #--- Resume
+    InterruptingRecorder.interrupt = None
+    model, _ = soliton_model()
+    sim = model.resume(checkpoint_path)
+    assert np.all(sim.z == z)
+    assert np.array_equal(sim.a_v, a_v)
+    assert np.array_equal(sim.a_t, a_t)
+    assert np.array_equal(sim.pulse.a_v, pulse_out.a_v)
+
+
+# %% Compilation
+
+def test_warmup():
+    #---- Lazy Imports
+    code = "import sys, pynlo; print(sorted({'numba', 'scipy', 'matplotlib'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(pynlo.__file__)))
+    assert out.stdout.strip() == "[]"
+
+    #---- Warm Start
+    assert pynlo.warmup() > 0
+    for kernel in [pynlo.model.rk4_out, pynlo.model.linear_operator_out, pynlo.model.l2_error_out]:
+        assert kernel.signatures # compiled
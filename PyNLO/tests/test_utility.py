@@ -269,6 +269,71 @@ if __name__ == "__main__":
     fig0.tight_layout()
 
 
+# %% Phase Matching
+
+def test_dominant_paths(monkeypatch):
+    v_grid = np.linspace(50e12, 450e12, 81) # the sums and differences lie on the grid
+    n_eff = 2.1 + 0.05*((v_grid - 200e12)/100e12)**2
+    beta = 2*pi*v_grid*n_eff/constants.c
+    n = v_grid.size
+
+    for beta_qpm in [None, 2*pi/20e-6]:
+        paths, (dk, v_sfg, dk_sfg, v_dfg, dk_dfg) = utility.chi2.dominant_paths(
+            v_grid, beta, beta_qpm=beta_qpm, full=True)
+        assert len(paths) == len(dk) == n
+
+        #---- Exhaustive Search
+        # the output index of each combination of inputs
+        i, j = np.indices((n, n))
+        idx_sfg = np.interp(v_sfg, v_grid, np.arange(n), left=np.nan, right=np.nan).round()
+        idx_dfg = np.interp(v_dfg, v_grid, np.arange(n), left=np.nan, right=np.nan).round()
+        for idx in range(n):
+            sfg = (idx_sfg == idx)
+            dfg = (idx_dfg == idx)
+            if not (sfg.any() or dfg.any()):
+                assert paths[idx] == [[None, None]] and dk[idx] is None
+                continue
+            min_dk = min(np.min(dk_sfg[sfg], initial=np.inf), np.min(dk_dfg[dfg], initial=np.inf))
+            assert dk[idx] == min_dk
+            path = ([[i_s, j_s] for i_s, j_s in zip(i[sfg], j[sfg]) if dk_sfg[i_s, j_s] == min_dk]
+                    + [[i_d, j_d] for i_d, j_d in zip(i[dfg], j[dfg]) if dk_dfg[i_d, j_d] == min_dk])
+            assert sorted(paths[idx]) == sorted(path)
+
+        #---- Blocks and Threads
+        monkeypatch.setattr(utility.chi2, "_DIAGONAL_BLOCK", 3*n)
+        assert utility.chi2.dominant_paths(v_grid, beta, beta_qpm=beta_qpm, n_threads=2) == paths
+        monkeypatch.undo()
+
+
+# %% FFT
+
+def test_threads():
+    previous = fft.get_threads()
+    with fft.threads(1) as current:
+        assert current.numba == 1
+        if current.mkl is not None:
+            assert current.mkl == 1
+    assert fft.get_threads() == previous
+
+def test_timers():
+    x = np.random.rand(2**8)
+    with fft.timers() as times:
+        x_v = fft.rfft(x)
+        fft.irfft(x_v, n=x.size)
+        fft.ifft(fft.fft(x))
+        fft.fft(x, n=2**9)
+    assert times[("rfft", 2**8)].calls == 1
+    assert times[("irfft", 2**8)].calls == 1
+    assert times[("fft", 2**8)].calls == 1
+    assert times[("ifft", 2**8)].calls == 1
+    assert times[("fft", 2**9)].calls == 1
+    assert all(timer.time >= 0 for timer in times.values())
+
+    # Not recorded outside of the context
+    fft.fft(x)
+    assert fft.get_timers()[("fft", 2**8)].calls == 1
+
+
 # %% TFGrid
 
 def test_TFGrid():
@@ -297,7 +362,31 @@ def test_TFGrid():
     assert test.rt_window == test.t_window
 
     #--- rtf_grids
-    #TODO: test this method
+    rtf = test.rtf_grids(alias=2)
+    assert test.rtf_grids(alias=2) is rtf # cached
+    assert test.rtf_grids(alias=2, fast_n=False) is not rtf
+    assert rtf.v_grid[test.rn_slice].size == test.n
+    assert np.allclose(rtf.v_grid[test.rn_slice], test.v_grid, rtol=0, atol=1e-6*test.dv)
+    assert test.rtf_grids(alias=0).n == test.n
+    for grid in [test.v_grid, test._v_grid, test.t_grid, test.rv_grid, test.rt_grid, rtf.t_grid]:
+        assert not grid.flags.writeable
+
+    #--- Real-Valued Spectra
+    a_v = np.random.randn(2, test.n) + 1j*np.random.randn(2, test.n)
+    ra_v = test.rv_scatter(a_v)
+    assert ra_v.shape == (2, test.rv_grid.size)
+    ra_t = fft.irfft(ra_v, fsc=test.rdt, n=test.rn)
+    assert np.allclose(np.sum(ra_t**2 * test.rdt, axis=-1), np.sum(np.abs(a_v)**2 * test.dv, axis=-1))
+    assert np.allclose(test.rv_gather(fft.rfft(ra_t, fsc=test.rdt)), a_v)
+    out = np.ones_like(ra_v)
+    assert test.rv_scatter(a_v, out=out) is out
+    assert np.array_equal(out, ra_v)
+
+    #--- Copies
+    # the read-only grids are shared instead of copied
+    copy = test.copy()
+    assert copy.v_grid is test.v_grid and copy.rt_grid is test.rt_grid
+    assert copy.rtf_grids(alias=2).t_grid is rtf.t_grid
 
 #TODO: test utility.TFGrid.FromFreqRange(n_points, v_min, v_max)
 
@@ -1,11 +1,16 @@
 """laserfun: fun with lasers."""
 
+from . import fft
 from . import pulse
 from . import fiber
 from . import nlse
+from . import sweep
+from . import recorders
 from .fiber import Fiber
 from .pulse import Pulse
 from .nlse import NLSE
+from .nlse import NLSE_ensemble
 from .nlse import dB
 
-__all__ = [pulse, fiber, nlse, Fiber, Pulse, NLSE]
\ No newline at end of file
+__all__ = [fft, pulse, fiber, nlse, sweep, recorders, Fiber, Pulse, NLSE,
+           NLSE_ensemble]
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""FFT backend used throughout laserfun.
+
+The transforms follow the conventions of ``numpy.fft`` (``ifft`` is
+normalized by 1/n). They are computed with the first available of the
+following backends, or the one selected with :func:`set_backend`:
+
+``'mkl_fft'``
+    Intel MKL through the mkl_fft package. Transforms with
+    ``overwrite_x=True`` are done in place.
+``'pyfftw'``
+    FFTW through the pyFFTW package, with the plans cached between calls.
+    The planner "wisdom" can be saved to a file so that the plans do not
+    have to be measured again in the next session.
+``'scipy'``
+    ``scipy.fft``, which is always available, with a number of worker
+    threads.
+"""
+
+import os
+import atexit
+import pickle
+
+import numpy as np
+import scipy.fft
+from numpy.fft import fftshift, ifftshift  # noqa: F401
+
+try:
+    import mkl_fft
+except ImportError:
+    mkl_fft = None
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft as pyfftw_fft
+except ImportError:
+    pyfftw = None
+
+BACKENDS = ('mkl_fft', 'pyfftw', 'scipy')
+
+_backend = {'name': None, 'threads': None, 'wisdom_file': None}
+
+
+def set_backend(name=None, threads=None, wisdom_file=None):
+    """Select the library used for the FFTs.
+
+    Parameters
+    ----------
+    name : str or None
+        One of 'mkl_fft', 'pyfftw', or 'scipy'. Default is None, which selects
+        the first of these that can be imported.
+    threads : int or None
+        The number of threads used by each transform. Default is None, which
+        keeps the default of the library (one thread for 'scipy'). For
+        'mkl_fft', this sets the number of MKL threads of the process.
+    wisdom_file : str or None
+        Only used by 'pyfftw'. If given, the FFTW wisdom is loaded from this
+        file (if it exists) and saved to it when Python exits.
+
+    Returns
+    -------
+    name : str
+        The name of the selected backend.
+    """
+    available = {'mkl_fft': mkl_fft is not None,
+                 'pyfftw': pyfftw is not None,
+                 'scipy': True}
+    if name is None:
+        name = next(name for name in BACKENDS if available[name])
+    elif name not in BACKENDS:
+        raise ValueError('FFT backend not supported: %s' % name)
+    elif not available[name]:
+        raise ImportError('The %s package is needed for this FFT backend.'
+                          % name)
+
+    if name == 'mkl_fft' and threads is not None:
+        try:
+            import mkl
+            mkl.set_num_threads(threads)
+        except ImportError:
+            pass
+    elif name == 'pyfftw':
+        if threads is not None:
+            pyfftw.config.NUM_THREADS = threads
+        pyfftw.config.PLANNER_EFFORT = 'FFTW_MEASURE'
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(60)
+        if wisdom_file is not None:
+            if os.path.exists(wisdom_file):
+                with open(wisdom_file, 'rb') as file:
+                    pyfftw.import_wisdom(pickle.load(file))
+            if _backend['wisdom_file'] is None:
+                atexit.register(_save_wisdom)
+
+    _backend.update(name=name, threads=threads, wisdom_file=wisdom_file)
+    return name
+
+
+def get_backend():
+    """Return the name of the current backend."""
+    return _backend['name']
+
+
+def fft(x, axis=-1, overwrite_x=False):
+    """Forward FFT along the given axis.
+
+    If ``overwrite_x`` is True, the input may be overwritten (and may be the
+    returned array), which avoids a new allocation for most backends.
+    """
+    name = _backend['name']
+    if name == 'mkl_fft':
+        return mkl_fft.fft(x, axis=axis, overwrite_x=overwrite_x)
+    elif name == 'pyfftw':
+        return pyfftw_fft.fft(x, axis=axis, overwrite_x=overwrite_x,
+                              workers=_backend['threads'])
+    return scipy.fft.fft(x, axis=axis, overwrite_x=overwrite_x,
+                         workers=_backend['threads'])
+
+
+def ifft(x, axis=-1, overwrite_x=False):
+    """Inverse FFT along the given axis. See :func:`fft`."""
+    name = _backend['name']
+    if name == 'mkl_fft':
+        return mkl_fft.ifft(x, axis=axis, overwrite_x=overwrite_x)
+    elif name == 'pyfftw':
+        return pyfftw_fft.ifft(x, axis=axis, overwrite_x=overwrite_x,
+                               workers=_backend['threads'])
+    return scipy.fft.ifft(x, axis=axis, overwrite_x=overwrite_x,
+                          workers=_backend['threads'])
+
+
+def empty(shape, dtype='complex128'):
+    """Return an uninitialized work array, aligned for the backend."""
+    if _backend['name'] == 'pyfftw':
+        return pyfftw.empty_aligned(shape, dtype=dtype)
+    return np.empty(shape, dtype=dtype)
+
+
+def _save_wisdom():
+    if _backend['wisdom_file'] is None:
+        return
+    with open(_backend['wisdom_file'], 'wb') as file:
+        pickle.dump(pyfftw.export_wisdom(), file)
+
+
+set_backend()
@@ -88,8 +88,10 @@ class Fiber:
         self.alpha_changes_with_z = False
         self.gamma_changes_with_z = False
 
+        self.clear_B_cache()
+
     def set_dispersion_function(self, dispersion_function,
-                                dispersion_format='GVD'):
+                                dispersion_format='GVD', z_table=None):
         """Set dispersion to function that varies as a function of z.
 
         The function can either provide beta2, beta3, beta4, etc. coefficients,
@@ -105,11 +107,48 @@ class Fiber:
             (GVD, in units of ps^2/m, not ps^2/km),
             D (ps/nm/km), or
             n (effective refractive index)
+        z_table : None, int, or array
+            If None (the default), the dispersion function is evaluated every
+            time B is requested at a new z. If an int, B is tabulated once
+            (per pulse grid) at this many evenly spaced points along the
+            length of the fiber and linearly interpolated in z afterwards. If
+            an array, B is tabulated at these z-positions (in meters). A table
+            makes reloading the fiber inside the NLSE much cheaper, at the
+            cost of the interpolation error between the tabulated points.
         """
         self.dispersion_changes_with_z = True
         self.fiberspecs["dispersion_format"] = dispersion_format
         self.dispersion_function = dispersion_function
 
+        if z_table is None:
+            self._z_table = None
+        elif np.ndim(z_table) == 0:
+            if z_table < 2:
+                raise ValueError('z_table must contain at least 2 points.')
+            self._z_table = np.linspace(0, self.length, int(z_table))
+        else:
+            self._z_table = np.sort(np.asarray(z_table, dtype=float))
+            if self._z_table.size < 2:
+                raise ValueError('z_table must contain at least 2 points.')
+
+        self.clear_B_cache()
+
+    def clear_B_cache(self):
+        """Clear the cached propagation constants.
+
+        The values returned by get_B are memoized for each pulse grid (and
+        z-position). The cache is keyed by the dispersion attributes
+        (``betas``, or ``x`` and ``y``), so it does not need to be cleared
+        after modifying them, and it is cleared automatically when the
+        dispersion is changed with set_dispersion_function. This method
+        only frees the memory of the cached values.
+        """
+        self._B_cache = dict()  # B for z-independent dispersion
+        self._B_last = None     # (key, B) of the last z-dependent evaluation
+        self._B_tables = dict()  # tabulated B(z) for each pulse grid
+        if not hasattr(self, '_z_table'):
+            self._z_table = None
+
     def set_gamma_function(self, gamma_function):
         """Set gamma to a function that varies as a function of z.
 
@@ -221,8 +260,65 @@ class Fiber:
         -------
         B : 1D array of floats
             the propagation constant (beta) at the frequency gridpoints of the
-            supplied pulse (units of 1/meters).
+            supplied pulse (units of 1/meters). The array is cached, so it is
+            read-only; make a copy before modifying it.
         """
+        grid_key = (pulse.npts, pulse.time_window_ps,
+                    pulse.centerfrequency_THz, self.center_wavelength)
+
+        if not self.dispersion_changes_with_z:
+            # only the B of the current dispersion is kept for each grid
+            disp_key = self._dispersion_key()
+            cached = self._B_cache.get(grid_key)
+            if cached is not None and cached[0] == disp_key:
+                return cached[1]
+            B = self._calc_B(pulse)
+            B.flags.writeable = False
+            self._B_cache[grid_key] = (disp_key, B)
+            return B
+
+        # z-dependent dispersion: the integrators usually ask for the same z
+        # several times in a row, so only the last evaluation is kept. The
+        # same object is returned, so that the NLSE can skip rebuilding its
+        # linear operator.
+        key = (grid_key, z)
+        if self._B_last is not None and self._B_last[0] == key:
+            return self._B_last[1]
+
+        if self._z_table is not None:
+            B = self._interp_B_table(pulse, grid_key, z)
+        else:
+            B = self._calc_B(pulse, z)
+        B.flags.writeable = False
+        self._B_last = (key, B)
+        return B
+
+    def _dispersion_key(self):
+        """Return a hashable snapshot of the z-independent dispersion."""
+        if self.fiberspecs["dispersion_format"] == "GVD":
+            data = (self.betas,)
+        else:
+            data = (self.x, self.y)
+        return ((self.fiberspecs["dispersion_format"],) +
+                tuple(np.asarray(d, dtype=float).tobytes() for d in data))
+
+    def _interp_B_table(self, pulse, grid_key, z):
+        """Linearly interpolate B from the table of B(z) for this grid."""
+        z_table = self._z_table
+        B_table = self._B_tables.get(grid_key)
+        if B_table is None:
+            B_table = np.array([self._calc_B(pulse, zi) for zi in z_table])
+            self._B_tables[grid_key] = B_table
+
+        i = np.searchsorted(z_table, z, side='right') - 1
+        i = min(max(i, 0), z_table.size - 2)
+        frac = (z - z_table[i]) / (z_table[i+1] - z_table[i])
+        frac = min(max(frac, 0.0), 1.0)  # no extrapolation past the ends
+
+        return B_table[i] + frac * (B_table[i+1] - B_table[i])
+
+    def _calc_B(self, pulse, z=0):
+        """Calculate B at position z, without caching. See get_B."""
         # if the dispersion changes with z, load the dispersion at z:
         if self.dispersion_changes_with_z:
             if (self.fiberspecs["dispersion_format"] == "D" or
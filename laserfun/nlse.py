@@ -6,16 +6,33 @@ from numpy import linspace, pi, exp, sin
 from scipy.integrate import complex_ode
 from scipy import constants
 import scipy.ndimage
+import os
 import time
-from scipy.fftpack import fft, ifft, fftshift
+import pickle
+from .fft import fft, ifft, fftshift, ifftshift
+from .fft import empty as empty_aligned
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 # speed of light in m/s and nm/ps
 c_mks = 299792458.0
 c_nmps = c_mks * 1e9/1e12
 
+# number of saved rows that are processed together at the end of the NLSE
+_OUTPUT_BLOCK = 64
+
+# use the fused numba kernels for the nonlinear operator when available
+USE_NUMBA = njit is not None
+
 
 def NLSE(pulse, fiber, nsaves=200, atol=1e-4, rtol=1e-4, reload_fiber=False,
-         raman=False, shock=True, integrator='lsoda', print_status=True):
+         raman=False, shock=True, integrator='lsoda', print_status=True,
+         recorder=None, time_domain=True, checkpoint_path=None,
+         checkpoint_every=600., resume=False, diagnostics=False,
+         diagnostics_log=None):
     """Propagate an laser pulse through a fiber according to the NLSE.
 
     This function propagates an optical input field (often a laser pulse)
@@ -60,8 +77,12 @@ def NLSE(pulse, fiber, nsaves=200, atol=1e-4, rtol=1e-4, reload_fiber=False,
         slowly varying envelope approximation starts to break down, which
         can occur for large bandwidths (short pulses).
     integrator : string
-        Selects the integrator that will be passes to scipy.integrate.ode.
-        options are 'lsoda' (default), 'vode', 'dopri5', 'dopri853'.
+        Selects the integrator. 'erk43ip' uses the built-in embedded
+        Runge-Kutta 4(3) scheme in the interaction picture (see Notes), which
+        is typically about twice as fast as 'lsoda' for the same accuracy
+        (note that its ``rtol`` has a different meaning). All other
+        options are passed to scipy.integrate.ode: 'lsoda' (default), 'vode',
+        'dopri5', 'dopri853'.
         'lsoda' is a good option, and seemed fastest in early tests.
         I think 'dopri5' and 'dopri853' are simpler Runge-Kutta methods,
         and they seem to take longer for the same result.
@@ -72,6 +93,47 @@ def NLSE(pulse, fiber, nsaves=200, atol=1e-4, rtol=1e-4, reload_fiber=False,
     print_status : boolean
          This determines if the propagation status will be printed. Default
          is True.
+    recorder : Recorder object or None
+        Receives the field at each of the ``nsaves`` points as it is
+        produced, instead of storing the full AW and AT arrays. See
+        :mod:`laserfun.recorders` for recorders that store only the spectrum,
+        a band of the spectrum in dB, or that write to a file. Default is
+        None, which stores the full arrays.
+    time_domain : boolean
+        If False, the time-domain output AT is not calculated and is None,
+        which halves the memory used by the results. Default is True. Not
+        used if a recorder is given.
+    checkpoint_path : string or None
+        If given, the state of the propagation (including the results so far
+        and the recorder) is saved to this file at the save points, at most
+        every ``checkpoint_every`` seconds, so that a long propagation can be
+        continued with ``resume=True`` if it is interrupted. The file is
+        written atomically, so it is never left half-written. Only supported
+        by the 'erk43ip' integrator. Default is None.
+    checkpoint_every : float
+        The minimum wall time in seconds between checkpoints. Default is 600.
+    resume : boolean
+        If True, continue the propagation from the checkpoint in
+        ``checkpoint_path``, which must have been written with the same
+        pulse, fiber, and options. The recorder is restored from the
+        checkpoint, and the results are identical to those of an
+        uninterrupted propagation. Default is False.
+    diagnostics : boolean or dict
+        If True, statistics of each step of the integrator are recorded and
+        returned as the ``diagnostics`` attribute of the results (see Notes).
+        A dict also sets limits at which the propagation is stopped with a
+        RuntimeError, with the optional keys ``max_energy_drift`` and
+        ``max_photon_drift`` (the largest relative drift of the energy and
+        photon number), ``max_edge`` (the largest fraction of the energy at
+        the edges of the frequency window), and ``min_dz`` (the smallest
+        step size of a rejected step, in m), e.g.
+        ``diagnostics=dict(max_edge=1e-3)``. Only supported by the 'erk43ip'
+        integrator. Default is False.
+    diagnostics_log : string or None
+        If given, the step statistics are also appended to this file as they
+        are taken, one tab-separated line per step, so that a long
+        propagation can be followed (e.g. with ``tail -f``). Implies
+        ``diagnostics=True``. Default is None.
 
     Returns
     -------
@@ -80,114 +142,768 @@ def NLSE(pulse, fiber, nsaves=200, atol=1e-4, rtol=1e-4, reload_fiber=False,
         ``z, f, t, AW, AT = results.get_results()``
         to unpack the z-coordinates, frequency grid, time grid, amplitude at
         each z-position in the freuqency domain, and amplitude at each
-        z-position in the time domain.
+        z-position in the time domain. If a recorder is used, AW and AT are
+        taken from the recorder's ``AW`` and ``AT`` attributes, and are None
+        if it does not have them.
+
+    Notes
+    -----
+    The 'erk43ip' integrator is the embedded 4th/3rd-order Runge-Kutta
+    scheme in the interaction picture of S. Balac and F. Mahe, Computer
+    Physics Communications 184, 1211 (2013), which is the same scheme used by
+    ``pynlo.model.Model``. The step size is adapted so that the relative
+    local error (the l2 norm of the difference between the 4th- and
+    3rd-order solutions, divided by the l2 norm of the field) stays near
+    ``rtol``; ``atol`` is not used by this integrator. The half-step linear
+    propagator is cached and only recomputed when the step size or the fiber
+    changes.
+
+    With ``diagnostics=True``, ``results.diagnostics`` is a structured array
+    with one row per step (accepted or rejected) and the fields ``z`` and
+    ``dz`` (m), ``accepted``, ``error`` (the relative local error estimate),
+    ``energy`` (J) and ``photons`` after the step, ``energy_drift`` and
+    ``photon_drift`` (the relative change since the start), ``edge`` (the
+    fraction of the energy in the outer 5% of the frequency window on each
+    side), and ``t_linear`` and ``t_nonlinear`` (the time in seconds spent
+    on the linear propagator and the nonlinear operator). The quantities
+    after the step are NaN for rejected steps. Without loss, the photon
+    number is conserved when the shock term is included, and the energy is
+    conserved when it is not, so their drift and the edge energy show when
+    the grid or the tolerance are too coarse. The limits stop such a
+    propagation early. A stopped propagation can be resumed from its last
+    checkpoint, e.g. with a finer grid of the same size or looser limits, as
+    the limits are not among the options that must match.
     """
     # get the pulse info from the pulse object:
-    t = pulse.t_ps  # time array in picoseconds
     at = pulse.at   # amplitude for those times in sqrt(W)
-    w0 = pulse.centerfrequency_THz * 2 * pi  # center freq (angular!)
 
-    n = t.size        # number of time/frequency points
-    dt = t[1] - t[0]  # time step
-    v = 2 * pi * linspace(-0.5/dt, 0.5/dt, n)  # *angular* frequency grid
+    if checkpoint_path is not None and integrator != 'erk43ip':
+        raise ValueError('Checkpoints are only supported by the erk43ip '
+                         'integrator.')
+    if resume and checkpoint_path is None:
+        raise ValueError('A checkpoint_path is needed to resume.')
+    limits = diagnostics if isinstance(diagnostics, dict) else {}
+    diagnostics = (bool(diagnostics) or isinstance(diagnostics, dict) or
+                   diagnostics_log is not None)
+    if diagnostics and integrator != 'erk43ip':
+        raise ValueError('Diagnostics are only supported by the erk43ip '
+                         'integrator.')
+
+    prop = _Propagator(pulse, fiber, raman=raman, shock=shock,
+                       reload_fiber=reload_fiber)
+
+    z = linspace(0, fiber.length, nsaves)  # select output z points
+    aw = ifft(at.astype('complex128'))  # ensure integrator knows it's complex
 
-    flength = fiber.length  # get length of fiber
+    # the options that must match for a checkpoint to be resumed:
+    options = dict(nsaves=nsaves, npts=aw.size, length=fiber.length,
+                   rtol=rtol, raman=raman, shock=shock,
+                   reload_fiber=reload_fiber)
+    first = 0  # the index of the first save point to propagate to
+
+    if resume:
+        with open(checkpoint_path, 'rb') as file:
+            state = pickle.load(file)
+        if state['options'] != options:
+            raise ValueError('The checkpoint %s was written with different '
+                             'options: %s' % (checkpoint_path,
+                                              state['options']))
+        first = state['count']
+        aw, zi, dz, k5 = state['aw'], state['zi'], state['dz'], state['k5']
+        recorder = state['recorder']
+        if diagnostics:
+            prop.diagnostics = state.get('diagnostics')
+        if recorder is None:
+            AW = np.zeros((z.size, aw.size), dtype='complex128')
+            AW[:first+1] = state['AW']
+    elif recorder is None:
+        # intialize array for results:
+        AW = np.zeros((z.size, aw.size), dtype='complex128')
+        AW[0] = aw        # store initial pulse as first row
+    else:
+        recorder.start(z, pulse.f_THz, pulse.t_ps)
+        recorder.record(0, aw)
 
-    def load_fiber(fiber, z=0):
-        # gets the fiber info from the fiber object
-        gamma = fiber.get_gamma(z)  # gamma should be in 1/(W m), not 1/(W km)
-        b = fiber.get_B(pulse, z)
+    start_time = time.time()  # start the timer
+    checkpoint_time = start_time
+
+    if integrator == 'erk43ip':
+        if not resume:
+            dz = z[1] - z[0]
+            k5 = None
+            zi = z[0]
+        if diagnostics and prop.diagnostics is None:
+            prop.diagnostics = _Diagnostics(pulse, aw, log=diagnostics_log)
+        elif diagnostics:
+            prop.diagnostics.open_log(diagnostics_log)
+        if diagnostics:
+            prop.diagnostics.set_limits(**limits)
+    else:
+        # set up the integrator:
+        r = complex_ode(prop.rhs).set_integrator(integrator, atol=atol,
+                                                 rtol=rtol)
+        r.set_initial_value(aw, z[0])
+
+    steps = None
+    try:
+        for count, z_stop in enumerate(z[1:]):
+            if count < first:
+                continue
+
+            if print_status:
+                print('% 6.1f%% - %.3e m - %.1f seconds' % ((z_stop/z[-1])*100,
+                      z_stop, time.time()-start_time))
+
+            if integrator == 'erk43ip':
+                aw, zi, dz, k5 = prop.propagate(aw, zi, z_stop, dz, rtol,
+                                                k5=k5)
+                if recorder is None:
+                    AW[count+1] = aw
+                else:
+                    recorder.record(count+1, aw)
+
+                if (checkpoint_path is not None and count+2 < z.size and
+                        time.time() - checkpoint_time >= checkpoint_every):
+                    state = dict(options=options, count=count+1, aw=aw, zi=zi,
+                                 dz=dz, k5=k5,
+                                 AW=AW[:count+2] if recorder is None else None,
+                                 recorder=recorder,
+                                 diagnostics=prop.diagnostics)
+                    _save_checkpoint(state, checkpoint_path)
+                    checkpoint_time = time.time()
+            else:
+                if not r.successful():
+                    raise Exception('Integrator failed! Check the input '
+                                    'parameters.')
+                aw = r.integrate(z_stop)
+                if recorder is None:
+                    AW[count+1] = aw
+                else:
+                    # change variables out of the interaction picture
+                    aw = aw * exp(prop.lin_operator*z_stop)
+                    recorder.record(count+1, aw)
+    finally:
+        # also on errors (e.g. a limit of the diagnostics), so that the log
+        # and the file of the recorder are closed, and the propagation can
+        # be resumed from its last checkpoint
+        if prop.diagnostics is not None:
+            steps = prop.diagnostics.finish()
+        if recorder is not None:
+            recorder.finish()
+
+    if recorder is not None:
+        pulse_out = pulse.create_cloned_pulse()
+        pulse_out.at = fft(aw)
+
+        return PulseData(z, getattr(recorder, 'AW', None),
+                         getattr(recorder, 'AT', None), pulse, pulse_out,
+                         fiber, diagnostics=steps)
+
+    # process the output, in blocks of rows to limit the temporary memory:
+    AT = np.empty_like(AW) if time_domain else None
+    for i in range(0, z.size, _OUTPUT_BLOCK):
+        rows = slice(i, i + _OUTPUT_BLOCK)
+        block = AW[rows]
+        if integrator != 'erk43ip':
+            # change variables out of the interaction picture
+            phase = np.outer(z[rows], prop.lin_operator)
+            block *= np.exp(phase, out=phase)
+        if time_domain:
+            AT[rows] = fft(block, axis=1)  # time domain output
+        block[:] = fftshift(block, axes=1)
+
+    # Below is the original dudley scaling factor that I think gives units
+    # of sqrt(J/Hz) for the AW array. Removing this gives units that agree
+    # with PyNLO, that seem to be sqrt(J*Hz) = sqrt(Watts) -DH 2021-12-15
+    # AW = AW * dt * n
 
-        loss = np.log(10**(fiber.get_alpha(z)*0.1))  # convert from dB/m
+    pulse_out = pulse.create_cloned_pulse()
+    pulse_out.at = AT[-1] if time_domain else fft(ifftshift(AW[-1]))
 
-        lin_operator = 1j*b - loss*0.5  # linear operator
+    results = PulseData(z, AW, AT, pulse, pulse_out, fiber,
+                        diagnostics=steps)
 
-        if w0 > 0 and shock:          # if w0>0 then include shock
-            gamma = gamma/w0
-            w = v + w0              # for shock w is true freq
-        else:
-            w = 1 + v*0             # set w to 1 when no shock
+    return results
 
-        # some fft shifts to things line up later:
-        lin_operator = fftshift(lin_operator)
-        w = fftshift(w)
-        return lin_operator, w, gamma
-
-    lin_operator, w, gamma = load_fiber(fiber)  # load fiber info
-
-    # Raman response:
-    if raman == 'dudley' or raman:
-        fr = 0.18
-        t1 = 0.0122
-        t2 = 0.032
-        rt = (t1**2+t2**2)/t1/t2**2*exp(-t/t2)*sin(t/t1)
-        rt[t < 0] = 0                # heaviside step function
-        rw = n * ifft(fftshift(rt))  # frequency domain Raman
-    elif not raman:
-        fr = 0
-    else:
-        raise ValueError('Raman method not supported')
 
-    # define function to return the RHS of Eq. (3.13):
-    def rhs(z, aw):
-        nonlocal lin_operator, w, gamma
+def NLSE_ensemble(pulse, fiber, n_trials=10, noise_type='one_photon_freq',
+                  random_seed=None, nsaves=200, rtol=1e-4, reload_fiber=False,
+                  raman=False, shock=True, print_status=True):
+    """Propagate several noisy copies of a pulse to calculate the coherence.
 
-        if reload_fiber:
-            lin_operator, w, gamma = load_fiber(fiber, z)
+    Each trial is a copy of the input pulse with random noise added (see
+    :func:`laserfun.pulse.Pulse.add_noise`). All of the trials are stacked
+    into one 2D array and propagated together with the 'erk43ip' integrator
+    of :func:`NLSE`, using batched FFTs and a shared step size that is set by
+    the trial with the largest local error.
 
-        at = fft(aw * exp(lin_operator*z))    # time domain field
-        it = np.abs(at)**2                    # time domain intensity
+    The first-order coherence is accumulated at each of the ``nsaves``
+    z-positions as the propagation proceeds, so the full AW/AT history is
+    only stored for the first trial. It is calculated as in Eq. (3.34) of
+    Dudley and Taylor (2010):
 
-        if np.isclose(fr, 0):  # no Raman case
-            m = ifft(at*it)                    # response function
-        else:
-            rs = dt * fr * fft(ifft(it) * rw)     # Raman convolution
-            m = ifft(at*((1-fr)*it + rs))         # response function
+    ``g12(z, f) = |<E_i*(z, f) E_j(z, f)>_(i!=j)| / <|E_i(z, f)|^2>``
 
-        r = 1j * gamma * w * m * exp(-lin_operator*z)  # full RHS of Eq. (3.13)
-        return r
+    where the brackets denote the average over all pairs of different trials.
 
-    z = linspace(0, flength, nsaves)    # select output z points
-    aw = ifft(at.astype('complex128'))  # ensure integrator knows it's complex
+    Parameters
+    ----------
+    pulse : pulse object
+        This is the input pulse, without noise.
+    fiber : fiber object
+        This defines the media ("fiber") through which the pulse propagates.
+    n_trials : int
+        The number of noisy trials. Must be at least 2.
+    noise_type : str
+        The method for adding random noise onto the pulse. See
+        :func:`laserfun.pulse.Pulse.add_noise` for the different methods.
+    random_seed : int or None
+        This is the seed for the random noise generation. Default is None,
+        which does not set a seed for the random number generator.
+        Setting the seed to a number (i.e., random_seed=0) will still
+        generate random numbers for each trial, but the results will be
+        completely repeatable.
+    nsaves : int
+        The number of equidistant grid points along the fiber at which the
+        coherence is calculated.
+    rtol : float
+        Relative local error target of the 'erk43ip' integrator.
+    reload_fiber, raman, shock, print_status
+        See :func:`NLSE`.
 
-    # set up the integrator:
-    r = complex_ode(rhs).set_integrator(integrator, atol=atol, rtol=rtol)
-    r.set_initial_value(aw, z[0])
+    Returns
+    -------
+    g12W : 2D numpy array, with dimensions nsaves x n
+        The g12 parameter as a function of propagation distance and
+        frequency, on the same grid as ``results.AW``.
+    results : PulseData object
+        The propagation results for the first (noisy) trial.
+    """
+    if n_trials < 2:
+        raise ValueError('At least 2 trials are needed for the coherence.')
 
-    # intialize array for results:
-    AW = np.zeros((z.size, aw.size), dtype='complex128')
-    AW[0] = aw        # store initial pulse as first row
+    if random_seed is not None:
+        np.random.seed(random_seed)
+
+    # stack the noisy realizations, one trial per row:
+    aw = np.empty((n_trials, pulse.npts), dtype='complex128')
+    for trial in range(n_trials):
+        noisy_pulse = pulse.create_cloned_pulse()
+        noisy_pulse.add_noise(noise_type=noise_type)
+        aw[trial] = ifft(noisy_pulse.at.astype('complex128'))
+
+    prop = _Propagator(pulse, fiber, raman=raman, shock=shock,
+                       reload_fiber=reload_fiber)
+
+    z = linspace(0, fiber.length, nsaves)  # select output z points
+
+    # intialize arrays for results:
+    AW = np.zeros((z.size, pulse.npts), dtype='complex128')
+    g12W = np.zeros((z.size, pulse.npts))
+
+    def record(i, aw):
+        AW[i] = aw[0]
+
+        # sum over all pairs i != j of E_i* E_j is |sum(E)|^2 - sum(|E|^2)
+        power = np.sum(np.abs(aw)**2, axis=0)
+        cross = (np.abs(np.sum(aw, axis=0))**2 - power)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            g12W[i] = np.abs(cross) / ((n_trials - 1) * power)
+
+    record(0, aw)
 
     start_time = time.time()  # start the timer
 
-    for count, zi in enumerate(z[1:]):
+    dz = z[1] - z[0]
+    k5 = None
+    zi = z[0]
+    for count, z_stop in enumerate(z[1:]):
 
         if print_status:
-            print('% 6.1f%% - %.3e m - %.1f seconds' % ((zi/z[-1])*100,
-                  zi, time.time()-start_time))
-        if not r.successful():
-            raise Exception('Integrator failed! Check the input parameters.')
+            print('% 6.1f%% - %.3e m - %.1f seconds' % ((z_stop/z[-1])*100,
+                  z_stop, time.time()-start_time))
 
-        AW[count+1] = r.integrate(zi)
+        aw, zi, dz, k5 = prop.propagate(aw, zi, z_stop, dz, rtol, k5=k5)
+        record(count+1, aw)
 
     # process the output:
-    AT = np.zeros_like(AW)
-    for i in range(len(z)):
-        AW[i] = AW[i] * exp(lin_operator.transpose()*z[i])  # change variables
-        AT[i, :] = fft(AW[i])            # time domain output
-        AW[i, :] = fftshift(AW[i])
-
-        # Below is the original dudley scaling factor that I think gives units
-        # of sqrt(J/Hz) for the AW array. Removing this gives units that agree
-        # with PyNLO, that seem to be sqrt(J*Hz) = sqrt(Watts) -DH 2021-12-15
-        # AW[i, :] = AW[i, :] * dt * n
+    AT = fft(AW, axis=1)  # time domain output
+    AW = fftshift(AW, axes=1)
+    g12W = fftshift(g12W, axes=1)
 
+    pulse_in = pulse.create_cloned_pulse()
+    pulse_in.at = AT[0]
     pulse_out = pulse.create_cloned_pulse()
     pulse_out.at = AT[-1]
 
-    results = PulseData(z, AW, AT, pulse, pulse_out, fiber)
+    results = PulseData(z, AW, AT, pulse_in, pulse_out, fiber)
 
-    return results
+    return g12W, results
+
+
+def _save_checkpoint(state, path):
+    """Pickle the state of the NLSE to a file, atomically."""
+    tmp_path = '%s.%i.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as file:
+        pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class _Propagator:
+    """Operators of Eq. (3.13) and the ERK4(3)-IP integrator for the NLSE.
+
+    All of the methods work on a single spectrum (in fft order) or on a 2D
+    stack of spectra, one per row.
+
+    Parameters
+    ----------
+    pulse : pulse object
+        Defines the time and frequency grids.
+    fiber : fiber object
+        The fiber through which the pulse propagates.
+    raman, shock, reload_fiber
+        See :func:`NLSE`.
+    """
+
+    def __init__(self, pulse, fiber, raman=False, shock=True,
+                 reload_fiber=False):
+        self.pulse = pulse
+        self.fiber = fiber
+
+        t = pulse.t_ps  # time array in picoseconds
+        self.w0 = pulse.centerfrequency_THz * 2 * pi  # center freq (angular!)
+        self.shock = shock
+
+        n = t.size        # number of time/frequency points
+        self.dt = t[1] - t[0]  # time step
+        v = 2 * pi * linspace(-0.5/self.dt, 0.5/self.dt, n)  # *angular* freq
+
+        # there is nothing to reload if none of the properties vary with z:
+        self.reload_fiber = reload_fiber and (fiber.dispersion_changes_with_z
+                                              or fiber.gamma_changes_with_z or
+                                              fiber.alpha_changes_with_z)
+
+        if self.w0 > 0 and shock:   # if w0>0 then include shock
+            w = v + self.w0         # for shock w is true freq
+        else:
+            w = 1 + v*0             # set w to 1 when no shock
+        self.w = fftshift(w)  # fft shift so things line up later
+
+        self._lin_cache = (None, None, None)  # B, loss, and linear operator
+        self.load_fiber(0)  # load fiber info
+
+        # Raman response:
+        if raman == 'dudley' or raman:
+            self.fr = 0.18
+            t1 = 0.0122
+            t2 = 0.032
+            rt = (t1**2+t2**2)/t1/t2**2*exp(-t/t2)*sin(t/t1)
+            rt[t < 0] = 0                # heaviside step function
+            self.rw = n * ifft(fftshift(rt))  # frequency domain Raman
+        elif not raman:
+            self.fr = 0
+        else:
+            raise ValueError('Raman method not supported')
+
+        self.no_raman = np.isclose(self.fr, 0)
+
+        self._work_shape = None
+        self._nl_shape = None
+        self._ip_dz = None
+        self.diagnostics = None  # a _Diagnostics object, set by the NLSE
+
+    def load_fiber(self, z=0):
+        """Load the linear operator and gamma at position z."""
+        fiber = self.fiber
+        # gamma should be in 1/(W m), not 1/(W km)
+        gamma = fiber.get_gamma(z)
+        b = fiber.get_B(self.pulse, z)   # cached by the fiber
+
+        loss = np.log(10**(fiber.get_alpha(z)*0.1))  # convert from dB/m
+
+        if self.w0 > 0 and self.shock:
+            gamma = gamma/self.w0
+        self.gamma = gamma
+        self._gw = 1j * gamma * self.w
+
+        # only rebuild the linear operator if B or the loss changed:
+        if b is self._lin_cache[0] and loss == self._lin_cache[1]:
+            self.lin_operator = self._lin_cache[2]
+            return
+
+        lin_operator = 1j*b - loss*0.5  # linear operator
+
+        # some fft shifts to things line up later:
+        self.lin_operator = fftshift(lin_operator)
+        self._lin_cache = (b, loss, self.lin_operator)
+        self._ip_dz = None
+
+    def nonlinear(self, aw, out=None, ip=None):
+        """Nonlinear part of the RHS of Eq. (3.13).
+
+        The FFTs are done in place on work arrays that are reused between
+        calls, and the pointwise stages between them are fused into numba
+        kernels when numba is available (see ``USE_NUMBA``). If `out` is
+        given, the result is written into it. If `ip` is given, `aw` is in
+        the interaction picture and ``ip = exp(L z)`` is the linear
+        propagator to the normal frame (and ``1/ip`` back again).
+        """
+        if aw.shape != self._nl_shape:
+            self._at = empty_aligned(aw.shape)
+            self._it = np.empty(aw.shape)
+            self._rs = empty_aligned(aw.shape)
+            self._nl_shape = aw.shape
+        if out is None:
+            out = np.empty(aw.shape, dtype='complex128')
+
+        if USE_NUMBA:
+            return self._nonlinear_jit(aw, out, ip)
+
+        at = self._at
+        if ip is None:
+            at[...] = aw
+        else:
+            np.multiply(aw, ip, out=at)
+        at = fft(at, overwrite_x=True)        # time domain field
+        it = np.abs(at, out=self._it)
+        np.square(it, out=it)                 # time domain intensity
+
+        if self.no_raman:  # no Raman case
+            np.multiply(at, it, out=at)
+        else:
+            fr = self.fr
+            rs = self._rs                      # Raman convolution
+            rs[...] = it
+            rs = ifft(rs, overwrite_x=True)
+            np.multiply(rs, self.rw, out=rs)
+            rs = fft(rs, overwrite_x=True)
+            np.multiply(rs, self.dt * fr, out=rs)
+            np.multiply(it, 1 - fr, out=it)
+            np.add(rs, it, out=rs)
+            np.multiply(at, rs, out=at)
+        m = ifft(at, overwrite_x=True)         # response function
+
+        np.multiply(m, self._gw, out=out)
+        if ip is not None:
+            np.divide(out, ip, out=out)
+        return out
+
+    def _nonlinear_jit(self, aw, out, ip):
+        """The nonlinear operator with the pointwise stages in kernels."""
+        n = self._gw.size
+        at = self._at
+        if ip is None:
+            at[...] = aw
+        else:
+            _multiply_kernel(aw.reshape(-1, n), ip, at.reshape(-1, n))
+        at = fft(at, overwrite_x=True)        # time domain field
+
+        if self.no_raman:  # no Raman case
+            _kerr_kernel(at.reshape(-1, n))
+        else:
+            it = self._it.reshape(-1, n)
+            rs = self._rs                      # Raman convolution
+            _intensity_kernel(at.reshape(-1, n), it, rs.reshape(-1, n))
+            rs = ifft(rs, overwrite_x=True)
+            _multiply_kernel(rs.reshape(-1, n), self.rw, rs.reshape(-1, n))
+            rs = fft(rs, overwrite_x=True)
+            _raman_kernel(at.reshape(-1, n), it, rs.reshape(-1, n),
+                          self.dt * self.fr, 1 - self.fr)
+        m = ifft(at, overwrite_x=True)         # response function
+
+        if ip is None:
+            _multiply_kernel(m.reshape(-1, n), self._gw, out.reshape(-1, n))
+        else:
+            _output_kernel(m.reshape(-1, n), self._gw, ip,
+                           out.reshape(-1, n))
+        return out
+
+    def rhs(self, z, aw):
+        """Full RHS of Eq. (3.13) in the interaction picture."""
+        if self.reload_fiber:
+            self.load_fiber(z)
+
+        return self.nonlinear(aw, ip=exp(self.lin_operator*z))
+
+    def propagate(self, aw, z, z_stop, dz, rtol, k5=None):
+        """Propagate from z to z_stop with the adaptive ERK4(3)-IP scheme.
+
+        The field is kept in the normal (not interaction picture) frame
+        between steps, and the nonlinear action of the last accepted step
+        (k5) is reused as the first stage of the next one. For a stack of
+        spectra, the step size is set by the row with the largest error.
+
+        Parameters
+        ----------
+        aw : array
+            The spectrum (or stack of spectra) in fft order. It is updated in
+            place.
+        z : float
+            The starting point.
+        z_stop : float
+            The stopping point.
+        dz : float
+            The initial step size.
+        rtol : float
+            The target relative local error.
+        k5 : array or None
+            The nonlinear action on `aw` from the preceding step.
+
+        Returns
+        -------
+        aw, z, dz, k5
+            The spectrum, position, next step size, and nonlinear action,
+            which can be passed back to continue the propagation.
+        """
+        if aw.shape != self._work_shape:
+            # preallocate the work arrays used at every step:
+            (self._ai, self._k1, self._k2, self._k3, self._k4, self._a4,
+             self._b, self._tmp, self._ip, self._k5,
+             self._k5_next) = (np.empty_like(aw) for i in range(11))
+            self._work_shape = aw.shape
+            self._ip_dz = None
+
+        ai, k1, k2, k3, k4 = self._ai, self._k1, self._k2, self._k3, self._k4
+        a4, b, tmp, ip = self._a4, self._b, self._tmp, self._ip
+        nonlinear = self.nonlinear
+        diagnostics = self.diagnostics
+        if diagnostics is not None:
+            nonlinear = diagnostics.timed(nonlinear)
+        clock = time.perf_counter
+
+        while z < z_stop:
+            z_next = z + dz
+            if z_next >= z_stop:
+                final_step = True
+                z_next = z_stop
+                dz_adaptive = dz  # save value of last step size
+                dz = z_next - z   # force smaller step size to hit z_stop
+            else:
+                final_step = False
+
+            # k1
+            if self.reload_fiber:
+                self.load_fiber(z)
+            if k5 is None:
+                k5 = nonlinear(aw, out=self._k5)
+            if dz != self._ip_dz:  # half-step linear propagator
+                t_start = clock()
+                np.exp(self.lin_operator*(0.5*dz), out=ip)
+                self._ip_dz = dz
+                if diagnostics is not None:
+                    diagnostics.t_linear += clock() - t_start
+
+            np.multiply(ip, aw, out=ai)  # into interaction picture
+            np.multiply(ip, k5, out=k1)
+
+            # k2 and k3
+            if self.reload_fiber:
+                self.load_fiber(z + 0.5*dz)
+
+            np.multiply(k1, 0.5*dz, out=tmp)
+            np.add(ai, tmp, out=tmp)
+            nonlinear(tmp, out=k2)
+
+            np.multiply(k2, 0.5*dz, out=tmp)
+            np.add(ai, tmp, out=tmp)
+            nonlinear(tmp, out=k3)
+
+            # k4
+            if self.reload_fiber:
+                t_start = clock()
+                self.load_fiber(z_next)
+                np.exp(self.lin_operator*(0.5*dz), out=ip)
+                self._ip_dz = None
+                if diagnostics is not None:
+                    diagnostics.t_linear += clock() - t_start
+
+            np.multiply(k3, dz, out=tmp)
+            np.add(ai, tmp, out=tmp)
+            np.multiply(ip, tmp, out=tmp)  # out of interaction picture
+            nonlinear(tmp, out=k4)
+
+            # RK4
+            np.add(k2, k3, out=tmp)
+            np.multiply(tmp, 2.0, out=tmp)
+            np.add(tmp, k1, out=tmp)
+            np.multiply(tmp, dz/6.0, out=tmp)
+            np.add(ai, tmp, out=b)
+            np.multiply(ip, b, out=b)  # out of interaction picture
+            np.multiply(k4, dz/6.0, out=tmp)
+            np.add(b, tmp, out=a4)
+
+            # k5 and RK3 error estimate
+            # (written into whichever k5 work array is not in use)
+            k5_next = self._k5_next if k5 is self._k5 else self._k5
+            nonlinear(a4, out=k5_next)
+            np.multiply(k5_next, 1.5, out=tmp)
+            np.add(tmp, k4, out=tmp)
+            np.multiply(tmp, dz/15.0, out=tmp)
+            np.add(tmp, b, out=tmp)
+            np.subtract(tmp, a4, out=tmp)  # RK3 minus RK4 result
+            est_error = np.max(np.linalg.norm(tmp, axis=-1) /
+                               np.linalg.norm(a4, axis=-1))
+            error_ratio = (est_error/rtol)**0.25
+
+            if diagnostics is not None:
+                diagnostics.step(z, dz, error_ratio <= 2, est_error, a4)
+
+            if error_ratio > 2:
+                # reject this step and calculate with a smaller dz
+                dz = dz/2
+            else:
+                z = z_next
+                aw[:] = a4
+                k5 = k5_next
+                if (not final_step) or (error_ratio > 1):
+                    dz = dz / max(error_ratio, 0.5)
+                else:
+                    dz = dz_adaptive  # if final step, use adaptive step size
+
+        return aw, z, dz, k5
+
+
+class _Diagnostics:
+    """Statistics of the steps of the ERK4(3)-IP integrator.
+
+    See the Notes of :func:`NLSE` for the recorded fields.
+
+    Parameters
+    ----------
+    pulse : pulse object
+        Defines the time and frequency grids.
+    aw : array
+        The input spectrum in fft order.
+    log : string or None
+        A file to which each step is appended as a tab-separated line.
+    edge : float
+        The fraction of the frequency window on each side that counts as the
+        edge of the window.
+
+    The fields, log format, and limits (see :meth:`set_limits`) are those of
+    ``pynlo.utility.diagnostics.Diagnostics``, so that the logs of both
+    packages can be read and compared in the same way.
+    """
+
+    dtype = np.dtype([
+        ('z', float), ('dz', float), ('accepted', bool), ('error', float),
+        ('energy', float), ('photons', float), ('energy_drift', float),
+        ('photon_drift', float), ('edge', float), ('t_linear', float),
+        ('t_nonlinear', float)])
+
+    def __init__(self, pulse, aw, log=None, edge=0.05):
+        f = pulse.f_THz
+        # J per |aw|^2 (Parseval's theorem for aw = ifft(at)):
+        self._scale = pulse.dt_ps * 1e-12 * f.size
+        self._w_photons = ifftshift(self._scale / (constants.h * f * 1e12))
+        f_edge = edge * (f[-1] - f[0])
+        self._edges = ifftshift((f < f[0] + f_edge) | (f > f[-1] - f_edge))
+        self.energy_0, self.photons_0, _ = self._moments(aw)
+
+        self.rows = []
+        self.t_linear = 0.
+        self.t_nonlinear = 0.
+        self._t_last = (0., 0.)
+        self._file = None
+        self.open_log(log, header=True)
+        self.set_limits()
+
+    def set_limits(self, max_energy_drift=None, max_photon_drift=None,
+                   max_edge=None, min_dz=None):
+        """Set the limits at which a step raises a RuntimeError.
+
+        The drifts are relative to the input, the edge is a fraction of the
+        energy, and the step size is in m and only applies to rejected steps
+        (the last step to a save point may be shorter). None disables a
+        limit.
+        """
+        self.max_energy_drift = max_energy_drift
+        self.max_photon_drift = max_photon_drift
+        self.max_edge = max_edge
+        self.min_dz = min_dz
+
+    def timed(self, nonlinear):
+        """Wrap the nonlinear operator to add its time to t_nonlinear."""
+        clock = time.perf_counter
+
+        def timed_nonlinear(*args, **kwargs):
+            t_start = clock()
+            try:
+                return nonlinear(*args, **kwargs)
+            finally:
+                self.t_nonlinear += clock() - t_start
+        return timed_nonlinear
+
+    def step(self, z, dz, accepted, error, aw):
+        """Record a step from z to z + dz, and the spectrum after it."""
+        if accepted:
+            energy, photons, edge = self._moments(aw)
+            energy_drift = energy/self.energy_0 - 1
+            photon_drift = photons/self.photons_0 - 1
+        else:
+            energy = photons = edge = energy_drift = photon_drift = np.nan
+
+        t_linear = self.t_linear - self._t_last[0]
+        t_nonlinear = self.t_nonlinear - self._t_last[1]
+        self._t_last = (self.t_linear, self.t_nonlinear)
+
+        row = (z, dz, accepted, error, energy, photons, energy_drift,
+               photon_drift, edge, t_linear, t_nonlinear)
+        self.rows.append(row)
+        if self._file is not None:
+            self._file.write('\t'.join('%.9g' % x for x in row) + '\n')
+            self._file.flush()
+
+        if self.min_dz is not None and dz < self.min_dz and not accepted:
+            self._stop('The step size collapsed to %.3g m at z=%.6g m.'
+                       % (dz, z))
+        if (self.max_energy_drift is not None and
+                abs(energy_drift) > self.max_energy_drift):
+            self._stop('The energy drifted by %.3g at z=%.6g m.'
+                       % (energy_drift, z + dz))
+        if (self.max_photon_drift is not None and
+                abs(photon_drift) > self.max_photon_drift):
+            self._stop('The photon number drifted by %.3g at z=%.6g m.'
+                       % (photon_drift, z + dz))
+        if self.max_edge is not None and edge > self.max_edge:
+            self._stop('The energy at the edges of the frequency window '
+                       'reached %.3g at z=%.6g m.' % (edge, z + dz))
+
+    def _stop(self, message):
+        """Close the log and stop the propagation."""
+        self.open_log(None)
+        raise RuntimeError(message)
+
+    def finish(self):
+        """Close the log and return the steps as a structured array."""
+        self.open_log(None)
+        return np.array(self.rows, dtype=self.dtype)
+
+    def open_log(self, log, header=False):
+        """Close the current log, if any, and append to the file `log`."""
+        if self._file is not None:
+            self._file.close()
+        self._file = None if log is None else open(log, 'a')
+        if header and self._file is not None:
+            self._file.write('\t'.join(self.dtype.names) + '\n')
+            self._file.flush()
+
+    def _moments(self, aw):
+        """The energy, photon number, and edge fraction of a spectrum."""
+        pw = np.abs(aw)**2
+        energy = self._scale * pw.sum()
+        photons = np.sum(pw @ self._w_photons)
+        edge = self._scale * pw[..., self._edges].sum() / energy
+        return energy, photons, edge
+
+    def __getstate__(self):
+        # the open log can't be pickled (for the checkpoints), the NLSE
+        # reopens it when resuming
+        state = self.__dict__.copy()
+        state['_file'] = None
+        return state
 
 
 class PulseData:
@@ -215,15 +931,20 @@ class PulseData:
         The output pulse object.
     fiber : fiber object
         The fiber object that the pulse was propagated through.
+    diagnostics : structured array or None
+        The statistics of each integrator step, if the NLSE was run with
+        ``diagnostics=True`` (see :func:`NLSE`).
     """
 
-    def __init__(self, z, AW, AT, pulse_in, pulse_out, fiber):
+    def __init__(self, z, AW, AT, pulse_in, pulse_out, fiber,
+                 diagnostics=None):
         self.z = z
         self.AW = AW
         self.AT = AT
         self.pulse_in = pulse_in
         self.pulse_out = pulse_out
         self.fiber = fiber
+        self.diagnostics = diagnostics
         self.f_THz = pulse_out.f_THz
         self.t_ps = pulse_out.t_ps
 
@@ -628,13 +1349,21 @@ class PulseData:
         time adding random noise to the pulse. By comparing the electric fields
         of the different pulses, an estimate of the coherence can be made.
 
+        This is a thin wrapper around :func:`NLSE_ensemble`, which propagates
+        all of the trials together.
+
         Parameters
         ----------
         pulse_in : pulse object
 
+        fiber : fiber object
+
         num_trials : int
             this determines the number of trials to be run.
 
+        n_steps : int
+            the number of z-positions at which the coherence is calculated.
+
         random_seed : int
             this is the seed for the random noise generation. Default is None,
             which does not set a seed for the random number generator, which
@@ -645,9 +1374,12 @@ class PulseData:
 
         noise_type : str
             this specifies the method for including random noise onto the
-            pulse. See :func:`pynlo.light.PulseBase.Pulse.add_noise` for the
+            pulse. See :func:`laserfun.pulse.Pulse.add_noise` for the
             different methods.
 
+        **nlse_kwargs
+            passed on to :func:`NLSE_ensemble` (rtol, raman, shock, etc.).
+
         Returns
         -------
         g12W : 2D numpy array
@@ -655,40 +1387,63 @@ class PulseData:
             distance and the frequency. g12 gives a measure of the coherence of
             the pulse by comparing several different trials.
 
-        results : list of results for each trial
-            This is a list, where each item of the list contains (z_positions,
-            AW, AT, pulse_out), the results obtained from
-            :func:`pynlo.interactions.FourWaveMixing.SSFM.propagate`.
+        results : PulseData object
+            The propagation results for the first trial.
         """
+        return NLSE_ensemble(pulse_in, fiber, n_trials=num_trials,
+                             noise_type=noise_type, random_seed=random_seed,
+                             nsaves=n_steps, **nlse_kwargs)
 
-        results = []
-        for num in range(0, num_trials):
 
-            pulse = pulse_in.create_cloned_pulse()
-            pulse.add_noise(noise_type=noise_type)
+def dB(num):
+    with np.errstate(divide='ignore'):
+        return 10 * np.log10(np.abs(num)**2)
 
-            y, AW, AT, pulse_out = self.propagate(
-                pulse_in=pulse, fiber=fiber, n_steps=n_steps)
 
-            results.append((y, AW, AT, pulse_in, pulse_out))
+# Kernels for the pointwise stages of the nonlinear operator. The arrays are
+# passed as 2D (one spectrum per row) and the operators as 1D (length n).
 
-        for n1, (y, E1, AT, pulsein, pulseout) in enumerate(results):
-            for n2, (y, E2, AT, pulsein, pulseout) in enumerate(results):
-                if n1 == n2:
-                    continue  # don't compare the same trial
+def _kerr_kernel(at):
+    """at <- |at|^2 at"""
+    for j in range(at.shape[0]):
+        for i in range(at.shape[1]):
+            a = at[j, i]
+            at[j, i] = a * (a.real**2 + a.imag**2)
 
-                g12 = np.conj(E1)*E2/np.sqrt(np.abs(E1)**2 * np.abs(E2)**2)
-                if 'g12_stack' not in locals():
-                    g12_stack = g12
-                else:
-                    g12_stack = np.dstack((g12, g12_stack))
 
-        # print g12_stack.shape, g12_stack.transpose().shape
-        g12W = np.abs(np.mean(g12_stack, axis=2))
+def _intensity_kernel(at, it, rs):
+    """it <- |at|^2, rs <- |at|^2"""
+    for j in range(at.shape[0]):
+        for i in range(at.shape[1]):
+            a = at[j, i]
+            it[j, i] = a.real**2 + a.imag**2
+            rs[j, i] = it[j, i]
 
-        return g12W, results
 
+def _multiply_kernel(a, op, out):
+    """out <- a op"""
+    for j in range(a.shape[0]):
+        for i in range(a.shape[1]):
+            out[j, i] = a[j, i] * op[i]
 
-def dB(num):
-    with np.errstate(divide='ignore'):
-        return 10 * np.log10(np.abs(num)**2)
\ No newline at end of file
+
+def _raman_kernel(at, it, rs, c_raman, c_kerr):
+    """at <- (c_raman rs + c_kerr it) at"""
+    for j in range(at.shape[0]):
+        for i in range(at.shape[1]):
+            at[j, i] *= c_raman * rs[j, i] + c_kerr * it[j, i]
+
+
+def _output_kernel(m, gw, ip, out):
+    """out <- m gw / ip"""
+    for j in range(m.shape[0]):
+        for i in range(m.shape[1]):
+            out[j, i] = m[j, i] * gw[i] / ip[i]
+
+
+if njit is not None:
+    _kerr_kernel = njit(error_model='numpy')(_kerr_kernel)
+    _intensity_kernel = njit(error_model='numpy')(_intensity_kernel)
+    _multiply_kernel = njit(error_model='numpy')(_multiply_kernel)
+    _raman_kernel = njit(error_model='numpy')(_raman_kernel)
+    _output_kernel = njit(error_model='numpy')(_output_kernel)
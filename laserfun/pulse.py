@@ -2,7 +2,7 @@
 
 import numpy as np
 import sympy as sym
-import scipy.fftpack as fft
+from . import fft
 
 
 # speed of light in m/s and nm/ps
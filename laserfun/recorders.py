@@ -0,0 +1,214 @@
+"""Recorders that receive the pulse at each save point of the NLSE.
+
+By default, :func:`laserfun.NLSE` stores the full complex field in both the
+frequency and time domains at all ``nsaves`` points, which takes
+2 x nsaves x npts x 16 bytes. A recorder can be passed to the NLSE
+(``recorder=...``) to store less: only the spectrum, a decimated band of the
+spectrum, the power in dB as float32, or to write each slice to a file as it
+is produced.
+"""
+
+import numpy as np
+from .fft import fft, fftshift
+
+
+class Recorder:
+    """Base class for recorders.
+
+    Subclasses override :meth:`start`, :meth:`record`, and :meth:`finish`,
+    which are called by :func:`laserfun.NLSE` at the beginning of the
+    propagation, once at each of the save points (including the input), and
+    at the end.
+    """
+
+    def start(self, z, f, t):
+        """Prepare for the propagation.
+
+        Parameters
+        ----------
+        z : 1D array
+            The save points along the fiber in meters.
+        f : 1D array
+            The frequency grid in THz, in natural (not fft) order.
+        t : 1D array
+            The time grid in ps.
+        """
+        self.z = z
+        self.f = f
+        self.t = t
+
+    def record(self, i, aw):
+        """Store the field at the i-th save point.
+
+        Parameters
+        ----------
+        i : int
+            The index of the save point.
+        aw : 1D array
+            The complex spectrum in fft order (use ``fftshift`` to get the
+            natural order, or ``fft`` to get the time-domain field). It is
+            overwritten by the NLSE, so it must be copied if it is stored.
+        """
+        pass
+
+    def finish(self):
+        """Clean up at the end of the propagation."""
+        pass
+
+
+class FullRecorder(Recorder):
+    """Store the full spectrum (AW) and time-domain field (AT).
+
+    This is the default behavior of :func:`laserfun.NLSE`.
+
+    Parameters
+    ----------
+    time_domain : bool
+        If False, AT is not stored (and is None), which halves the memory.
+    """
+
+    def __init__(self, time_domain=True):
+        self.time_domain = time_domain
+
+    def start(self, z, f, t):
+        super().start(z, f, t)
+        self.AW = np.zeros((z.size, f.size), dtype='complex128')
+        self.AT = np.zeros_like(self.AW) if self.time_domain else None
+
+    def record(self, i, aw):
+        self.AW[i] = fftshift(aw)
+        if self.time_domain:
+            self.AT[i] = fft(aw)
+
+
+class SpectrumRecorder(Recorder):
+    """Store a band of the spectrum, optionally as the power in dB.
+
+    The stored spectra are available as ``spectrum`` (with dimensions
+    nsaves x ``f.size``) after the propagation, along with the matching
+    frequency grid ``f`` in THz.
+
+    Parameters
+    ----------
+    f_range : tuple of floats or None
+        The (minimum, maximum) frequency in THz to store. Default is None,
+        which stores the whole spectrum.
+    decimation : int
+        Store only every ``decimation``-th frequency point in the band.
+    dB : bool
+        If True, store the spectral power in dB, ``10 log10(|AW|^2)``.
+        Otherwise, store the complex spectrum.
+    dtype : str or None
+        The data type of the stored spectra. Default is None, which uses
+        'float32' for dB and 'complex128' otherwise.
+    """
+
+    def __init__(self, f_range=None, decimation=1, dB=False, dtype=None):
+        self.f_range = f_range
+        self.decimation = decimation
+        self.dB = dB
+        if dtype is None:
+            dtype = 'float32' if dB else 'complex128'
+        self.dtype = np.dtype(dtype)
+
+    def start(self, z, f, t):
+        if self.f_range is None:
+            band = np.arange(f.size)
+        else:
+            band = np.flatnonzero((f >= min(self.f_range)) &
+                                  (f <= max(self.f_range)))
+        band = band[::self.decimation]
+
+        # the indices of the band in the fft-ordered spectrum:
+        self._index = fftshift(np.arange(f.size))[band]
+
+        super().start(z, f[band], t)
+        self._allocate((z.size, band.size))
+
+    def _allocate(self, shape):
+        self.spectrum = np.zeros(shape, dtype=self.dtype)
+
+    def _convert(self, aw):
+        aw = aw[self._index]
+        if self.dB:
+            with np.errstate(divide='ignore'):
+                aw = 10 * np.log10(aw.real**2 + aw.imag**2)
+        return aw.astype(self.dtype, copy=False)
+
+    def record(self, i, aw):
+        self.spectrum[i] = self._convert(aw)
+
+
+class FileRecorder(SpectrumRecorder):
+    """Write a band of the spectrum to an HDF5 or Zarr file at each save.
+
+    Only one spectrum is held in memory at a time. The file contains the
+    datasets ``z`` and ``f`` (in THz), and the spectra in a dataset with
+    dimensions nsaves x ``f.size``. HDF5 files require h5py and Zarr stores
+    require zarr.
+
+    Parameters
+    ----------
+    path : str
+        The file name. A '.zarr' extension selects a Zarr store, all others
+        an HDF5 file.
+    name : str
+        The name of the dataset (or group, for several runs in one file) for
+        the spectra. Existing data with the same name is replaced.
+    f_range, decimation, dB, dtype
+        See :class:`SpectrumRecorder`.
+    """
+
+    def __init__(self, path, name='AW', f_range=None, decimation=1, dB=False,
+                 dtype=None):
+        super().__init__(f_range=f_range, decimation=decimation, dB=dB,
+                         dtype=dtype)
+        self.path = path
+        self.name = name
+        self.zarr = path.rstrip('/').endswith('.zarr')
+        if self.zarr:
+            import zarr  # noqa: F401
+        else:
+            import h5py  # noqa: F401
+
+    def _allocate(self, shape):
+        if self.zarr:
+            import zarr
+            self._file = zarr.open_group(self.path, mode='a')
+        else:
+            import h5py
+            self._file = h5py.File(self.path, 'a')
+
+        group = self._file.require_group(self.name)
+        for key in ('z', 'f', 'spectrum'):
+            if key in group:
+                del group[key]
+        group.create_dataset('z', data=self.z)
+        group.create_dataset('f', data=self.f)
+        self.spectrum = group.create_dataset('spectrum', shape=shape,
+                                             dtype=self.dtype,
+                                             chunks=(1, shape[1]))
+
+    def finish(self):
+        if not self.zarr:
+            self._file.close()
+
+    def __getstate__(self):
+        # the open file can't be pickled (e.g. in a checkpoint of the NLSE),
+        # so it is flushed and then reopened when unpickled
+        if not self.zarr:
+            self._file.flush()
+        state = self.__dict__.copy()
+        state.pop('_file', None)
+        state.pop('spectrum', None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.zarr:
+            import zarr
+            self._file = zarr.open_group(self.path, mode='a')
+        else:
+            import h5py
+            self._file = h5py.File(self.path, 'a')
+        self.spectrum = self._file[self.name]['spectrum']
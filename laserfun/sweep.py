@@ -0,0 +1,251 @@
+"""Run parameter sweeps of the NLSE on several processes."""
+
+import os
+import json
+import time
+import hashlib
+import itertools
+import multiprocessing
+import concurrent.futures
+
+import numpy as np
+
+# environment variables that set the number of BLAS/FFT threads. These need
+# to be set before numpy is imported in the worker processes.
+THREAD_VARIABLES = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS',
+                    'OPENBLAS_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                    'VECLIB_MAXIMUM_THREADS', 'NUMBA_NUM_THREADS')
+
+
+def grid(pulse={}, fiber={}, nlse={}):
+    """Generate all combinations of the Pulse, Fiber, and NLSE parameters.
+
+    Each argument is a dictionary of keyword arguments. Values that are lists
+    are swept over, while all other values are held constant. For example::
+
+        runs = grid(pulse=dict(epp=[50e-12, 100e-12], fwhm_ps=0.05),
+                    fiber=dict(length=[8e-3, 16e-3], gamma_W_m=1))
+
+    gives four runs.
+
+    Parameters
+    ----------
+    pulse : dict
+        Keyword arguments for :class:`laserfun.Pulse`.
+    fiber : dict
+        Keyword arguments for :class:`laserfun.Fiber`.
+    nlse : dict
+        Keyword arguments for :func:`laserfun.NLSE`.
+
+    Returns
+    -------
+    runs : list of dicts
+        Each run is a dictionary with the keys 'pulse', 'fiber', and 'nlse'.
+    """
+    groups = {'pulse': pulse, 'fiber': fiber, 'nlse': nlse}
+    names = []
+    values = []
+    for group, kwargs in groups.items():
+        for key, value in kwargs.items():
+            names.append((group, key))
+            values.append(value if isinstance(value, list) else [value])
+
+    runs = []
+    for combination in itertools.product(*values):
+        run = {group: {} for group in groups}
+        for (group, key), value in zip(names, combination):
+            run[group][key] = value
+        runs.append(run)
+    return runs
+
+
+def run_key(run):
+    """Return the key under which a run is saved in the store.
+
+    The key is a hash of all of the parameters of the run, so identical runs
+    map to the same file.
+    """
+    text = json.dumps(run, sort_keys=True, default=_json_default)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def run_sweep(runs, store, max_workers=None, threads_per_worker=1,
+              z_decimation=1, f_decimation=1, skip_existing=True,
+              print_status=True):
+    """Propagate each run with :func:`laserfun.NLSE` on a process pool.
+
+    Each finished run is written to its own file in the ``store`` directory,
+    so several sweeps (or several machines with a shared filesystem) can use
+    the same store. Runs that are already in the store are skipped.
+
+    Parameters
+    ----------
+    runs : list of dicts
+        Each run is a dictionary with the (optional) keys 'pulse', 'fiber',
+        and 'nlse', giving the keyword arguments for :class:`laserfun.Pulse`,
+        :class:`laserfun.Fiber`, and :func:`laserfun.NLSE`. See :func:`grid`.
+        The values must be picklable and, to be skipped correctly, have a
+        stable ``repr``.
+    store : str
+        The directory in which the results are saved. It is created if it
+        does not exist.
+    max_workers : int or None
+        The number of worker processes. Default is None, which uses the number
+        of CPUs divided by ``threads_per_worker``.
+    threads_per_worker : int
+        The number of BLAS/FFT threads in each worker process.
+    z_decimation : int
+        Save only every ``z_decimation``-th spectrum along the fiber. The
+        final spectrum is always saved.
+    f_decimation : int
+        Save only every ``f_decimation``-th frequency point.
+    skip_existing : bool
+        If True (default), runs that are already in the store are not run
+        again.
+    print_status : bool
+        If True, print the wall time of each run as it finishes.
+
+    Returns
+    -------
+    timings : dict
+        The wall time in seconds of each run, keyed by :func:`run_key`. Runs
+        that were skipped have a value of None.
+    """
+    os.makedirs(store, exist_ok=True)
+
+    if max_workers is None:
+        max_workers = max(1, (os.cpu_count() or 1) // threads_per_worker)
+
+    timings = {}
+    todo = []
+    for run in runs:
+        key = run_key(run)
+        if key in timings:
+            continue
+        if skip_existing and os.path.exists(_store_path(store, key)):
+            timings[key] = None
+            continue
+        todo.append((key, run))
+
+    if print_status and len(timings) > 0:
+        print('Skipping %i runs that are already in the store.' % len(timings))
+
+    # The worker processes are started with 'spawn', and inherit the
+    # environment when they are first started (on submit), so the thread
+    # variables take effect before numpy is imported.
+    saved_environ = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads_per_worker)
+
+    start_time = time.time()
+    try:
+        context = multiprocessing.get_context('spawn')
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers, mp_context=context,
+                initializer=_init_worker,
+                initargs=(threads_per_worker,)) as executor:
+            futures = [executor.submit(_run_one, key, run, store,
+                                       z_decimation, f_decimation)
+                       for key, run in todo]
+
+            for count, future in enumerate(
+                    concurrent.futures.as_completed(futures)):
+                key, wall_time = future.result()
+                timings[key] = wall_time
+                if print_status:
+                    print('%i/%i - %s - %.1f seconds (%.1f seconds total)' %
+                          (count+1, len(todo), key, wall_time,
+                           time.time()-start_time))
+    finally:
+        for name, value in saved_environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    return timings
+
+
+def load_sweep(store):
+    """Load all of the results in a store.
+
+    Parameters
+    ----------
+    store : str
+        The directory given to :func:`run_sweep`.
+
+    Returns
+    -------
+    results : list of dicts
+        One dictionary per run with the keys 'key', 'run' (the parameters of
+        the run), 'wall_time', 'z', 'f' (in THz), 'AW_dB' (the spectral
+        power in dB, with dimensions z x f), and 'AW_out' (the full output
+        spectrum).
+    """
+    results = []
+    for name in sorted(os.listdir(store)):
+        if not name.endswith('.npz'):
+            continue
+        with np.load(os.path.join(store, name)) as data:
+            result = {key: data[key] for key in data.files}
+        result['key'] = name[:-4]
+        result['run'] = json.loads(str(result['run']))
+        result['wall_time'] = float(result['wall_time'])
+        results.append(result)
+    return results
+
+
+def _json_default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return repr(obj)
+
+
+def _store_path(store, key):
+    return os.path.join(store, key + '.npz')
+
+
+def _init_worker(threads_per_worker):
+    """Limit the threads of the libraries that are already loaded."""
+    try:
+        import mkl
+        mkl.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+
+
+def _run_one(key, run, store, z_decimation, f_decimation):
+    """Propagate a single run and save the decimated spectra."""
+    from .pulse import Pulse
+    from .fiber import Fiber
+    from .nlse import NLSE, dB
+
+    start_time = time.time()
+
+    pulse = Pulse(**run.get('pulse', {}))
+    fiber = Fiber(**run.get('fiber', {}))
+    nlse_kwargs = dict(print_status=False)
+    nlse_kwargs.update(run.get('nlse', {}))
+    results = NLSE(pulse, fiber, **nlse_kwargs)
+
+    z, f, t, AW, AT = results.get_results()
+    rows = np.arange(0, z.size, z_decimation)
+    if rows[-1] != z.size - 1:
+        rows = np.append(rows, z.size - 1)  # always keep the output
+
+    wall_time = time.time() - start_time
+
+    # write to a temporary file first, so a partial file is never mistaken
+    # for a finished run:
+    path = _store_path(store, key)
+    tmp_path = '%s.%i.tmp' % (path, os.getpid())
+    with open(tmp_path, 'wb') as file:
+        np.savez(file, run=json.dumps(run, default=_json_default),
+                 wall_time=wall_time, z=z[rows], f=f[::f_decimation],
+                 AW_dB=dB(AW[rows, ::f_decimation]).astype('float32'),
+                 AW_out=AW[-1])
+    os.replace(tmp_path, path)
+
+    return key, wall_time
@@ -1,6 +1,7 @@
 import laserfun as lf
 import numpy as np
 import os
+import pytest
 
 
 def test_pulse():
@@ -30,6 +31,24 @@ def test_pulse():
     pulse.add_noise(noise_type='one_photon_freq')
 
 
+def test_fft_backends():
+    """Check that all available FFT backends give the numpy results."""
+    x = np.random.default_rng(0).normal(size=(3, 64)) + 0j
+    default = lf.fft.get_backend()
+    try:
+        for name in lf.fft.BACKENDS:
+            try:
+                lf.fft.set_backend(name)
+            except ImportError:
+                continue
+            np.testing.assert_allclose(lf.fft.fft(x, axis=1),
+                                       np.fft.fft(x, axis=1), atol=1e-12)
+            np.testing.assert_allclose(lf.fft.ifft(x.copy(), overwrite_x=True),
+                                       np.fft.ifft(x), atol=1e-12)
+    finally:
+        lf.fft.set_backend(default)
+
+
 def test_fiber():
     fiber = lf.Fiber(1, center_wl_nm=1550)
 
@@ -50,6 +69,45 @@ def test_fiber():
     assert fiber.get_alpha(z=0.5) == 1
 
 
+def test_fiber_B_cache():
+    """Check that cached and tabulated B values match direct evaluation."""
+    pulse = lf.Pulse(pulse_type='sech')
+
+    fiber = lf.Fiber(1, center_wl_nm=1550, dispersion=(-0.12, 0, 5e-6))
+    B = fiber.get_B(pulse)
+    assert fiber.get_B(pulse, z=0.5) is B  # z-independent, so memoized
+
+    # changing the dispersion attributes invalidates the cached B:
+    fiber.betas = [-0.24, 0, 5e-6]
+    B2 = fiber.get_B(pulse)
+    np.testing.assert_allclose(B2, fiber._calc_B(pulse))
+    assert not np.allclose(B2, B)
+    fiber.betas[0] = -0.12  # also when modified in place
+    np.testing.assert_array_equal(fiber.get_B(pulse), B)
+
+    fiber_n = lf.Fiber(1, dispersion_format='n',
+                       dispersion=[np.linspace(1000, 2000, 50),
+                                   np.linspace(1.46, 1.44, 50)])
+    B_n = fiber_n.get_B(pulse)
+    fiber_n.y = fiber_n.y + 1e-3
+    assert not np.allclose(fiber_n.get_B(pulse), B_n)
+
+    def disp(z):
+        return [-0.12 * (1 + z), 0, 5e-6]
+
+    fiber.set_dispersion_function(disp)
+    B_direct = [np.array(fiber.get_B(pulse, z)) for z in (0.25, 0.3)]
+
+    fiber.set_dispersion_function(disp, z_table=11)
+    B_table = [fiber.get_B(pulse, z) for z in (0.25, 0.3)]
+    # the same z returns the same object, so the NLSE keeps its operator
+    assert fiber.get_B(pulse, 0.3) is B_table[1]
+    assert not fiber.get_B(pulse, 0.3).flags.writeable
+
+    # beta2 is linear in z, so the interpolation is exact:
+    np.testing.assert_allclose(B_table, B_direct, rtol=1e-10, atol=1e-10)
+
+
 def test_nlse_spectrum():
     """Check for reasonable agreement of NLSE output with old PyNLO results."""
     pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
@@ -76,6 +134,280 @@ def test_nlse_spectrum():
     assert np.all(np.isfinite(AW_wls))
 
 
+def test_nlse_erk43ip():
+    """Check that the built-in ERK4(3)-IP integrator matches lsoda."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**12, center_wavelength_nm=1550.0, epp=50e-12)
+
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+
+    results = lf.NLSE(pulse, fiber1, raman=True, shock=True, nsaves=100,
+                      rtol=1e-7, integrator='erk43ip', print_status=False)
+
+    z, f, t, AW, AT = results.get_results()
+    dB = 10*np.log10(np.abs(AW[-1])**2)
+    path = os.path.split(os.path.realpath(__file__))[0]
+    f_prev, dB_prev = np.loadtxt(path+'/nlse_output.txt', delimiter=',',
+                                 unpack=True, skiprows=1)
+
+    # the numerical noise floor differs between integrators, so only
+    # compare the part of the spectrum within 60 dB of the peak. The stored
+    # lsoda result is itself only accurate to about 1 dB at the edges.
+    mask = dB_prev > np.max(dB_prev) - 60
+    np.testing.assert_allclose(dB[mask], dB_prev[mask], rtol=0, atol=1)
+    assert np.isclose(results.pulse_out.epp, pulse.epp, rtol=1e-2)
+
+
+def test_nlse_recorder():
+    """Check that recorders store the same data as the full NLSE output."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**12, center_wavelength_nm=1550.0, epp=50e-12)
+
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+
+    results = lf.NLSE(pulse, fiber1, nsaves=20, print_status=False)
+
+    full = lf.recorders.FullRecorder()
+    results_full = lf.NLSE(pulse, fiber1, nsaves=20, print_status=False,
+                           recorder=full)
+    # the transforms are batched differently, so allow for rounding errors:
+    atol = 1e-12 * np.max(np.abs(results.AT))
+    np.testing.assert_allclose(results_full.AW, results.AW, atol=atol)
+    np.testing.assert_allclose(results_full.AT, results.AT, atol=atol)
+
+    results_aw = lf.NLSE(pulse, fiber1, nsaves=20, print_status=False,
+                         time_domain=False)
+    assert results_aw.AT is None
+    np.testing.assert_allclose(results_aw.AW, results.AW)
+    np.testing.assert_allclose(results_aw.pulse_out.at, results.AT[-1],
+                               atol=atol)
+
+    band = lf.recorders.SpectrumRecorder(f_range=(180, 200), decimation=2,
+                                         dB=True)
+    results_band = lf.NLSE(pulse, fiber1, nsaves=20, print_status=False,
+                           recorder=band)
+    mask = (results.f_THz >= 180) & (results.f_THz <= 200)
+    assert results_band.AW is None
+    assert band.spectrum.dtype == np.float32
+    np.testing.assert_allclose(band.f, results.f_THz[mask][::2])
+    dB_band = lf.dB(results.AW[:, mask][:, ::2])
+    np.testing.assert_allclose(band.spectrum, dB_band, atol=1e-3)
+    assert np.isclose(results_band.pulse_out.epp, results.pulse_out.epp)
+
+
+class InterruptingRecorder(lf.recorders.FullRecorder):
+    """Interrupt the NLSE at a save point, like a killed job."""
+
+    interrupt = None
+
+    def record(self, i, aw):
+        if i == InterruptingRecorder.interrupt:
+            raise KeyboardInterrupt
+        super().record(i, aw)
+
+
+def test_nlse_checkpoint(tmp_path):
+    """Check that a resumed NLSE gives the same result as one without a
+    break."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**11, center_wavelength_nm=1550.0, epp=50e-12)
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+    kwargs = dict(nsaves=20, integrator='erk43ip', raman=True,
+                  print_status=False)
+    results = lf.NLSE(pulse, fiber1, **kwargs)
+
+    path = str(tmp_path / 'nlse.pickle')
+    InterruptingRecorder.interrupt = 8
+    with pytest.raises(KeyboardInterrupt):
+        lf.NLSE(pulse, fiber1, checkpoint_path=path, checkpoint_every=0,
+                recorder=InterruptingRecorder(), **kwargs)
+    InterruptingRecorder.interrupt = None
+
+    results_resumed = lf.NLSE(pulse, fiber1, checkpoint_path=path,
+                              resume=True, **kwargs)
+    np.testing.assert_array_equal(results_resumed.AW, results.AW)
+
+    with pytest.raises(ValueError):
+        lf.NLSE(pulse, fiber1, checkpoint_path=path, resume=True, nsaves=10,
+                integrator='erk43ip', print_status=False)
+
+
+def test_nlse_diagnostics(tmp_path):
+    """Check the step statistics and that they survive a checkpoint."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**11, center_wavelength_nm=1550.0, epp=50e-12)
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+    kwargs = dict(nsaves=20, integrator='erk43ip', raman=True,
+                  print_status=False)
+    results = lf.NLSE(pulse, fiber1, **kwargs)
+    assert results.diagnostics is None
+
+    log = str(tmp_path / 'steps.tsv')
+    results_d = lf.NLSE(pulse, fiber1, diagnostics_log=log, **kwargs)
+    np.testing.assert_array_equal(results_d.AW, results.AW)
+    steps = results_d.diagnostics
+    accepted = steps[steps['accepted']]
+    assert np.isclose(accepted['dz'].sum(), fiber1.length)
+    assert np.isclose(accepted['energy'][-1], results.pulse_out.epp,
+                      rtol=1e-6)
+    # with the shock term, the photon number is conserved, but not the energy
+    assert np.abs(accepted['photon_drift']).max() < 1e-3
+    assert np.abs(accepted['energy_drift'][-1]) > 1e-3
+    assert np.all(steps['t_nonlinear'] > 0)
+    with open(log) as file:
+        lines = file.read().splitlines()
+    assert lines[0].split('\t') == list(steps.dtype.names)
+    assert len(lines) == steps.size + 1
+
+    path = str(tmp_path / 'nlse.pickle')
+    InterruptingRecorder.interrupt = 8
+    with pytest.raises(KeyboardInterrupt):
+        lf.NLSE(pulse, fiber1, checkpoint_path=path, checkpoint_every=0,
+                recorder=InterruptingRecorder(), diagnostics=True, **kwargs)
+    InterruptingRecorder.interrupt = None
+    results_resumed = lf.NLSE(pulse, fiber1, checkpoint_path=path,
+                              resume=True, diagnostics=True, **kwargs)
+    fields = ['z', 'dz', 'accepted', 'error', 'energy', 'photons']
+    np.testing.assert_array_equal(results_resumed.diagnostics[fields],
+                                  steps[fields])
+
+    with pytest.raises(ValueError):
+        lf.NLSE(pulse, fiber1, nsaves=20, diagnostics=True,
+                print_status=False)
+
+
+def test_nlse_diagnostics_limits(tmp_path):
+    """Check that the limits stop the NLSE, which can then be resumed."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**11, center_wavelength_nm=1550.0, epp=50e-12)
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+    kwargs = dict(nsaves=20, integrator='erk43ip', raman=True,
+                  print_status=False)
+    full = lf.NLSE(pulse, fiber1, diagnostics=True, **kwargs)
+    steps = full.diagnostics
+    accepted = steps[steps['accepted']]
+
+    log = str(tmp_path / 'steps.tsv')
+    with pytest.raises(RuntimeError, match='edges'):
+        lf.NLSE(pulse, fiber1, diagnostics=dict(max_edge=1e-12),
+                diagnostics_log=log, **kwargs)
+    edge = np.loadtxt(log, skiprows=1, ndmin=2)[:, steps.dtype.names.index(
+        'edge')]
+    assert edge[-1] > 1e-12
+    assert not np.any(edge[:-1] > 1e-12)
+
+    # the first step is rejected at this tolerance
+    with pytest.raises(RuntimeError, match='step size'):
+        lf.NLSE(pulse, fiber1, diagnostics=dict(min_dz=fiber1.length),
+                rtol=1e-10, **kwargs)
+
+    # stopped halfway, after some checkpoints
+    drift = np.abs(accepted['energy_drift'][accepted.size//2])
+    path = str(tmp_path / 'nlse.pickle')
+    with pytest.raises(RuntimeError, match='energy drifted'):
+        lf.NLSE(pulse, fiber1, checkpoint_path=path, checkpoint_every=0,
+                diagnostics=dict(max_energy_drift=drift), **kwargs)
+    results = lf.NLSE(pulse, fiber1, checkpoint_path=path, resume=True,
+                      diagnostics=dict(max_photon_drift=1e-3), **kwargs)
+    fields = ['z', 'dz', 'accepted', 'error', 'energy', 'photons']
+    np.testing.assert_array_equal(results.diagnostics[fields], steps[fields])
+
+    # the file of the recorder is closed, so that it can be resumed
+    h5py = pytest.importorskip('h5py')
+    file = str(tmp_path / 'spectra.h5')
+    path = str(tmp_path / 'nlse_file.pickle')
+    recorder = lf.recorders.FileRecorder(file)
+    with pytest.raises(RuntimeError, match='energy drifted'):
+        lf.NLSE(pulse, fiber1, checkpoint_path=path, checkpoint_every=0,
+                recorder=recorder, diagnostics=dict(max_energy_drift=drift),
+                **kwargs)
+    assert not recorder._file
+    lf.NLSE(pulse, fiber1, checkpoint_path=path, resume=True,
+            diagnostics=True, **kwargs)
+    with h5py.File(file, 'r') as f:
+        np.testing.assert_array_equal(f['AW']['spectrum'][:], full.AW)
+
+
+def test_nlse_ensemble():
+    """Check the shape and range of the coherence from NLSE_ensemble."""
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**12, center_wavelength_nm=1550.0, epp=50e-12)
+
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+
+    g12W, results = lf.NLSE_ensemble(pulse, fiber1, n_trials=3, nsaves=10,
+                                     random_seed=0, rtol=1e-6,
+                                     print_status=False)
+
+    z, f, t, AW, AT = results.get_results()
+    assert g12W.shape == AW.shape == (10, pulse.npts)
+    assert np.all((g12W >= 0) & (g12W <= 1 + 1e-9))
+
+    # a short fiber does not degrade the coherence near the spectral peak:
+    dB = 10*np.log10(np.abs(AW[-1])**2)
+    mask = dB > np.max(dB) - 20
+    assert np.all(g12W[-1, mask] > 0.99)
+    assert np.isclose(results.pulse_out.epp, pulse.epp, rtol=1e-2)
+
+
+def test_sweep(tmp_path):
+    """Check that a sweep saves each run once and skips finished runs."""
+    runs = lf.sweep.grid(pulse=dict(pulse_type='sech', fwhm_ps=0.050,
+                                    time_window_ps=7, npts=2**10,
+                                    epp=[25e-12, 50e-12]),
+                         fiber=dict(length=4e-3, gamma_W_m=1,
+                                    dispersion=(-0.12, 0, 5e-6)),
+                         nlse=dict(nsaves=20, integrator='erk43ip'))
+    assert len(runs) == 2
+
+    store = str(tmp_path)
+    timings = lf.sweep.run_sweep(runs, store, max_workers=2, z_decimation=4,
+                                 f_decimation=2, print_status=False)
+    assert all(t > 0 for t in timings.values())
+
+    results = lf.sweep.load_sweep(store)
+    assert len(results) == 2
+    for result in results:
+        assert result['AW_dB'].shape == (6, 2**9)
+        assert result['AW_dB'].dtype == np.float32
+        assert result['z'][-1] == 4e-3
+
+    timings = lf.sweep.run_sweep(runs, store, print_status=False)
+    assert all(t is None for t in timings.values())
+
+
+def test_nlse_numba_kernels():
+    """Check that the numba and numpy nonlinear operators agree."""
+    pytest.importorskip('numba')
+    pulse = lf.Pulse(pulse_type='sech', fwhm_ps=0.050, time_window_ps=7,
+                     npts=2**10, center_wavelength_nm=1550.0, epp=50e-12)
+    fiber1 = lf.Fiber(length=8e-3, center_wl_nm=1550.0, gamma_W_m=1,
+                      dispersion=(-0.12, 0, 5e-6))
+
+    prop = lf.nlse._Propagator(pulse, fiber1, raman=True, shock=True)
+    aw = np.fft.ifft(pulse.at) * np.ones((2, 1))  # a stack of two spectra
+    ip = np.exp(prop.lin_operator * 1e-3)
+
+    use_numba = lf.nlse.USE_NUMBA
+    try:
+        lf.nlse.USE_NUMBA = False
+        expected = [prop.nonlinear(aw), prop.nonlinear(aw, ip=ip)]
+        lf.nlse.USE_NUMBA = True
+        results = [prop.nonlinear(aw), prop.nonlinear(aw, ip=ip)]
+    finally:
+        lf.nlse.USE_NUMBA = use_numba
+
+    for result, value in zip(results, expected):
+        np.testing.assert_allclose(result, value, rtol=1e-10,
+                                   atol=1e-12*np.max(np.abs(value)))
+
+
 def test_nlse_loss():
     """Check that the loss is applied correctly in the NLSE."""
     # create a 1 meter fiber with 3.01 dB (50%) loss per meter: